@@ -0,0 +1,63 @@
+"""
+Compares the size and the speed of bugzilla.codec with pickle and json for lists of
+bugs, comments and histories. json can't store datetimes or bugzilla-objects, so the
+json-benchmark converts datetimes to strings and decodes to plain dicts only; the real
+cost of json is even higher.
+Run it with: python bench_codec.py [number of objects]
+"""
+
+import json
+import pickle
+import sys
+import timeit
+from os import path
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), ".."))
+
+from bugzilla import Bugzilla, codec
+from bugzilla.util import encode_bugzilla_datetime, parse_bugzilla_datetime
+import payloads
+
+SEED = 4711
+
+def json_default(value):
+    if hasattr(value, "strftime"):
+        return encode_bugzilla_datetime(value)
+    raise TypeError(type(value).__name__)
+
+def json_decode(data):
+    return json.loads(data, object_hook = lambda dct: {key: parse_bugzilla_datetime(value)
+                    if key in ("creation_time", "last_change_time", "when", "time") and value else value
+                    for key, value in dct.items()})
+
+def load_objects(count):
+    zilla = Bugzilla("http://localhost/")
+    return {
+        "bugs": [zilla._get_bug(data) for data in payloads.bugs(SEED, count)],
+        "comments": [zilla._get_comment(data) for data in payloads.comments(SEED, count)],
+        "histories": [zilla._get_history(data) for data in payloads.histories(SEED, count)]
+    }
+
+def bench(function, number):
+    return min(timeit.repeat(function, number = number, repeat = 3)) / number
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    codecs = [
+        ("codec", codec.encode, codec.decode),
+        ("pickle", lambda obj: pickle.dumps(obj, pickle.HIGHEST_PROTOCOL), pickle.loads),
+        ("json", lambda obj: json.dumps(obj, default = json_default).encode("utf-8"), json_decode)
+    ]
+    
+    print("%-10s %-8s %12s %14s %14s" % ("objects", "format", "bytes", "encode obj/s", "decode obj/s"))
+    for kind, objects in load_objects(count).items():
+        for name, encode, decode in codecs:
+            data = encode(objects)
+            if name == "codec":
+                assert decode(data) == objects
+            encode_time = bench(lambda: encode(objects), 5)
+            decode_time = bench(lambda: decode(data), 5)
+            print("%-10s %-8s %12i %14.0f %14.0f" % (kind, name, len(data), count / encode_time, count / decode_time))
+
+if __name__ == "__main__":
+    main()
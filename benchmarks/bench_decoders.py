@@ -0,0 +1,120 @@
+"""
+Compares the decoders generated by bugzilla.schema with the _map-based decoders the
+client used before. The old decoders are copied into MapDecoders below. Every decoder
+gets fresh payloads, since decoding modifies them in place; copying them is not timed.
+Run it with: python bench_decoders.py [number of objects]
+"""
+
+import sys
+import time
+from base64 import b64decode
+from os import path
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), ".."))
+
+from bugzilla import Bugzilla, Bug, Comment, Attachment, AttachmentFlag, History, Change
+from bugzilla.identity import IdentityMap
+from bugzilla.util import parse_bugzilla_datetime
+import payloads
+
+SEED = 4711
+
+class MapDecoders(Bugzilla):
+    # the decoders of the client before bugzilla.schema
+    def _get_attachment(self, data):
+        self._map(data, "creation_time", parse_bugzilla_datetime)
+        self._map(data, "last_change_time", parse_bugzilla_datetime)
+        self._map(data, "data", b64decode)
+        self._map(data, "is_private", bool)
+        self._map(data, "is_obsolete", bool)
+        self._map(data, "is_patch", bool)
+        self._map(data, "flags", self._get_attachment_flag)
+        if "size" in data: del data["size"]
+        
+        attachment = Attachment(data)
+        attachment.mark_clean()
+        return attachment
+    
+    def _get_attachment_flag(self, data):
+        if self.identity_map is not None: self.identity_map.intern_fields(data)
+        self._map(data, "creation_date", parse_bugzilla_datetime)
+        self._map(data, "modification_date", parse_bugzilla_datetime)
+        
+        return AttachmentFlag(data)
+    
+    def _get_bug(self, data):
+        self._map(data, "creation_time", parse_bugzilla_datetime)
+        self._map(data, "flags", self._get_attachment_flag)
+        self._map(data, "is_cc_accessible", bool)
+        self._map(data, "is_confirmed", bool)
+        self._map(data, "is_open", bool)
+        self._map(data, "is_creator_accessible", bool)
+        self._map(data, "last_change_time", parse_bugzilla_datetime)
+        if self.identity_map is not None:
+            self.identity_map.intern_fields(data)
+            for field in Bugzilla.USER_DETAIL_FIELDS:
+                # the old decoder failed for a null qa_contact_detail, this check is new
+                if data.get(field) is not None: self._map(data, field, self.identity_map.get_user)
+        
+        bug = Bug(data)
+        bug.mark_clean()
+        return bug
+    
+    def _get_history(self, data):
+        self._map(data, "when", parse_bugzilla_datetime)
+        if self.identity_map is not None:
+            self.identity_map.intern_fields(data)
+            self._map(data, "changes", self.identity_map.get_change)
+        else:
+            self._map(data, "changes", Change)
+        
+        return History(data)
+    
+    def _get_comment(self, data):
+        self._map(data, "time", parse_bugzilla_datetime)
+        self._map(data, "creation_time", parse_bugzilla_datetime)
+        if self.identity_map is not None: self.identity_map.intern_fields(data)
+        
+        return Comment(data)
+
+def copy_payloads(data):
+    # the payloads are plain json, this is faster than deepcopy
+    if isinstance(data, dict):
+        return {key: copy_payloads(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [copy_payloads(value) for value in data]
+    return data
+
+def bench(decode, data, repeat = 3):
+    best = None
+    for i in range(repeat):
+        fresh = copy_payloads(data)
+        start = time.perf_counter()
+        for obj in fresh:
+            decode(obj)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(data) / best
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    kinds = [
+        ("bugs", "_get_bug", payloads.bugs(SEED, count)),
+        ("comments", "_get_comment", payloads.comments(SEED, count)),
+        ("histories", "_get_history", payloads.histories(SEED, count)),
+        ("attachments", "_get_attachment", payloads.attachments(SEED, count // 10, 1024))
+    ]
+    
+    print("%-12s %-9s %14s %14s %8s" % ("objects", "identity", "_map obj/s", "schema obj/s", "speedup"))
+    for kind, method, data in kinds:
+        for identity in (False, True):
+            old = MapDecoders("http://localhost/", identity_map = IdentityMap() if identity else None)
+            new = Bugzilla("http://localhost/", identity_map = IdentityMap() if identity else None)
+            assert getattr(old, method)(copy_payloads(data[0])) == getattr(new, method)(copy_payloads(data[0]))
+            
+            old_rate = bench(getattr(old, method), data)
+            new_rate = bench(getattr(new, method), data)
+            print("%-12s %-9s %14.0f %14.0f %7.2fx" % (kind, "yes" if identity else "no", old_rate, new_rate, new_rate / old_rate))
+
+if __name__ == "__main__":
+    main()
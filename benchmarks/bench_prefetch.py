@@ -0,0 +1,52 @@
+"""
+Compares a loop fetching the comments and the history of every bug itself with the same
+loop over a Prefetcher. The client is a fake whose requests sleep for the given latency,
+and the work per bug sleeps too, so the numbers show the overlap and not the machine.
+Run it with: python bench_prefetch.py [number of bugs] [latency in ms] [work in ms]
+"""
+
+import sys
+import time
+from os import path
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), ".."))
+
+from bugzilla import Bugzilla
+from bugzilla.prefetch import Prefetcher
+
+class LatentBugzilla(Bugzilla):
+    def __init__(self, latency):
+        Bugzilla.__init__(self, "http://localhost/")
+        self.latency = latency
+    
+    def get_comments_by_bug(self, bug_id, **kw):
+        time.sleep(self.latency)
+        return [self._get_comment({"id": bug_id, "bug_id": bug_id, "text": "comment"})]
+    
+    def get_bug_history(self, bug_id, **kw):
+        time.sleep(self.latency)
+        return []
+
+def sequential(zilla, bugs, work):
+    for bug in bugs:
+        zilla.get_comments_by_bug(bug)
+        zilla.get_bug_history(bug)
+        time.sleep(work)
+
+def prefetched(zilla, bugs, work):
+    for bug, related in Prefetcher(zilla, bugs, related = ("comments", "history"), window = 8):
+        time.sleep(work)
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.02
+    work = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.02
+    zilla = LatentBugzilla(latency)
+    print("%i bugs, %i ms per request, %i ms of work per bug" % (count, latency * 1000, work * 1000))
+    for name, function in (("sequential", sequential), ("prefetched", prefetched)):
+        started = time.perf_counter()
+        function(zilla, range(count), work)
+        print("%-12s %6.2f s" % (name, time.perf_counter() - started))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Synthetic payloads shaped like the json-responses of a bugzilla 5.0 REST-api. All
+functions take a random.Random, so the same seed always creates the same payloads.
+The payloads are raw dicts as returned by json.loads, the benchmarks decode them with
+the client's _get_*-methods.
+"""
+
+import base64
+import random
+from datetime import datetime, timedelta
+
+PRODUCTS = ["Firefox", "Thunderbird", "Core", "Toolkit", "DevTools", "Websites"]
+COMPONENTS = ["General", "Networking", "Graphics", "DOM", "Layout", "Security", "Build"]
+STATUSES = ["UNCONFIRMED", "NEW", "ASSIGNED", "REOPENED", "RESOLVED", "VERIFIED"]
+RESOLUTIONS = ["FIXED", "INVALID", "WONTFIX", "DUPLICATE", "WORKSFORME"]
+PRIORITIES = ["P1", "P2", "P3", "P4", "P5", "--"]
+SEVERITIES = ["blocker", "critical", "major", "normal", "minor", "trivial"]
+WORDS = ("crash startup memory leak rendering broken slow regression window tab page "
+        "network cache thread lock deadlock font scroll print error warning assertion").split()
+
+BASE_TIME = datetime(2015, 1, 1)
+
+def timestamp(rng):
+    return (BASE_TIME + timedelta(seconds = rng.randrange(0, 10 * 365 * 86400))).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for i in range(words))
+
+def user_detail(rng, users = 200):
+    user_id = rng.randrange(1, users)
+    return {
+        "id": user_id,
+        "name": "user%i@example.com" % user_id,
+        "email": "user%i@example.com" % user_id,
+        "real_name": "User %i" % user_id
+    }
+
+def flag(rng):
+    return {
+        "id": rng.randrange(1, 100000),
+        "name": rng.choice(["review", "needinfo", "approval"]),
+        "type_id": rng.randrange(1, 20),
+        "creation_date": timestamp(rng),
+        "modification_date": timestamp(rng),
+        "status": rng.choice(["?", "+", "-"]),
+        "setter": user_detail(rng)["name"],
+        "requestee": user_detail(rng)["name"]
+    }
+
+def bug(rng, bug_id):
+    status = rng.choice(STATUSES)
+    is_open = status not in ("RESOLVED", "VERIFIED")
+    return {
+        "id": bug_id,
+        "alias": [],
+        "assigned_to": user_detail(rng)["name"],
+        "assigned_to_detail": user_detail(rng),
+        "blocks": [rng.randrange(1, bug_id + 1) for i in range(rng.randrange(0, 3))],
+        "cc": [],
+        "cc_detail": [user_detail(rng) for i in range(rng.randrange(0, 8))],
+        "classification": "Client Software",
+        "component": rng.choice(COMPONENTS),
+        "creation_time": timestamp(rng),
+        "creator": "",
+        "creator_detail": user_detail(rng),
+        "deadline": None,
+        "depends_on": [rng.randrange(1, bug_id + 1) for i in range(rng.randrange(0, 3))],
+        "dupe_of": None,
+        "flags": [flag(rng) for i in range(rng.randrange(0, 3))],
+        "groups": [],
+        "is_cc_accessible": True,
+        "is_confirmed": True,
+        "is_creator_accessible": True,
+        "is_open": is_open,
+        "keywords": rng.sample(["crash", "regression", "perf", "testcase"], rng.randrange(0, 3)),
+        "last_change_time": timestamp(rng),
+        "op_sys": rng.choice(["Linux", "Windows", "macOS", "All"]),
+        "platform": rng.choice(["x86_64", "ARM", "All"]),
+        "priority": rng.choice(PRIORITIES),
+        "product": rng.choice(PRODUCTS),
+        "qa_contact": "",
+        "qa_contact_detail": user_detail(rng) if rng.random() < 0.3 else None,
+        "resolution": "" if is_open else rng.choice(RESOLUTIONS),
+        "see_also": [],
+        "severity": rng.choice(SEVERITIES),
+        "status": status,
+        "summary": sentence(rng, rng.randrange(4, 12)),
+        "target_milestone": "---",
+        "url": "",
+        "version": "unspecified",
+        "whiteboard": "",
+        "cf_crash_signature": ""
+    }
+
+def comment(rng, bug_id, count):
+    time = timestamp(rng)
+    return {
+        "id": bug_id * 1000 + count,
+        "bug_id": bug_id,
+        "attachment_id": None,
+        "count": count,
+        "text": sentence(rng, rng.randrange(5, 80)),
+        "creator": user_detail(rng)["name"],
+        "time": time,
+        "creation_time": time,
+        "is_private": False,
+        "is_markdown": False,
+        "tags": []
+    }
+
+def history(rng):
+    field = rng.choice(["status", "priority", "cc", "keywords", "assigned_to"])
+    return {
+        "when": timestamp(rng),
+        "who": user_detail(rng)["name"],
+        "changes": [{"field_name": field, "added": rng.choice(STATUSES), "removed": rng.choice(STATUSES)}
+                    for i in range(rng.randrange(1, 4))]
+    }
+
+def attachment(rng, bug_id, size = 4096):
+    data = bytes(rng.getrandbits(8) for i in range(size))
+    return {
+        "id": rng.randrange(1, 1000000),
+        "bug_id": bug_id,
+        "data": base64.b64encode(data).decode("ascii"),
+        "size": size,
+        "creation_time": timestamp(rng),
+        "last_change_time": timestamp(rng),
+        "file_name": "log.txt",
+        "summary": sentence(rng, 4),
+        "content_type": "text/plain",
+        "is_private": 0,
+        "is_obsolete": 0,
+        "is_patch": 0,
+        "creator": user_detail(rng)["name"],
+        "flags": [flag(rng) for i in range(rng.randrange(0, 2))]
+    }
+
+def product(rng, product_id):
+    return {
+        "id": product_id,
+        "name": "%s %i" % (rng.choice(PRODUCTS), product_id),
+        "description": sentence(rng, 12),
+        "is_active": True,
+        "default_milestone": "---",
+        "has_unconfirmed": True,
+        "classification": "Client Software",
+        "components": [{
+            "id": product_id * 100 + i,
+            "name": COMPONENTS[i % len(COMPONENTS)],
+            "description": sentence(rng, 8),
+            "default_assigned_to": user_detail(rng)["name"],
+            "default_qa_contact": "",
+            "sort_key": 0,
+            "is_active": True,
+            "flag_types": {
+                "bug": [{"id": 1, "name": "needinfo", "description": "Needs info", "cc_list": "",
+                        "sort_key": 0, "is_active": True, "is_requestable": True,
+                        "is_requesteeble": True, "is_multiplicable": True,
+                        "grant_group": None, "request_group": None}],
+                "attachment": []
+            }
+        } for i in range(rng.randrange(1, 10))],
+        "versions": [{"id": i, "name": "%i.0" % i, "sort_key": 0, "is_active": True} for i in range(rng.randrange(1, 20))],
+        "milestones": [{"id": i, "name": "M%i" % i, "sort_key": 0, "is_active": True} for i in range(rng.randrange(1, 20))]
+    }
+
+def user(rng):
+    detail = user_detail(rng, 100000)
+    return dict(detail, can_login = True, email_enabled = True, login_denied_text = "",
+                groups = [{"id": 1, "name": "editbugs", "description": "Can edit bugs"}],
+                saved_searches = [], saved_reports = [])
+
+def field(rng, field_id):
+    return {
+        "id": field_id,
+        "type": 2,
+        "is_custom": False,
+        "name": "bug_status",
+        "display_name": "Status",
+        "is_mandatory": False,
+        "is_on_bug_entry": False,
+        "visibility_field": None,
+        "visibility_values": [],
+        "value_field": None,
+        "values": [{"name": status, "sort_key": i, "visibility_values": [], "is_active": True,
+                    "is_open": i < 4, "can_change_to": [{"name": other} for other in STATUSES if other != status]}
+                    for i, status in enumerate(STATUSES)]
+    }
+
+def bugs(seed, count):
+    rng = random.Random(seed)
+    return [bug(rng, bug_id) for bug_id in range(1, count + 1)]
+
+def comments(seed, count):
+    rng = random.Random(seed)
+    return [comment(rng, 1, i) for i in range(count)]
+
+def histories(seed, count):
+    rng = random.Random(seed)
+    return [history(rng) for i in range(count)]
+
+def attachments(seed, count, size = 4096):
+    rng = random.Random(seed)
+    return [attachment(rng, 1, size) for i in range(count)]
+
+def products(seed, count):
+    rng = random.Random(seed)
+    return [product(rng, product_id) for product_id in range(1, count + 1)]
+
+def users(seed, count):
+    rng = random.Random(seed)
+    return [user(rng) for i in range(count)]
+
+def fields(seed, count):
+    rng = random.Random(seed)
+    return [field(rng, field_id) for field_id in range(1, count + 1)]
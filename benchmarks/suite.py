@@ -0,0 +1,251 @@
+"""
+Microbenchmarks of the object model, the decoders, the json-encoders of the objects and
+the date-functions of bugzilla.util. Every case runs a function over count synthetic
+payloads (see payloads.py, the seed is fixed) and reports the operations per second, the
+memory blocks still allocated per operation (the objects it created) and the peak bytes
+per operation, both measured with tracemalloc in a separate run.
+The results can be saved as json and compared with a saved baseline. Cases that got
+slower or allocate more than the threshold are listed and the exit status is 1, so CI
+can flag them. Timings depend on the machine, compare results of the same machine only.
+Every run of a case takes at least min-time seconds and the best of repeat runs counts.
+On a busy machine single runs still vary by a third, so cases that seem slower are
+measured again before they are reported.
+
+    python suite.py --output baseline.json
+    python suite.py --baseline baseline.json --threshold 0.25
+"""
+
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from os import path
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), ".."))
+
+from bugzilla import Bugzilla
+from bugzilla.objects import *
+from bugzilla.schema import parse_datetime
+from bugzilla.util import parse_bugzilla_datetime, encode_bugzilla_datetime, parse_bugzilla_date, encode_bugzilla_date
+import payloads
+
+SEED = 4711
+RESULTS_VERSION = 1
+
+def copy_payloads(data):
+    # the payloads are plain json, this is faster than deepcopy
+    if isinstance(data, dict):
+        return {key: copy_payloads(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [copy_payloads(value) for value in data]
+    return data
+
+def cycle(items, count):
+    return [items[i % len(items)] for i in range(count)]
+
+class Case:
+    """
+    A benchmark: function is called with every input. Decoders modify their payloads, so
+    for fresh cases every pass gets a copy of the inputs; copying is not measured.
+    """
+    
+    def __init__(self, name, function, inputs, fresh = False):
+        self.name = name
+        self.function = function
+        self.inputs = inputs
+        self.fresh = fresh
+    
+    def get_inputs(self):
+        return copy_payloads(self.inputs) if self.fresh else self.inputs
+    
+    def run(self, loops):
+        "Returns the seconds one pass over the inputs takes, averaged over loops passes."
+        function = self.function
+        batches = [self.get_inputs() for i in range(loops)]
+        gc.collect()
+        start = time.perf_counter()
+        for inputs in batches:
+            for item in inputs:
+                function(item)
+        return (time.perf_counter() - start) / loops
+    
+    def measure(self, repeat, min_time = 0.1):
+        # fast cases are passed over several times per run, until a run takes min_time
+        # seconds, so the resolution of the timer and short hiccups don't decide the result
+        function = self.function
+        loops = 1
+        best = self.run(loops)
+        while best * loops < min_time:
+            loops = max(loops * 2, int(min_time / best * 1.2)) if best else loops * 10
+            best = self.run(loops)
+        for i in range(repeat - 1):
+            best = min(best, self.run(loops))
+        
+        inputs = self.get_inputs()
+        results = [None] * len(inputs)
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        base = tracemalloc.get_traced_memory()[0]
+        for i, item in enumerate(inputs):
+            results[i] = function(item)
+        peak = tracemalloc.get_traced_memory()[1]
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        blocks = sum(diff.count_diff for diff in after.compare_to(before, "lineno") if diff.count_diff > 0)
+        return {
+            "ops_per_sec": len(inputs) / best if best else 0.0,
+            "allocs_per_op": blocks / len(inputs),
+            "peak_bytes_per_op": (peak - base) / len(inputs)
+        }
+
+def make_cases(count):
+    zilla = Bugzilla("http://localhost/")
+    raw = {
+        "bug": payloads.bugs(SEED, count),
+        "comment": payloads.comments(SEED, count),
+        "history": payloads.histories(SEED, count),
+        "attachment": payloads.attachments(SEED, max(1, count // 10), 4096),
+        "product": payloads.products(SEED, max(1, count // 10)),
+        "user": payloads.users(SEED, count),
+        "field": payloads.fields(SEED, max(1, count // 10))
+    }
+    components = [component for product in raw["product"] for component in product["components"]]
+    versions = [version for product in raw["product"] for version in product["versions"]]
+    milestones = [milestone for product in raw["product"] for milestone in product["milestones"]]
+    flags = [payloads.flag(payloads.random.Random(SEED + i)) for i in range(count)]
+    changes = [change for history in raw["history"] for change in history["changes"]]
+    values = [value for field in raw["field"] for value in field["values"]]
+    
+    constructors = [
+        (Bug, raw["bug"]),
+        (Product, raw["product"]),
+        (Component, components),
+        (FlagType, [flag_type for component in components for flag_type in component["flag_types"]["bug"]]),
+        (Version, versions),
+        (Milestone, milestones),
+        (Classification, [{"id": 1, "name": "Client Software", "description": "", "sort_key": 0, "products": []}]),
+        (Attachment, raw["attachment"]),
+        (AttachmentFlag, flags),
+        (History, raw["history"]),
+        (Change, changes),
+        (UpdateResult, [{"id": 1, "alias": [], "changes": {"priority": {"added": "P1", "removed": "P2"}}}]),
+        (Comment, raw["comment"]),
+        (BugField, raw["field"]),
+        (BugFieldValue, values),
+        (User, raw["user"]),
+        (Group, [{"id": 1, "name": "editbugs", "description": "Can edit bugs", "is_active": True}]),
+        (Search, [{"id": 1, "name": "My bugs", "query": "assigned_to=%user%"}])
+    ]
+    cases = [Case("construct/%s" % cls.__name__, cls, cycle(inputs, count)) for cls, inputs in constructors]
+    
+    for method, key in (("_get_bug", "bug"), ("_get_comment", "comment"), ("_get_history", "history"),
+                        ("_get_attachment", "attachment"), ("_get_product", "product"), ("_get_user", "user"),
+                        ("_get_field", "field")):
+        cases.append(Case("decode/%s" % method, getattr(zilla, method), cycle(raw[key], count), fresh = True))
+    
+    bugs = [zilla._get_bug(data) for data in copy_payloads(raw["bug"])]
+    changed = [zilla._get_bug(data) for data in copy_payloads(raw["bug"])]
+    for bug in changed:
+        bug.priority = "P1"
+        bug.keywords.append("perf")
+    attachments = cycle([zilla._get_attachment(data) for data in copy_payloads(raw["attachment"])], count)
+    users = [zilla._get_user(data) for data in copy_payloads(raw["user"])]
+    cases.extend([
+        Case("encode/Bug.add_json", Bug.add_json, bugs),
+        Case("encode/Bug.update_json", Bug.update_json, bugs),
+        Case("encode/Bug.changed_update_json", Bug.changed_update_json, changed),
+        Case("encode/Comment.add_json", Comment.add_json, [zilla._get_comment(data) for data in copy_payloads(raw["comment"])]),
+        Case("encode/Attachment.add_json", Attachment.add_json, attachments),
+        Case("encode/User.update_json", User.update_json, users)
+    ])
+    
+    datetimes = [data["creation_time"] for data in raw["bug"]]
+    parsed = [parse_bugzilla_datetime(string) for string in datetimes]
+    cases.extend([
+        Case("util/parse_bugzilla_datetime", parse_bugzilla_datetime, datetimes),
+        Case("util/schema.parse_datetime", parse_datetime, datetimes),
+        Case("util/encode_bugzilla_datetime", encode_bugzilla_datetime, parsed),
+        Case("util/parse_bugzilla_date", parse_bugzilla_date, [string[:10] for string in datetimes]),
+        Case("util/encode_bugzilla_date", encode_bugzilla_date, [dt.date() for dt in parsed])
+    ])
+    return cases
+
+def compare(results, baseline, threshold):
+    """
+    Returns a list of (name, metric, baseline, current) for every case that got slower or
+    allocates more than threshold (a fraction) compared with the baseline.
+    """
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None: continue
+        if result["ops_per_sec"] < old["ops_per_sec"] * (1 - threshold):
+            regressions.append((name, "ops_per_sec", old["ops_per_sec"], result["ops_per_sec"]))
+        if result["allocs_per_op"] > old["allocs_per_op"] * (1 + threshold) + 0.5:
+            regressions.append((name, "allocs_per_op", old["allocs_per_op"], result["allocs_per_op"]))
+    return regressions
+
+def print_result(name, result, old):
+    change = "%+8.1f%%" % ((result["ops_per_sec"] / old["ops_per_sec"] - 1) * 100) if old else ""
+    print("%-36s %14.0f %10.1f %14.0f %9s" % (name, result["ops_per_sec"], result["allocs_per_op"],
+                                            result["peak_bytes_per_op"], change))
+
+def main(args = None):
+    parser = argparse.ArgumentParser(description = "Microbenchmarks of the object model and the encoders")
+    parser.add_argument("--count", type = int, default = 2000, help = "the number of operations per case")
+    parser.add_argument("--repeat", type = int, default = 7, help = "the best of this many runs is taken")
+    parser.add_argument("--min-time", type = float, default = 0.1, help = "the minimal duration of a run in seconds")
+    parser.add_argument("--filter", default = "", help = "only run the cases whose name contains this")
+    parser.add_argument("--output", help = "save the results as json to this file")
+    parser.add_argument("--baseline", help = "compare the results with this saved result-file")
+    parser.add_argument("--threshold", type = float, default = 0.25,
+                        help = "the allowed slowdown or allocation-increase as a fraction")
+    parser.add_argument("--confirm", type = int, default = 3,
+                        help = "cases that seem slower are measured again up to this many times")
+    args = parser.parse_args(args)
+    
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as file:
+            data = json.load(file)
+        if data.get("version") != RESULTS_VERSION:
+            raise ValueError("Unsupported result version %r" % data.get("version"))
+        baseline = data["results"]
+    
+    results = {}
+    cases = {}
+    print("%-36s %14s %10s %14s %9s" % ("case", "ops/s", "allocs/op", "peak bytes/op", "baseline"))
+    for case in make_cases(args.count):
+        if args.filter not in case.name: continue
+        cases[case.name] = case
+        result = results[case.name] = case.measure(args.repeat, args.min_time)
+        print_result(case.name, result, baseline.get(case.name))
+    
+    # a single slow measurement is mostly noise of the machine, a regression has to show up
+    # in every measurement
+    for i in range(args.confirm):
+        slower = sorted({name for name, metric, old, new in compare(results, baseline, args.threshold)
+                        if metric == "ops_per_sec"})
+        if not slower: break
+        print("measuring %s again" % ", ".join(slower))
+        for name in slower:
+            result = cases[name].measure(args.repeat, args.min_time)
+            results[name]["ops_per_sec"] = max(results[name]["ops_per_sec"], result["ops_per_sec"])
+            print_result(name, results[name], baseline.get(name))
+    
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"version": RESULTS_VERSION, "python": platform.python_version(), "seed": SEED,
+                    "count": args.count, "results": results}, file, indent = 1, sort_keys = True)
+    
+    regressions = compare(results, baseline, args.threshold)
+    for name, metric, old, new in regressions:
+        print("REGRESSION %s: %s %.1f -> %.1f" % (name, metric, old, new))
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
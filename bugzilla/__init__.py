@@ -1,10 +1,11 @@
 import json
-from base64 import b64decode
 from urllib.parse import urlencode, quote_plus
 from urllib.request import urlopen, Request
 from urllib.error import HTTPError
 from .objects import *
-from .util import parse_bugzilla_datetime
+from .schema import DECODERS
+from .singleflight import SingleFlight
+from .util import parse_bugzilla_datetime, rest_url
 
 class BugzillaException(Exception):
     def __init__(self, code, *args, **kw):
@@ -18,15 +19,22 @@ class BugzillaException(Exception):
         return self.error_code
 
 class Bugzilla:
-    def __init__(self, url, api_key = None):
-        if not url.endswith("/"):
-            raise ValueError("Url has to end with /")
-        if not url.endswith("rest/"):
-            url += "rest/"
-        
-        self.url = url
+    # fields of a bug that contain a user-detail-dict or a list of those
+    USER_DETAIL_FIELDS = ("assigned_to_detail", "cc_detail", "creator_detail", "qa_contact_detail")
+    
+    def __init__(self, url, api_key = None, identity_map = None, metadata_index = None, single_flight = True,
+                endpoint_pool = None):
+        self.url = rest_url(url)
         self.api_key = api_key
         self.charset = "utf-8"
+        self.timeout = None
+        self.identity_map = identity_map
+        self.metadata_index = metadata_index
+        if single_flight is True: single_flight = SingleFlight()
+        self.single_flight = single_flight or None
+        self.endpoint_pool = endpoint_pool
+        # whether the installation knows count_only, None until supports_count_only asked
+        self.has_count_only = None
     
     def get_api_key(self):
         return self.api_key
@@ -34,21 +42,81 @@ class Bugzilla:
     def set_api_key(self, key):
         self.api_key = key
     
+    # the timeout of every request in seconds, None waits forever
+    def get_timeout(self):
+        return self.timeout
+    
+    def set_timeout(self, timeout):
+        self.timeout = timeout
+    
+    # an identity map (see bugzilla.identity) shares equal user-details and changes
+    # across all decoded objects. None disables it.
+    def get_identity_map(self):
+        return self.identity_map
+    
+    def set_identity_map(self, identity_map):
+        self.identity_map = identity_map
+    
+    # a metadata index (see bugzilla.metadata) validates the payloads of add_bug and
+    # update_bug before they are sent. None disables the validation.
+    def get_metadata_index(self):
+        return self.metadata_index
+    
+    def set_metadata_index(self, metadata_index):
+        self.metadata_index = metadata_index
+    
+    # a single-flight (see bugzilla.singleflight) lets concurrent identical GET-requests
+    # share one request. It is enabled by default, None disables it.
+    def get_single_flight(self):
+        return self.single_flight
+    
+    def set_single_flight(self, single_flight):
+        self.single_flight = single_flight
+    
+    # an endpoint pool (see bugzilla.routing) sends GET-requests to read-replicas and the
+    # other requests to the url of the client. None sends all requests to the url.
+    def get_endpoint_pool(self):
+        return self.endpoint_pool
+    
+    def set_endpoint_pool(self, endpoint_pool):
+        self.endpoint_pool = endpoint_pool
+    
+    # returns the number of GET-requests that were answered by a request of another thread
+    def get_coalesced_count(self):
+        return 0 if self.single_flight is None else self.single_flight.get_coalesced_count()
+    
     # a little helper function to encode url-parameters
     def _quote(self, string):
         return quote_plus(string)
     
+    # identical GET-requests of several threads share one request, if a single-flight is set
     def _get(self, path, **kw):
-        return self._read_request("GET", path, None, **kw)
+        if self.single_flight is None:
+            return self._read_request("GET", path, None, **kw)
+        
+        key = (path, tuple(sorted((key, tuple(value) if isinstance(value, (list, tuple)) else value)
+                                for key, value in kw.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return self._read_request("GET", path, None, **kw)
+        return self.single_flight.do(key, lambda: self._read_request("GET", path, None, **kw))
     
     def _post(self, path, data, **kw):
-        return self._read_request("POST", path, data, **kw)
+        return self._write_request("POST", path, data, **kw)
     
     def _put(self, path, data, **kw):
-        return self._read_request("PUT", path, data, **kw)
+        return self._write_request("PUT", path, data, **kw)
     
     def _delete(self, path, data, **kw):
-        return self._read_request("DELETE", path, data, **kw)
+        return self._write_request("DELETE", path, data, **kw)
+    
+    def _write_request(self, method, path, data, **kw):
+        try:
+            return self._read_request(method, path, data, **kw)
+        finally:
+            # GETs started after a write must not share a request started before it
+            if self.single_flight is not None: self.single_flight.forget()
     
     def _read_request(self, method, path, post_data, **kw):
         if self.api_key:
@@ -59,33 +127,43 @@ class Bugzilla:
         if not isinstance(kw.get("exclude_fields", ""), str):
             kw["exclude_fields"] = ",".join(kw["exclude_fields"])
         
-        if post_data is not None: post_data = json.dumps(post_data).encode("utf-8")
+        # a streamed body is an iterable of bytes with get_content_length, see bugzilla.upload
+        if post_data is not None and not hasattr(post_data, "get_content_length"):
+            post_data = json.dumps(post_data).encode("utf-8")
         
         query = urlencode(kw, True)
         if query: query = "?" + query
-        url = self.url + path + query
+        if self.endpoint_pool is None:
+            obj = self._open(method, self.url + path + query, post_data)
+        else:
+            obj = self.endpoint_pool.request(method, self.url, lambda url: self._open(method, url + path + query, post_data))
+        
+        if isinstance(obj, dict) and obj.get("error"):
+            raise BugzillaException(obj["code"], obj["message"])
+        
+        return obj
+    
+    def _open(self, method, url, post_data):
         try:
             request = Request(url, post_data)
             request.get_method = lambda: method
             if post_data is not None:
                 request.add_header("Content-type", "application/json")
+            if hasattr(post_data, "get_content_length") and post_data.get_content_length() is not None:
+                # without a length urllib sends the body chunked
+                request.add_header("Content-length", str(post_data.get_content_length()))
             
-            data = urlopen(request).read()
-            obj = json.loads(data.decode(self.charset))
+            data = (urlopen(request) if self.timeout is None else urlopen(request, timeout = self.timeout)).read()
+            return json.loads(data.decode(self.charset))
         except HTTPError as e:
             # some api-errors set the http-status, so here we might still get
             # a valid json-object that will result in a bugzilla-error
             data = e.fp.read()
             try:
-                obj = json.loads(data.decode(self.charset))
+                return json.loads(data.decode(self.charset))
             except ValueError:
                 # no valid api-response, maybe a http-500 or something else
                 raise e
-        
-        if isinstance(obj, dict) and obj.get("error"):
-            raise BugzillaException(obj["code"], obj["message"])
-        
-        return obj
     
     def _map(self, dct, key, func):
         if key in dct:
@@ -94,94 +172,57 @@ class Bugzilla:
             else:
                 dct[key] = func(dct[key])
     
+    def _update_json(self, obj, full, ids = None):
+        # the changes of an object only make sense for the object itself. if its fields are
+        # applied to other ids, all of them are sent unless full is False
+        if full is None: full = ids is not None and ids != [obj.id]
+        return obj.update_json() if full else obj.changed_update_json()
+    
+    # the decoders are generated from bugzilla.schema
     def _get_attachment(self, data):
-        self._map(data, "creation_time", parse_bugzilla_datetime)
-        self._map(data, "last_change_time", parse_bugzilla_datetime)
-        self._map(data, "data", b64decode)
-        self._map(data, "is_private", bool)
-        self._map(data, "is_obsolete", bool)
-        self._map(data, "is_patch", bool)
-        self._map(data, "flags", self._get_attachment_flag)
-        if "size" in data: del data["size"]
-        
-        return Attachment(data)
+        return DECODERS[Attachment](self, data)
     
     def _get_attachment_flag(self, data):
-        self._map(data, "creation_date", parse_bugzilla_datetime)
-        self._map(data, "modification_date", parse_bugzilla_datetime)
-        
-        return AttachmentFlag(data)
+        return DECODERS[AttachmentFlag](self, data)
     
     def _get_bug(self, data):
-        self._map(data, "creation_time", parse_bugzilla_datetime)
-        self._map(data, "flags", self._get_attachment_flag)
-        self._map(data, "is_cc_accessible", bool)
-        self._map(data, "is_confirmed", bool)
-        self._map(data, "is_open", bool)
-        self._map(data, "is_creator_accessible", bool)
-        self._map(data, "last_change_time", parse_bugzilla_datetime)
-        
-        return Bug(data)
+        return DECODERS[Bug](self, data)
     
     def _get_history(self, data):
-        self._map(data, "when", parse_bugzilla_datetime)
-        self._map(data, "changes", Change)
-        
-        return History(data)
+        return DECODERS[History](self, data)
     
     def _get_product(self, data):
-        self._map(data, "components", self._get_component)
-        self._map(data, "versions", self._get_version)
-        self._map(data, "milestones", self._get_milestone)
-        
-        return Product(data)
+        return DECODERS[Product](self, data)
     
     def _get_component(self, data):
-        if "flag_types" in data:
-            self._map(data["flag_types"], "bug", self._get_flag_type)
-            self._map(data["flag_types"], "attachment", self._get_flag_type)
-        
-        return Component(data)
+        return DECODERS[Component](self, data)
     
     def _get_flag_type(self, data):
-        return FlagType(data)
+        return DECODERS[FlagType](self, data)
     
     def _get_version(self, data):
-        return Version(data)
+        return DECODERS[Version](self, data)
     
     def _get_milestone(self, data):
-        return Milestone(data)
+        return DECODERS[Milestone](self, data)
     
     def _get_classification(self, data):
-        return Classification(data)
+        return DECODERS[Classification](self, data)
     
     def _get_update_result(self, data):
-        self._map(data, "last_change_time", parse_bugzilla_datetime)
-        
-        return UpdateResult(data)
+        return DECODERS[UpdateResult](self, data)
     
     def _get_comment(self, data):
-        self._map(data, "time", parse_bugzilla_datetime)
-        self._map(data, "creation_time", parse_bugzilla_datetime)
-        
-        return Comment(data)
+        return DECODERS[Comment](self, data)
     
     def _get_field(self, data):
-        self._map(data, "values", BugFieldValue)
-        
-        return BugField(data)
+        return DECODERS[BugField](self, data)
     
     def _get_user(self, data):
-        self._map(data, "groups", self._get_group)
-        self._map(data, "saved_searches", Search)
-        self._map(data, "saved_reports", Search)
-        
-        return User(data)
+        return DECODERS[User](self, data)
     
     def _get_group(self, data):
-        self._map(data, "membership", self._get_user)
-        
-        return Group(data)
+        return DECODERS[Group](self, data)
     
     def get_version(self):
         """
@@ -227,12 +268,14 @@ class Bugzilla:
         """
         Returns the last audit time for a given class. The class can be "Bugzilla::Component"
         or something similar. Appearently, if no class is given, "Bugzilla::Product" will be
-        assumed.
+        assumed. If there is no audit-entry for the class, None is returned.
         https://bugzilla.readthedocs.io/en/5.0/api/core/v1/bugzilla.html#last-audit-time
         """
         kw = {}
         if class_ is not None: kw["class"] = class_
-        return parse_bugzilla_datetime(self._get("last_audit_time", **kw)["last_audit_time"])
+        data = self._get("last_audit_time", **kw)
+        self._map(data, "last_audit_time", parse_bugzilla_datetime)
+        return data["last_audit_time"]
     
     def get_attachment(self, attachment_id, **kw):
         """
@@ -250,6 +293,18 @@ class Bugzilla:
         bug_id = str(bug.id if isinstance(bug, Bug) else bug)
         return [self._get_attachment(data) for data in self._get("bug/%s/attachment" % self._quote(bug_id), **kw)["bugs"][bug_id]]
     
+    def get_attachments_by_bugs(self, bug_ids, **kw):
+        """
+        Returns the attachments of several bugs with one request. The parameter bug_ids is a
+        list of numeric bug-ids. The return value is a dict mapping every bug-id to its list
+        of attachments. Pass exclude_fields = ["data"] to get the attachments without data.
+        https://bugzilla.readthedocs.io/en/5.0/api/core/v1/attachment.html#get-attachment
+        """
+        bug_ids = list(bug_ids)
+        if not bug_ids: return {}
+        data = self._get("bug/%i/attachment" % bug_ids[0], ids = bug_ids[1:], **kw)
+        return {int(bug_id): [self._get_attachment(obj) for obj in data["bugs"][bug_id]] for bug_id in data["bugs"]}
+    
     def get_bug(self, bug_id, **kw):
         """
         Returns the bug for the given id. The parameter bug_id can be a numeric id or
@@ -267,6 +322,31 @@ class Bugzilla:
         """
         return [self._get_bug(data) for data in self._get("bug", **kw)["bugs"]]
     
+    def count_bugs(self, **kw):
+        """
+        Returns the number of bugs a search would return, with the same keyword-parameters
+        as search_bugs. Bugzilla-installations that don't know count_only return the ids of
+        the bugs instead, which are counted then.
+        https://bugzilla.readthedocs.io/en/latest/api/core/v1/bug.html#search-bugs
+        """
+        # the ids are all that is needed, whatever fields the caller asked for
+        kw.pop("include_fields", None)
+        kw.pop("count_only", None)
+        data = self._get("bug", count_only = 1, include_fields = ["id"], **kw)
+        if "bug_count" in data:
+            return int(data["bug_count"])
+        return len(data["bugs"])
+    
+    def supports_count_only(self):
+        """
+        Returns True if the bugzilla-installation can count bugs without returning them,
+        see count_bugs. The installation is asked once, the answer is kept.
+        """
+        if self.has_count_only is None:
+            # no bug has the id 0, the answer is small either way
+            self.has_count_only = "bug_count" in self._get("bug", count_only = 1, id = 0)
+        return self.has_count_only
+    
     def get_bug_history(self, bug_id, **kw):
         """
         Return the history for a specific bug. The bug_id can be a numeric id or a bug-alias.
@@ -277,6 +357,18 @@ class Bugzilla:
         bug_id = str(bug_id)
         return [self._get_history(history) for history in self._get("bug/%s/history" % self._quote(bug_id), **kw)["bugs"][0]["history"]]
     
+    def get_bug_histories(self, bug_ids, **kw):
+        """
+        Return the histories of several bugs with one request. The parameter bug_ids is a list
+        of numeric bug-ids. The return value is a dict mapping every bug-id to its history.
+        The keyword-parameter new_since works like in get_bug_history.
+        https://bugzilla.readthedocs.io/en/5.0/api/core/v1/bug.html#bug-history
+        """
+        bug_ids = list(bug_ids)
+        if not bug_ids: return {}
+        data = self._get("bug/%i/history" % bug_ids[0], ids = bug_ids[1:], **kw)
+        return {int(bug["id"]): [self._get_history(history) for history in bug["history"]] for bug in data["bugs"]}
+    
     def get_selectable_product_ids(self):
         """
         Return a list of selectable product's ids.
@@ -312,6 +404,14 @@ class Bugzilla:
         if product_id is not None: path += "/" + self._quote(str(product_id))
         return self._get_product(self._get(path, **kw)["products"][0])
     
+    def search_products(self, **kw):
+        """
+        Get a list of products. The keyword-parameters are the same as for get_product,
+        ids and names are lists of product-ids and -names.
+        https://bugzilla.readthedocs.io/en/5.0/api/core/v1/product.html#get-product
+        """
+        return [self._get_product(data) for data in self._get("product", **kw)["products"]]
+    
     def get_classification(self, c_id, **kw):
         """
         Get a classification by its numeric id or name. The parameter c_id can be both.
@@ -327,9 +427,21 @@ class Bugzilla:
         after this datetime. The parameter has to be an encoded datetime.
         https://bugzilla.readthedocs.io/en/5.0/api/core/v1/comment.html#get-comments
         """
-        bug_id = str(bug.id if isinstance(bug, Bug) else bug)
+        bug_id = str(bug_id.id if isinstance(bug_id, Bug) else bug_id)
         return [self._get_comment(obj) for obj in self._get("bug/%s/comment" % self._quote(bug_id), **kw)["bugs"][bug_id]["comments"]]
     
+    def get_comments_by_bugs(self, bug_ids, **kw):
+        """
+        Get the comments of several bugs with one request. The parameter bug_ids is a list of
+        numeric bug-ids. The return value is a dict mapping every bug-id to its list of comments.
+        The keyword-parameter new_since works like in get_comments_by_bug.
+        https://bugzilla.readthedocs.io/en/5.0/api/core/v1/comment.html#get-comments
+        """
+        bug_ids = list(bug_ids)
+        if not bug_ids: return {}
+        data = self._get("bug/%i/comment" % bug_ids[0], ids = bug_ids[1:], **kw)
+        return {int(bug_id): [self._get_comment(obj) for obj in data["bugs"][bug_id]["comments"]] for bug_id in data["bugs"]}
+    
     def get_comment(self, c_id, **kw):
         """
         Gets the comment with the given id. The id has to be an int. This method has two
@@ -525,13 +637,16 @@ class Bugzilla:
         data["comment"] = comment
         return [int(i) for i in self._post("bug/%i/attachment" % ids[0], data)["ids"]]
     
-    def update_attachment(self, attachment, ids = None, comment = ""):
+    def update_attachment(self, attachment, ids = None, comment = "", full = None):
         """
         Update one or more attachments. You can specify a list of attachment-ids whose respective
         attachment shall be updated with this attachment's fields. If none are given, only the
         given attachment will be updated. Optionally you can specify a comment to add to the
         attachment(s).
         The return-value will be a list of UpdateResult's, describing the changes for each attachment.
+        Only the fields changed since the object was loaded are sent, pass full = True to
+        send all fields. If ids contains other ids, all fields are sent by default, since
+        they are applied to every object; pass full = False to send only the changes.
         https://bugzilla.readthedocs.io/en/5.0/api/core/v1/attachment.html#update-attachment
         """
         if ids is None: ids = attachment.id
@@ -539,10 +654,12 @@ class Bugzilla:
         
         if not attachment.can_be_updated():
             raise BugzillaException(-1, "This attachment does not have the required fields set")
-        data = attachment.update_json()
+        data = self._update_json(attachment, full, ids)
         data["ids"] = ids
         data["comment"] = comment
-        return [self._get_update_result(obj) for obj in self._put("bug/attachment/%i" % ids[0], data)["attachments"]]
+        results = [self._get_update_result(obj) for obj in self._put("bug/attachment/%i" % ids[0], data)["attachments"]]
+        attachment.mark_clean()
+        return results
     
     def add_bug(self, bug, **kw):
         'https://bugzilla.readthedocs.io/en/latest/api/core/v1/bug.html'
@@ -551,6 +668,7 @@ class Bugzilla:
         
         data = bug.add_json()
         data.update(kw)
+        if self.metadata_index is not None: self.metadata_index.check_add_json(data)
         return int(self._post("bug", data)["id"])
     
     # since there are so many array fields that are updated via an add/remove/set-object,
@@ -559,7 +677,9 @@ class Bugzilla:
     # in the final update-object. These parameters will be removed once I find a better way.
     # Note: these 3 parameters overwrite keyword-parameters
     # TODO: find a better way.
-    def update_bug(self, bug, ids = None, add = {}, remove = {}, set_ = {}, **kw):
+    # Only the fields changed since the bug was loaded are sent, unless full is True. If ids
+    # contains other bugs, all fields are applied to them by default, unless full is False.
+    def update_bug(self, bug, ids = None, add = {}, remove = {}, set_ = {}, full = None, **kw):
         'https://bugzilla.readthedocs.io/en/latest/api/core/v1/bug.html#update-bug'
         if ids is None: ids = bug.id
         if isinstance(ids, int): ids = [ids]
@@ -575,11 +695,15 @@ class Bugzilla:
         
         if not bug.can_be_updated():
             raise BugzillaException(-1, "This bug does not have the required fields set")
-        data = bug.update_json()
+        data = self._update_json(bug, full, ids)
         data["ids"] = ids
         data.update(kw)
         data.update(asr)
-        return [self._get_update_result(obj) for obj in self._put("bug/%i" % ids[0], data)["bugs"]]
+        if self.metadata_index is not None:
+            self.metadata_index.check_update_json(data, bug, bug.get_original_value("status"))
+        results = [self._get_update_result(obj) for obj in self._put("bug/%i" % ids[0], data)["bugs"]]
+        bug.mark_clean()
+        return results
     
     def add_comment(self, comment, bug_id, **kw):
         """
@@ -625,9 +749,10 @@ class Bugzilla:
         return int(self._post("component", data)["id"])
     
     # both of the methods are not tested yet because i was too lazy to install the latest version
-    def update_component(self, component, product = None, **kw):
+    # update_component only sends the changed fields, unless full is True
+    def update_component(self, component, product = None, full = False, **kw):
         'https://bugzilla.readthedocs.io/en/latest/api/core/v1/component.html#update-component'
-        data = component.update_json()
+        data = self._update_json(component, full)
         if product is None:
             path = str(component.id)
             data["ids"] = component.id
@@ -636,7 +761,9 @@ class Bugzilla:
             data["names"] = [{"product": product, "component": component.name}]
         
         data.update(kw)
-        return self._put("component/" + path, data)["components"]
+        results = self._put("component/" + path, data)["components"]
+        component.mark_clean()
+        return results
     
     def delete_component(self, component_id, product = None):
         """
@@ -667,12 +794,15 @@ class Bugzilla:
         data.update(kw)
         return int(self._post("group", data)["id"])
     
-    def update_group(self, group, ids = None, **kw):
+    def update_group(self, group, ids = None, full = None, **kw):
         """
         Update one or several groups. By default, only the given group will be updated. If
         you pass a list of group-ids in the ids-parameter then these groups will be updated.
         Also, this method accepts the same keyword-parameters as add_group.
         The return value will be a list of UpdateResult's containing all changes.
+        Only the fields changed since the object was loaded are sent, pass full = True to
+        send all fields. If ids contains other ids, all fields are sent by default, since
+        they are applied to every object; pass full = False to send only the changes.
         https://bugzilla.readthedocs.io/en/5.0/api/core/v1/group.html#update-group
         """
         if ids is None: ids = group.id
@@ -680,10 +810,12 @@ class Bugzilla:
         
         if not group.can_be_updated():
             raise BugzillaException(-1, "This group does not have the required fields set")
-        data = group.update_json()
+        data = self._update_json(group, full, ids)
         data.update(kw)
         data["ids"] = ids
-        return [UpdateResult(data) for data in self._put("group/%i" % ids[0], data)["groups"]]
+        results = [UpdateResult(data) for data in self._put("group/%i" % ids[0], data)["groups"]]
+        group.mark_clean()
+        return results
     
     def add_user(self, user, **kw):
         """
@@ -701,7 +833,7 @@ class Bugzilla:
     
     # TODO: until now, the group-objects for this call have to be crafted yourself.
     # find some way to make this more elegant
-    def update_user(self, user, ids = None, **kw):
+    def update_user(self, user, ids = None, full = None, **kw):
         """
         Update one or more users. By default only the given user will be updated. If you pass
         a list of user-ids then the respective users will all be updated. You can also pass
@@ -709,6 +841,9 @@ class Bugzilla:
         method has two more keyword-parameters, groups and bless_groups. For their description
         and data-format see the documentation.
         The return-value will be a list of UpdateResult's containing all the changes.
+        Only the fields changed since the object was loaded are sent, pass full = True to
+        send all fields. If ids contains other ids, all fields are sent by default, since
+        they are applied to every object; pass full = False to send only the changes.
         https://bugzilla.readthedocs.io/en/5.0/api/core/v1/user.html#update-user
         """
         if ids is None: ids = user.id
@@ -716,10 +851,12 @@ class Bugzilla:
         
         if not user.can_be_updated():
             raise BugzillaException(-1, "This user does not have the required fields set")
-        data = user.update_json()
+        data = self._update_json(user, full, ids)
         data["ids"] = ids
         data.update(kw)
-        return [UpdateResult(data) for data in self._put("user/%i" % ids[0], data)["users"]]
+        results = [UpdateResult(data) for data in self._put("user/%i" % ids[0], data)["users"]]
+        user.mark_clean()
+        return results
     
     def add_product(self, product, **kw):
         """
@@ -735,13 +872,16 @@ class Bugzilla:
         data.update(kw)
         return int(self._post("product", data)["ids"])
     
-    def update_product(self, product, ids = None, **kw):
+    def update_product(self, product, ids = None, full = None, **kw):
         """
         Update one or more products. If ids is not given, only the given product will be updated.
         Otherwise all products identified by their ids will be updated. This method has two
         keyword-parameters, is_open and create_series. If specified, these fields will be updated
         too.
         The return-value will be a list of UpdateResult's describing the changes.
+        Only the fields changed since the object was loaded are sent, pass full = True to
+        send all fields. If ids contains other ids, all fields are sent by default, since
+        they are applied to every object; pass full = False to send only the changes.
         https://bugzilla.readthedocs.io/en/5.0/api/core/v1/product.html#create-product
         """
         if ids is None: ids = product.id
@@ -749,10 +889,12 @@ class Bugzilla:
         
         if not product.can_be_updated():
             raise BugzillaException(-1, "This product does not have the required fields set")
-        data = product.update_json()
+        data = self._update_json(product, full, ids)
         data["ids"] = ids
         data.update(kw)
-        return [UpdateResult(data) for data in self._put("product/%i" % ids[0], data)["products"]]
+        results = [UpdateResult(data) for data in self._put("product/%i" % ids[0], data)["products"]]
+        product.mark_clean()
+        return results
     
     def add_flag_type(self, flag_type, target_type, **kw):
         """
@@ -770,13 +912,16 @@ class Bugzilla:
         data["target_type"] = target_type
         return int(self._post("flag_type", data)["ids"])
     
-    def update_flag_type(self, flag_type, ids = None, **kw):
+    def update_flag_type(self, flag_type, ids = None, full = None, **kw):
         """
         Update one or several flag-type. By default only the given flag-type will be updated.
         If you specify ids then the flag-types with these id's will be updated. This method
         has two optional keyword-parameters, inclusions and exclusions. For their description
         and data format, please see the documentation.
         The return-value will be a list of UpdateResult's describing the changes.
+        Only the fields changed since the object was loaded are sent, pass full = True to
+        send all fields. If ids contains other ids, all fields are sent by default, since
+        they are applied to every object; pass full = False to send only the changes.
         https://bugzilla.readthedocs.io/en/5.0/api/core/v1/flagtype.html#update-flag-type
         """
         if ids is None: ids = flag_type.id
@@ -784,7 +929,9 @@ class Bugzilla:
         
         if not flag_type.can_be_updated():
             raise BugzillaException(-1, "This product does not have the required fields set")
-        data = flag_type.update_json()
+        data = self._update_json(flag_type, full, ids)
         data["ids"] = ids
         data.update(kw)
-        return [UpdateResult(data) for data in self._put("flag_type/%i" % ids[0], data)["flagtypes"]]
+        results = [UpdateResult(data) for data in self._put("flag_type/%i" % ids[0], data)["flagtypes"]]
+        flag_type.mark_clean()
+        return results
@@ -0,0 +1,127 @@
+"""
+Counts bugs grouped by some of their fields, e.g. by product, status and priority. If
+bugzilla supports count_only, every cell of the grid is one count_only-search and all
+of them are sent at once, so a grid of a few hundred cells takes about as long as one
+request. Older installations get one search that only includes the id and the grouped
+fields of every bug, the bugs are counted locally then.
+The values of every dimension are either given or taken from the client's metadata
+index (see bugzilla.metadata). Without both, the counting falls back to the search too.
+Bugs with an empty value in a dimension, like the resolution of open bugs, are only
+counted if the empty value is listed in values, since the index doesn't list it.
+The result is a tidy table: a list of dicts with one key per dimension and "count".
+
+    rows = Aggregator(bugzilla).count(["product", "status"], resolution = "---")
+"""
+
+import itertools
+from collections import Counter
+from .metadata import PRODUCT_FIELDS
+from .parallel import bounded_map
+
+class Aggregator:
+    def __init__(self, bugzilla, workers = 32):
+        self.bugzilla = bugzilla
+        self.workers = workers
+    
+    def get_values(self, dimension, product = None):
+        """
+        Returns the values of a dimension from the metadata index or None. Inactive values
+        are included, since existing bugs may still use them.
+        """
+        index = self.bugzilla.get_metadata_index()
+        if index is None: return None
+        if dimension == "product": return sorted(index.products)
+        values = index.get_legal_values(dimension, product, active_only = False)
+        return None if values is None else sorted(values)
+    
+    def get_cells(self, dimensions, values, query):
+        """
+        Returns the list of cells, each a dict mapping the dimensions to one value, or None
+        if the values of a dimension are unknown. Values of per-product fields like component
+        are only combined with their product.
+        """
+        product = query.get("product") if isinstance(query.get("product"), str) else None
+        known = {}
+        for dimension in dimensions:
+            if dimension in values:
+                known[dimension] = list(values[dimension])
+            elif dimension not in PRODUCT_FIELDS or "product" not in dimensions:
+                known[dimension] = self.get_values(dimension, product)
+                if known[dimension] is None: return None
+        
+        independent = [dimension for dimension in dimensions if dimension in known]
+        cells = [dict(zip(independent, combination)) for combination in itertools.product(*(known[d] for d in independent))]
+        for dimension in dimensions:
+            if dimension in known: continue
+            expanded = []
+            for cell in cells:
+                per_product = self.get_values(dimension, cell["product"])
+                expanded.extend(dict(cell, **{dimension: value}) for value in per_product or [])
+            cells = expanded
+        return cells
+    
+    def count(self, dimensions, values = {}, zeros = False, **query):
+        """
+        Count the bugs found with the search-parameters in query by the given dimensions.
+        values may map dimensions to the list of values to count, other values are left
+        out. Cells without bugs are only returned if zeros is True. The rows are sorted
+        by their values.
+        """
+        if not dimensions:
+            raise ValueError("At least one dimension is needed")
+        cells = self.get_cells(dimensions, values, query) if self.bugzilla.supports_count_only() else None
+        if cells is None:
+            counts = self.count_locally(dimensions, values, query)
+        else:
+            counts = self.count_remotely(dimensions, cells, query)
+        
+        rows = [dict(zip(dimensions, key), count = count) for key, count in counts.items() if count or zeros]
+        return sorted(rows, key = lambda row: tuple("" if row[d] is None else str(row[d]) for d in dimensions))
+    
+    def count_remotely(self, dimensions, cells, query):
+        def count_cell(cell):
+            kw = dict(query)
+            kw.update(cell)
+            return self.bugzilla.count_bugs(**kw)
+        # a cell narrows the query, cells outside of it would count bugs the query excludes
+        cells = [cell for cell in cells if not self.is_excluded(cell, query)]
+        return {tuple(cell[d] for d in dimensions): count for cell, count in bounded_map(count_cell, cells, self.workers)}
+    
+    def is_excluded(self, cell, query):
+        "Returns True if a value of the cell is not one of the values the query searches for."
+        for dimension, value in cell.items():
+            if dimension not in query: continue
+            allowed = query[dimension] if isinstance(query[dimension], (list, tuple, set)) else [query[dimension]]
+            if value not in allowed: return True
+        return False
+    
+    def count_locally(self, dimensions, values, query):
+        counts = Counter()
+        for bug in self.bugzilla.search_bugs(include_fields = ["id"] + list(dimensions), **query):
+            # multi-valued fields like keywords count once per value, values the query doesn't
+            # search for are left out like in count_remotely. so are empty values, unless
+            # they were asked for in values, since the grid of count_remotely has no cell for them
+            keys = [[value for value in bug[d] if not self.is_excluded({d: value}, query)]
+                    if isinstance(bug[d], list) else [bug[d]] if not is_empty(bug[d]) or d in values else []
+                    for d in dimensions]
+            for key in itertools.product(*keys):
+                if all(d not in values or value in values[d] for d, value in zip(dimensions, key)):
+                    counts[key] += 1
+        if values and all(d in values for d in dimensions):
+            for key in itertools.product(*(values[d] for d in dimensions)):
+                if not self.is_excluded(dict(zip(dimensions, key)), query): counts.setdefault(key, 0)
+        return counts
+
+def is_empty(value):
+    "Returns True for the empty value of a field, like the resolution of an open bug."
+    return value is None or value == ""
+
+def pivot(rows, row_dimension, column_dimension):
+    """
+    Turns the rows of Aggregator.count with two dimensions into a dict of dicts,
+    table[row_value][column_value] = count.
+    """
+    table = {}
+    for row in rows:
+        table.setdefault(row[row_dimension], {})[row[column_dimension]] = row["count"]
+    return table
@@ -0,0 +1,180 @@
+"""
+Reconstructs the state of bugs at an earlier time from their history. The state of a bug
+is a dict of its fields (status, keywords, assigned_to, ...) with the values bugzilla
+returns today. Starting from the current bug, the history is rewound change by change:
+a single-valued field gets its removed value back, for multi-valued fields like keywords,
+cc or blocks the comma-separated added values are taken out and the removed ones put back.
+A BugTimeline keeps a checkpoint of the state every checkpoint_interval history-entries.
+A query looks up the last entry before the time with a binary search and replays at most
+checkpoint_interval entries from the checkpoint before it. An AsOfIndex holds the
+timelines of many bugs, e.g. to find the bugs that were open at some date.
+
+    index = AsOfIndex()
+    index.load(bugzilla, bug_ids)
+    open_bugs = index.select(datetime(2020, 1, 1), lambda state: state["status"] in ("NEW", "ASSIGNED"))
+"""
+
+from bisect import bisect_right
+from .metadata import PAYLOAD_NAMES
+from .parallel import bounded_map
+from .util import chunks
+
+# the names of fields in the history that differ from the bug-fields
+HISTORY_NAMES = dict(PAYLOAD_NAMES, **{
+    "dependson": "depends_on",
+    "blocked": "blocks",
+    "flagtypes.name": "flags"
+})
+
+SCALAR_FIELDS = ("assigned_to", "classification", "component", "deadline", "dupe_of", "op_sys",
+                "platform", "priority", "product", "qa_contact", "resolution", "severity", "status",
+                "summary", "target_milestone", "url", "version", "whiteboard")
+LIST_FIELDS = ("alias", "blocks", "cc", "depends_on", "flags", "groups", "keywords", "see_also")
+# multi-valued fields of bug-ids
+INT_LIST_FIELDS = ("blocks", "depends_on")
+
+def flag_string(flag):
+    "Returns a flag as the history shows it, e.g. review?(someone@example.com)."
+    string = flag.name + flag.status
+    if flag.get("requestee"): string += "(%s)" % flag.requestee
+    return string
+
+def bug_state(bug):
+    "Returns the current state of a bug as a dict of its fields."
+    state = {field: bug[field] for field in SCALAR_FIELDS}
+    for field in LIST_FIELDS:
+        if field == "flags":
+            state[field] = [flag_string(flag) for flag in bug.flags]
+        elif field == "alias":
+            # older installations return one alias as a string
+            state[field] = list(bug.alias) if isinstance(bug.alias, list) else [bug.alias] if bug.alias else []
+        else:
+            state[field] = list(bug[field])
+    state.update(bug.get_custom_fields())
+    return state
+
+def split_values(field, string):
+    values = [value.strip() for value in string.split(",") if value.strip()]
+    if field in INT_LIST_FIELDS: return [int(value) for value in values]
+    return values
+
+def _is_list(state, field):
+    return field in LIST_FIELDS or isinstance(state.get(field), list)
+
+def apply_change(state, change, forward = True):
+    """
+    Applies a Change to a state-dict, or undoes it if forward is False. Lists are replaced
+    instead of modified, so states can share unchanged lists.
+    """
+    field = HISTORY_NAMES.get(change.field_name, change.field_name)
+    added, removed = (change.added, change.removed) if forward else (change.removed, change.added)
+    if _is_list(state, field):
+        taken = split_values(field, removed)
+        values = [value for value in state.get(field, []) if value not in taken]
+        values.extend(value for value in split_values(field, added) if value not in values)
+        state[field] = values
+    else:
+        state[field] = added
+
+def is_bug_change(change):
+    # the history also contains the changes of the bug's attachments
+    return change.get("attachment_id") is None
+
+class BugTimeline:
+    def __init__(self, bug, history, checkpoint_interval = 16):
+        """
+        bug is the current bug, history its list of History-entries. A checkpoint of the
+        state is kept every checkpoint_interval entries.
+        """
+        if checkpoint_interval < 1:
+            raise ValueError("The checkpoint interval has to be at least 1")
+        self.bug_id = bug.id
+        self.creation_time = bug.creation_time
+        self.checkpoint_interval = checkpoint_interval
+        self.entries = sorted(history, key = lambda entry: entry.when)
+        self.times = [entry.when for entry in self.entries]
+        
+        # checkpoints[i] is the state after the first i * checkpoint_interval entries
+        state = bug_state(bug)
+        for entry in reversed(self.entries):
+            # fields unknown today get their last value from the history
+            for change in entry.changes:
+                field = HISTORY_NAMES.get(change.field_name, change.field_name)
+                if is_bug_change(change) and field not in state:
+                    state[field] = [] if field in LIST_FIELDS else change.added
+        self.checkpoints = [None] * (len(self.entries) // checkpoint_interval + 1)
+        for i in range(len(self.entries), -1, -1):
+            if i % checkpoint_interval == 0:
+                self.checkpoints[i // checkpoint_interval] = dict(state)
+            if i: state = self._apply(state, self.entries[i - 1], False)
+    
+    def _apply(self, state, entry, forward):
+        state = dict(state)
+        for change in entry.changes:
+            if is_bug_change(change): apply_change(state, change, forward)
+        return state
+    
+    def get_state(self, when):
+        """
+        Returns the state of the bug at the given datetime, including the changes made at
+        exactly that time, or None if the bug did not exist yet.
+        """
+        if self.creation_time is not None and when < self.creation_time:
+            return None
+        count = bisect_right(self.times, when)
+        index = count // self.checkpoint_interval
+        state = self.checkpoints[index]
+        for entry in self.entries[index * self.checkpoint_interval:count]:
+            state = self._apply(state, entry, True)
+        return dict(state)
+    
+    def get_value(self, field, when):
+        state = self.get_state(when)
+        return None if state is None else state.get(field)
+    
+    def get_changes(self, field):
+        "Returns a list of (when, value) for every change of a field, starting with the initial value."
+        field = HISTORY_NAMES.get(field, field)
+        values = [(self.creation_time, self.checkpoints[0].get(field))]
+        for when in sorted(set(entry.when for entry in self.entries
+                            if any(HISTORY_NAMES.get(change.field_name, change.field_name) == field
+                                    for change in entry.changes if is_bug_change(change)))):
+            values.append((when, self.get_value(field, when)))
+        return values
+
+class AsOfIndex:
+    def __init__(self, checkpoint_interval = 16):
+        self.checkpoint_interval = checkpoint_interval
+        self.timelines = {}
+    
+    def __len__(self):
+        return len(self.timelines)
+    
+    def add(self, bug, history):
+        "Add a bug with its history, replacing an older timeline of the bug."
+        self.timelines[bug.id] = BugTimeline(bug, history, self.checkpoint_interval)
+    
+    def load(self, bugzilla, bug_ids, chunk_size = 100, workers = 4):
+        "Load the given bugs and their histories from bugzilla."
+        def load_chunk(ids):
+            return bugzilla.search_bugs(id = ids), bugzilla.get_bug_histories(ids)
+        for ids, (bugs, histories) in bounded_map(load_chunk, chunks(list(bug_ids), chunk_size), workers):
+            for bug in bugs:
+                self.add(bug, histories.get(bug.id, []))
+    
+    def get_timeline(self, bug_id):
+        return self.timelines.get(bug_id)
+    
+    def get_state(self, bug_id, when):
+        timeline = self.timelines.get(bug_id)
+        return None if timeline is None else timeline.get_state(when)
+    
+    def states_at(self, when):
+        "Yields (bug_id, state) of all bugs that existed at the given datetime."
+        for bug_id, timeline in self.timelines.items():
+            state = timeline.get_state(when)
+            if state is not None: yield bug_id, state
+    
+    def select(self, when, predicate):
+        "Returns the ids of the bugs whose state at the given datetime matches predicate."
+        return sorted(bug_id for bug_id, state in self.states_at(when) if predicate(state))
@@ -0,0 +1,250 @@
+"""
+A local store for the data of attachments. Every blob is stored once in a file named by
+the sha256 of its content, an sqlite-index maps attachment-ids to these hashes along with
+the last_change_time of the attachment. Identical data attached to many bugs is stored
+only once. If the store grows beyond max_size, the least recently used blobs are removed.
+Reads can verify the hash of the data and open() returns a read-only mmap, so large
+attachments don't have to be read into memory.
+AttachmentCache wraps a client: it asks bugzilla for the attachments without their data
+and only downloads the data that is not in the store or whose attachment was changed.
+
+    store = BlobStore("attachments", max_size = 10 * 1024 ** 3)
+    cache = AttachmentCache(bugzilla, store)
+    attachment = cache.get_attachment(1234)
+"""
+
+import hashlib
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from .util import encode_bugzilla_datetime
+
+INDEX_FILE = "index.sqlite"
+BLOB_DIRECTORY = "blobs"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS blobs_last_access ON blobs (last_access);
+CREATE TABLE IF NOT EXISTS attachments (
+    id INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL,
+    last_change_time TEXT
+);
+CREATE INDEX IF NOT EXISTS attachments_hash ON attachments (hash);
+"""
+
+class BlobStore:
+    def __init__(self, directory, max_size = None):
+        self.directory = directory
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        os.makedirs(os.path.join(directory, BLOB_DIRECTORY), exist_ok = True)
+        self.db = sqlite3.connect(os.path.join(directory, INDEX_FILE), check_same_thread = False)
+        self.db.executescript(SCHEMA)
+    
+    def close(self):
+        self.db.close()
+    
+    def _path(self, digest):
+        return os.path.join(self.directory, BLOB_DIRECTORY, digest[:2], digest)
+    
+    def _time(self, last_change_time):
+        return last_change_time if last_change_time is None or isinstance(last_change_time, str) \
+                else encode_bugzilla_datetime(last_change_time)
+    
+    def __len__(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM attachments").fetchone()[0]
+    
+    def get_size(self):
+        "Returns the size of all stored blobs in bytes."
+        with self.lock:
+            return self.db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+    
+    def get_hash(self, attachment_id, last_change_time = None):
+        """
+        Returns the hash of the stored data of an attachment or None. If last_change_time
+        is given, the data must have been stored for that version of the attachment.
+        """
+        with self.lock:
+            row = self.db.execute("SELECT hash, last_change_time FROM attachments WHERE id = ?",
+                                (attachment_id,)).fetchone()
+        if row is None: return None
+        if last_change_time is not None and row[1] != self._time(last_change_time): return None
+        return row[0]
+    
+    def put(self, attachment_id, data, last_change_time = None):
+        """
+        Store the data of an attachment and return its hash. The file is only written if
+        no other attachment has the same data.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if not os.path.isfile(path):
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+            # the name of the temporary file is unique, several threads might write the same blob
+            tmp = "%s.%i.%i.tmp" % (path, os.getpid(), threading.get_ident())
+            with open(tmp, "wb") as file:
+                file.write(data)
+            os.replace(tmp, path)
+        
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO blobs (hash, size, last_access) VALUES (?, ?, ?)",
+                            (digest, len(data), time.time()))
+            self.db.execute("INSERT OR REPLACE INTO attachments (id, hash, last_change_time) VALUES (?, ?, ?)",
+                            (attachment_id, digest, self._time(last_change_time)))
+        if self.max_size is not None: self.evict(self.max_size)
+        return digest
+    
+    def _touch(self, digest):
+        with self.lock, self.db:
+            self.db.execute("UPDATE blobs SET last_access = ? WHERE hash = ?", (time.time(), digest))
+    
+    def get(self, attachment_id, last_change_time = None, verify = False):
+        """
+        Returns the stored data of an attachment or None, see get_hash for last_change_time.
+        If verify is True, the hash of the data is checked and corrupt blobs are removed.
+        """
+        digest = self.get_hash(attachment_id, last_change_time)
+        if digest is None: return None
+        try:
+            with open(self._path(digest), "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            self._remove_blob(digest)
+            return None
+        if verify and hashlib.sha256(data).hexdigest() != digest:
+            self._remove_blob(digest)
+            return None
+        
+        self._touch(digest)
+        return data
+    
+    def open(self, attachment_id, last_change_time = None):
+        """
+        Like get, but returns a read-only mmap of the blob. The caller has to close it.
+        Empty blobs cannot be mapped, for these b"" is returned.
+        """
+        digest = self.get_hash(attachment_id, last_change_time)
+        if digest is None: return None
+        try:
+            with open(self._path(digest), "rb") as file:
+                if os.fstat(file.fileno()).st_size == 0:
+                    data = b""
+                else:
+                    data = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+        except FileNotFoundError:
+            self._remove_blob(digest)
+            return None
+        
+        self._touch(digest)
+        return data
+    
+    def remove(self, attachment_id):
+        "Removes an attachment, its blob is removed if no other attachment uses it."
+        with self.lock, self.db:
+            row = self.db.execute("SELECT hash FROM attachments WHERE id = ?", (attachment_id,)).fetchone()
+            if row is None: return
+            self.db.execute("DELETE FROM attachments WHERE id = ?", (attachment_id,))
+            used = self.db.execute("SELECT 1 FROM attachments WHERE hash = ? LIMIT 1", row).fetchone()
+        if used is None: self._remove_blob(row[0])
+    
+    def _remove_blob(self, digest):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM blobs WHERE hash = ?", (digest,))
+            self.db.execute("DELETE FROM attachments WHERE hash = ?", (digest,))
+        try:
+            os.remove(self._path(digest))
+        except FileNotFoundError:
+            pass
+    
+    def evict(self, max_size):
+        """
+        Remove the least recently used blobs until all blobs together are no larger than
+        max_size. Returns the number of removed blobs.
+        """
+        with self.lock:
+            total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            if total <= max_size: return 0
+            victims = []
+            for digest, size in self.db.execute("SELECT hash, size FROM blobs ORDER BY last_access"):
+                if total <= max_size: break
+                victims.append(digest)
+                total -= size
+        
+        for digest in victims:
+            self._remove_blob(digest)
+        return len(victims)
+    
+    def check(self):
+        """
+        Verify the hashes of all blobs and remove those that are missing or corrupt.
+        Returns the hashes of the removed blobs.
+        """
+        with self.lock:
+            digests = [row[0] for row in self.db.execute("SELECT hash FROM blobs")]
+        
+        removed = []
+        for digest in digests:
+            sha = hashlib.sha256()
+            try:
+                with open(self._path(digest), "rb") as file:
+                    for block in iter(lambda: file.read(1 << 20), b""):
+                        sha.update(block)
+                valid = sha.hexdigest() == digest
+            except FileNotFoundError:
+                valid = False
+            if not valid:
+                self._remove_blob(digest)
+                removed.append(digest)
+        return removed
+
+def _field_list(fields):
+    if isinstance(fields, str): return fields.split(",") if fields else []
+    return list(fields)
+
+def _exclude_data(kw):
+    kw["exclude_fields"] = _field_list(kw.get("exclude_fields", [])) + ["data"]
+    # the version of the stored data is checked with the last_change_time
+    if "include_fields" in kw:
+        fields = _field_list(kw["include_fields"])
+        if "last_change_time" not in fields: kw["include_fields"] = fields + ["last_change_time"]
+    return kw
+
+class AttachmentCache:
+    def __init__(self, bugzilla, store):
+        self.bugzilla = bugzilla
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+    
+    def _load_data(self, attachment):
+        # without a last_change_time the stored version can't be checked, it's a miss
+        last_change_time = attachment.get("last_change_time")
+        data = None if last_change_time is None else self.store.get(attachment.id, last_change_time)
+        if data is None:
+            self.misses += 1
+            data = self.bugzilla.get_attachment(attachment.id, include_fields = ["data"]).data
+            if last_change_time is not None: self.store.put(attachment.id, data, last_change_time)
+        else:
+            self.hits += 1
+        attachment.data = data
+        attachment.mark_clean()
+        return attachment
+    
+    def get_attachment(self, attachment_id, **kw):
+        """
+        Same as Bugzilla.get_attachment, the data is taken from the store if the attachment
+        was not changed since it was stored.
+        """
+        return self._load_data(self.bugzilla.get_attachment(attachment_id, **_exclude_data(kw)))
+    
+    def get_attachments_by_bug(self, bug, **kw):
+        "Same as Bugzilla.get_attachments_by_bug, with the data taken from the store."
+        return [self._load_data(attachment) for attachment in self.bugzilla.get_attachments_by_bug(bug, **_exclude_data(kw))]
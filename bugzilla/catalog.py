@@ -0,0 +1,183 @@
+"""
+A metadata index (see bugzilla.metadata) for services that look up products, components,
+versions, milestones and flag types by id or name all the time. Products are loaded with
+a few parallel requests instead of one large one, and a service starts from the saved
+index instead of waiting for bugzilla.
+The catalog is revalidated with the audit times like the index, so only the changed
+parts of the products are reloaded. Once max_age seconds have passed since the last
+check, the next lookup starts a refresh in a background thread and keeps serving the old
+state until the refresh is done (stale-while-revalidate). A refreshed catalog is saved
+to the file it was started from.
+Since a Catalog is a MetadataIndex, it can be set on the client with set_metadata_index
+to validate payloads with the same data.
+
+    catalog = Catalog(bugzilla, max_age = 300)
+    catalog.start("catalog.json")
+    component = catalog.get_component("Firefox", "General")
+"""
+
+import os
+import threading
+import time
+from .metadata import MetadataIndex
+from .parallel import bounded_map
+
+class CatalogLookups:
+    """
+    The lookup-tables of one state of the products. A refresh replaces the products of
+    the index, so readers never see a half-updated tree.
+    """
+    
+    def __init__(self, products):
+        self.source = products
+        self.products_by_id = {}
+        self.components_by_id = {}
+        self.flag_types = {}
+        self.flag_types_by_id = {}
+        for product in sorted(products.values(), key = lambda product: product.id):
+            self.products_by_id[product.id] = product
+            # the flag types of a product are those of all its components
+            flag_types = {"bug": {}, "attachment": {}}
+            for component in product.components:
+                self.components_by_id[component.id] = (product, component)
+                for target in flag_types:
+                    for flag_type in component.flag_types.get(target) or []:
+                        flag_types[target][flag_type.id] = flag_type
+                        self.flag_types_by_id[flag_type.id] = flag_type
+            self.flag_types[product.name] = {target: list(types.values()) for target, types in flag_types.items()}
+
+class Catalog(MetadataIndex):
+    def __init__(self, bugzilla, max_age = 300, workers = 8, chunk_size = 20):
+        """
+        max_age is the time in seconds the catalog is served before it is revalidated, None
+        disables automatic revalidation. Products are loaded in requests of chunk_size
+        products with up to workers requests at a time.
+        """
+        MetadataIndex.__init__(self, bugzilla)
+        self.max_age = max_age
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.path = None
+        self.checked = None
+        # the exception of the last background refresh, if it failed
+        self.error = None
+        self._lookups = CatalogLookups(self.products)
+        self._lock = threading.Lock()
+        self._thread = None
+    
+    def start(self, path = None):
+        """
+        Load the catalog from path if it exists and revalidate it in the background,
+        otherwise build it and save it to path. Later refreshes are saved to path too.
+        """
+        self.path = path
+        if path is not None and os.path.exists(path):
+            self.load(path)
+            self.revalidate()
+        else:
+            self.build()
+            if path is not None: self.save(path)
+    
+    def build(self, products = None):
+        MetadataIndex.build(self, products)
+        self.checked = time.monotonic()
+    
+    def refresh(self):
+        changed = MetadataIndex.refresh(self)
+        self.checked = time.monotonic()
+        return changed
+    
+    def revalidate(self, path = None):
+        """
+        Refresh the catalog in a background thread, unless a refresh is running already.
+        A changed catalog is saved to path, by default the path the catalog was started
+        with. Returns the thread.
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return self._thread
+            self._thread = threading.Thread(target = self._revalidate, args = (path or self.path,), daemon = True)
+            self._thread.start()
+            return self._thread
+    
+    def wait(self, timeout = None):
+        "Wait for a running background refresh."
+        thread = self._thread
+        if thread is not None: thread.join(timeout)
+    
+    def _revalidate(self, path):
+        try:
+            if self.refresh() and path is not None: self.save(path)
+            self.error = None
+        except Exception as e:
+            # the stale catalog is served until the next try
+            self.error = e
+            self.checked = time.monotonic()
+    
+    def _current(self):
+        if self.max_age is not None and self.checked is not None and time.monotonic() - self.checked > self.max_age:
+            self.revalidate()
+        lookups = self._lookups
+        if lookups.source is not self.products:
+            lookups = self._lookups = CatalogLookups(self.products)
+        return lookups
+    
+    def _search_products(self, key, values, **kw):
+        chunks = [values[i:i + self.chunk_size] for i in range(0, len(values), self.chunk_size)]
+        products = []
+        for chunk, result in bounded_map(lambda chunk: MetadataIndex._search_products(self, key, chunk, **kw), chunks, self.workers):
+            products.extend(result)
+        return products
+    
+    def load(self, path):
+        """
+        Load a catalog that was saved with save. It counts as unchecked, the first lookup
+        revalidates it unless max_age is None.
+        """
+        MetadataIndex.load(self, path)
+        self.checked = float("-inf")
+    
+    def get_products(self):
+        return list(self._current().products_by_id.values())
+    
+    def get_product(self, id_or_name):
+        "Returns the product with the given id or name, or None."
+        lookups = self._current()
+        if isinstance(id_or_name, int): return lookups.products_by_id.get(id_or_name)
+        return lookups.source.get(id_or_name)
+    
+    def get_component(self, product, name):
+        "Returns the component of a product by their names, or None."
+        product = self.get_product(product)
+        if product is None: return None
+        for component in product.components:
+            if component.name == name: return component
+        return None
+    
+    def get_component_by_id(self, component_id):
+        "Returns (product, component) for a component-id, or None."
+        return self._current().components_by_id.get(component_id)
+    
+    def get_versions(self, product, active_only = False):
+        product = self.get_product(product)
+        if product is None: return None
+        return [version for version in product.versions if version.is_active or not active_only]
+    
+    def get_milestones(self, product, active_only = False):
+        product = self.get_product(product)
+        if product is None: return None
+        return [milestone for milestone in product.milestones if milestone.is_active or not active_only]
+    
+    def get_flag_types(self, product, component = None):
+        """
+        Same as Bugzilla.get_flag_types, a dict with the "bug"- and "attachment"-flag-types
+        of a product or one of its components. Returns None for unknown products.
+        """
+        if component is not None:
+            component = self.get_component(product, component)
+            return None if component is None else component.flag_types
+        product = self.get_product(product)
+        return None if product is None else self._current().flag_types.get(product.name)
+    
+    def get_flag_type(self, flag_type_id):
+        return self._current().flag_types_by_id.get(flag_type_id)
@@ -0,0 +1,78 @@
+"""
+Iterates over the comments of a bug without loading the whole thread at once. new_since
+only limits the start of a request and not its end, so the thread is fetched in two
+steps: a skeleton of all comments with just their id, count and time, and then the full
+comments in windows of window ids at a time with the comment_ids-parameter. Only the
+skeleton and one window are held in memory.
+The iteration can start at a comment count or a datetime, and get_cursor() returns a
+jsonable cursor after every yielded comment, which can be passed to a new iterator to
+continue after that comment.
+
+    comments = CommentIterator(bugzilla, 1234, window = 200)
+    for comment in comments:
+        process(comment)
+        save(comments.get_cursor())
+"""
+
+from .util import encode_bugzilla_datetime, parse_bugzilla_datetime
+
+SKELETON_FIELDS = ["id", "count", "creation_time"]
+
+class CommentIterator:
+    def __init__(self, bugzilla, bug_id, window = 100, start_count = None, since = None, cursor = None):
+        if window < 1:
+            raise ValueError("The window has to contain at least one comment")
+        self.bugzilla = bugzilla
+        self.bug_id = bug_id
+        self.window = window
+        self.start_count = start_count
+        self.since = since
+        if cursor is not None:
+            if cursor["bug_id"] != bug_id:
+                raise ValueError("The cursor belongs to bug %s" % cursor["bug_id"])
+            # the cursor points at the last comment that was yielded
+            self.start_count = cursor["count"] + 1
+            self.since = parse_bugzilla_datetime(cursor["time"])
+        self.last = None
+    
+    def get_skeleton(self):
+        """
+        Returns (id, count, creation_time) of all comments from the start on, ordered by
+        their count.
+        """
+        kw = {"include_fields": SKELETON_FIELDS}
+        # new_since includes comments made at exactly that time
+        if self.since is not None: kw["new_since"] = encode_bugzilla_datetime(self.since)
+        comments = self.bugzilla.get_comments_by_bug(self.bug_id, **kw)
+        return sorted(((comment.id, comment.count, comment.creation_time) for comment in comments
+                    if self.start_count is None or comment.count >= self.start_count), key = lambda entry: entry[1])
+    
+    def fetch(self, comment_ids):
+        "Returns the full comments for the given ids, ordered by their count."
+        comments = self.bugzilla.get_comment(comment_ids[0], comment_ids = comment_ids[1:])
+        if not isinstance(comments, list): comments = [comments]
+        return sorted(comments, key = lambda comment: comment.count)
+    
+    def __iter__(self):
+        skeleton = self.get_skeleton()
+        for i in range(0, len(skeleton), self.window):
+            for comment in self.fetch([entry[0] for entry in skeleton[i:i + self.window]]):
+                self.last = comment
+                yield comment
+    
+    def newest(self, count):
+        "Returns the newest count comments from the start on, without fetching the others."
+        skeleton = self.get_skeleton()[-count:] if count > 0 else []
+        comments = []
+        for i in range(0, len(skeleton), self.window):
+            comments.extend(self.fetch([entry[0] for entry in skeleton[i:i + self.window]]))
+        if comments: self.last = comments[-1]
+        return comments
+    
+    def get_cursor(self):
+        """
+        Returns a jsonable cursor pointing at the last comment returned, or None if nothing
+        was returned yet.
+        """
+        if self.last is None: return None
+        return {"bug_id": self.bug_id, "count": self.last.count, "time": encode_bugzilla_datetime(self.last.creation_time)}
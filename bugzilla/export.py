@@ -0,0 +1,185 @@
+"""
+Exports all bugs of a bugzilla-installation with their comments, histories and
+attachments. The bug-ids are split into ranges of range_size ids, which are exported by
+a pool of workers. Every range is written to its own gzip-compressed jsonl-file (a shard)
+with one line per bug:
+
+    {"bug": {...}, "comments": [...], "history": [...], "attachments": [...]}
+
+The data of the attachments is written to separate files in the attachments-directory,
+the attachment-objects in the shard contain the relative path of that file in "file".
+Finished ranges are recorded in manifest.json, so an interrupted export continues with
+the missing ranges when it is started again. Only one range per worker is held in
+memory and attachments are downloaded one at a time.
+
+    python -m bugzilla.export https://bugzilla.example.com/ export-directory
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, date
+from . import Bugzilla
+from .parallel import bounded_map
+from .util import chunks, range_chart, encode_bugzilla_datetime
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+ATTACHMENT_DIRECTORY = "attachments"
+
+def to_json(obj):
+    # the default for json.dumps, bugzilla-objects are dicts already
+    if isinstance(obj, datetime):
+        return encode_bugzilla_datetime(obj)
+    if isinstance(obj, date):
+        return obj.isoformat()
+    if isinstance(obj, bytes):
+        raise TypeError("Binary data has to be written to a separate file")
+    raise TypeError("Object of type %s is not JSON serializable" % type(obj).__name__)
+
+def dump_line(obj):
+    return json.dumps(obj, default = to_json, separators = (",", ":")) + "\n"
+
+class Exporter:
+    def __init__(self, bugzilla, directory, workers = 4, range_size = 1000, chunk_size = 100,
+                attachments = True, progress = None):
+        self.bugzilla = bugzilla
+        self.directory = directory
+        self.workers = workers
+        self.range_size = range_size
+        self.chunk_size = chunk_size
+        self.attachments = attachments
+        self.progress = progress
+        self.lock = threading.Lock()
+        self.manifest = {"version": MANIFEST_VERSION, "range_size": range_size, "ranges": {}}
+        self.bug_count = 0
+        self.started = None
+    
+    def get_max_bug_id(self):
+        bugs = self.bugzilla.search_bugs(include_fields = ["id"], order = "bug_id DESC", limit = 1)
+        return bugs[0].id if bugs else 0
+    
+    def _manifest_path(self):
+        return os.path.join(self.directory, MANIFEST_FILE)
+    
+    def _load_manifest(self):
+        if not os.path.isfile(self._manifest_path()):
+            return
+        with open(self._manifest_path()) as file:
+            manifest = json.load(file)
+        if manifest.get("version") != MANIFEST_VERSION:
+            raise ValueError("Unsupported export manifest version %r" % manifest.get("version"))
+        if manifest["range_size"] != self.range_size:
+            raise ValueError("The export was started with a range size of %i" % manifest["range_size"])
+        self.manifest = manifest
+    
+    def _save_manifest(self):
+        # the manifest is replaced atomically, a crash leaves the old or the new one
+        path = self._manifest_path()
+        with open(path + ".tmp", "w") as file:
+            json.dump(self.manifest, file, indent = 1, sort_keys = True)
+        os.replace(path + ".tmp", path)
+    
+    def get_pending_ranges(self, max_id):
+        ranges = []
+        for lo in range(1, max_id + 1, self.range_size):
+            if "%i-%i" % (lo, lo + self.range_size) not in self.manifest["ranges"]:
+                ranges.append((lo, lo + self.range_size))
+        return ranges
+    
+    def run(self, max_id = None):
+        """
+        Export all bugs with an id up to max_id, which is looked up if it is not given.
+        Returns the number of bugs exported by this run.
+        """
+        os.makedirs(os.path.join(self.directory, ATTACHMENT_DIRECTORY), exist_ok = True)
+        self._load_manifest()
+        if max_id is None: max_id = self.get_max_bug_id()
+        
+        ranges = self.get_pending_ranges(max_id)
+        total = len(ranges)
+        self.bug_count = 0
+        self.started = time.time()
+        for done, ((lo, hi), count) in enumerate(bounded_map(self.export_range, ranges, self.workers, self.workers), 1):
+            with self.lock:
+                self.manifest["ranges"]["%i-%i" % (lo, hi)] = {"bugs": count, "file": self.get_shard_name(lo)}
+                self._save_manifest()
+                self.bug_count += count
+            if self.progress is not None:
+                elapsed = time.time() - self.started
+                self.progress(done, total, self.bug_count, self.bug_count / elapsed if elapsed else 0.0)
+        return self.bug_count
+    
+    def get_shard_name(self, lo):
+        return "bugs-%09i.jsonl.gz" % lo
+    
+    def export_range(self, bug_range):
+        """
+        Export the bugs with lo <= id < hi into one shard. Returns the number of bugs.
+        """
+        lo, hi = bug_range
+        bug_ids = [bug.id for bug in self.bugzilla.search_bugs(include_fields = ["id"], **range_chart("bug_id", lo, hi))]
+        path = os.path.join(self.directory, self.get_shard_name(lo))
+        with gzip.open(path + ".tmp", "wt", encoding = "utf-8") as file:
+            for chunk in chunks(sorted(bug_ids), self.chunk_size):
+                for record in self.export_bugs(chunk):
+                    file.write(dump_line(record))
+        os.replace(path + ".tmp", path)
+        return len(bug_ids)
+    
+    def export_bugs(self, bug_ids):
+        comments = self.bugzilla.get_comments_by_bugs(bug_ids)
+        histories = self.bugzilla.get_bug_histories(bug_ids)
+        attachments = {}
+        if self.attachments:
+            attachments = self.bugzilla.get_attachments_by_bugs(bug_ids, exclude_fields = ["data"])
+        
+        for bug in self.bugzilla.search_bugs(id = bug_ids):
+            bug_attachments = attachments.get(bug.id, [])
+            for attachment in bug_attachments:
+                attachment["file"] = self.export_attachment(attachment)
+                del attachment["data"]
+            yield {
+                "bug": bug,
+                "comments": comments.get(bug.id, []),
+                "history": histories.get(bug.id, []),
+                "attachments": bug_attachments
+            }
+    
+    def export_attachment(self, attachment):
+        name = os.path.join(ATTACHMENT_DIRECTORY, str(attachment.id))
+        path = os.path.join(self.directory, name)
+        # attachments of a crashed range might be complete already
+        if not os.path.isfile(path):
+            data = self.bugzilla.get_attachment(attachment.id, include_fields = ["data"]).data
+            with open(path + ".tmp", "wb") as file:
+                file.write(data)
+            os.replace(path + ".tmp", path)
+        return name
+
+def print_progress(done, total, bugs, rate):
+    sys.stderr.write("\r%i/%i ranges, %i bugs, %.1f bugs/s" % (done, total, bugs, rate))
+    if done == total: sys.stderr.write("\n")
+    sys.stderr.flush()
+
+def main(args = None):
+    parser = argparse.ArgumentParser(description = "Export all bugs of a bugzilla-installation")
+    parser.add_argument("url", help = "the url of the bugzilla-installation, ending with /")
+    parser.add_argument("directory", help = "the directory to export to")
+    parser.add_argument("--api-key", help = "the api-key to log in with")
+    parser.add_argument("--workers", type = int, default = 4)
+    parser.add_argument("--range-size", type = int, default = 1000)
+    parser.add_argument("--max-id", type = int, help = "the highest bug-id to export")
+    parser.add_argument("--no-attachments", action = "store_true", help = "do not export attachments")
+    args = parser.parse_args(args)
+    
+    exporter = Exporter(Bugzilla(args.url, args.api_key), args.directory, args.workers, args.range_size,
+                        attachments = not args.no_attachments, progress = print_progress)
+    exporter.run(args.max_id)
+
+if __name__ == "__main__":
+    main()
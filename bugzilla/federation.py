@@ -0,0 +1,156 @@
+"""
+Queries several bugzilla-installations at once. A Federation holds named clients and
+sends a call to all of them concurrently. The results are streamed as (name, object)-
+pairs, so every object is tagged with the installation it came from. Without a sort-key
+they are yielded as soon as an installation answers, with a sort-key the sorted results
+of all installations are merged.
+Every installation has its own timeout. An installation that doesn't answer in time or
+fails is left out, the errors (a TimeoutError for a timeout) are collected in the errors
+of the results, so a slow installation gives partial results instead of blocking. Until
+its request that timed out has ended, the installation is left out of new calls too, so
+hanging requests don't fill up the thread-pool.
+
+    federation = Federation({"internal": Bugzilla(...), "partner": Bugzilla(...)}, timeout = 10)
+    results = federation.search_bugs(sort_key = lambda bug: bug.last_change_time, reverse = True,
+                                    status = "NEW")
+    for name, bug in results:
+        print(name, bug.id, bug.summary)
+    print(results.errors)
+"""
+
+import heapq
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+class FederatedResults:
+    """
+    The iterable results of a federated call. errors maps the names of the installations
+    that failed to their exception, it is complete when the iteration has ended.
+    """
+    
+    def __init__(self, federation, function, sort_key = None, reverse = False):
+        self.errors = {}
+        self._iterator = self._run(federation, function, sort_key, reverse)
+    
+    def __iter__(self):
+        return self._iterator
+    
+    def _results(self, federation, function):
+        # yields (name, list of results) as the installations answer
+        futures = {}
+        for name, client in federation.clients.items():
+            if federation.is_busy(name):
+                self.errors[name] = TimeoutError("%s is still busy with a request that timed out" % name)
+                continue
+            futures[federation.executor.submit(function, client)] = name
+        started = time.monotonic()
+        deadlines = {future: started + federation.get_timeout(name) for future, name in futures.items()}
+        pending = set(futures)
+        try:
+            while pending:
+                timeout = max(0, min(deadlines[future] for future in pending) - time.monotonic())
+                done, pending = wait(pending, timeout = timeout, return_when = FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        self.errors[futures[future]] = e
+                        continue
+                    yield futures[future], result if isinstance(result, list) else [result]
+                
+                now = time.monotonic()
+                for future in [future for future in pending if deadlines[future] <= now]:
+                    pending.discard(future)
+                    name = futures[future]
+                    # a running request can't be stopped, the installation is skipped until it ends
+                    if not future.cancel(): federation._set_busy(name, future)
+                    self.errors[name] = TimeoutError("%s did not answer within %s seconds" % (name, federation.get_timeout(name)))
+        finally:
+            for future in pending:
+                future.cancel()
+    
+    def _run(self, federation, function, sort_key, reverse):
+        if sort_key is None:
+            for name, results in self._results(federation, function):
+                for obj in results:
+                    yield name, obj
+            return
+        
+        # any installation may have the first result, so the merge starts when all have answered
+        # or timed out. the results of every installation are sorted as soon as they arrive.
+        streams = []
+        for name, results in self._results(federation, function):
+            results.sort(key = sort_key, reverse = reverse)
+            streams.append(_tagged(name, results))
+        yield from heapq.merge(*streams, key = lambda pair: sort_key(pair[1]), reverse = reverse)
+
+def _tagged(name, results):
+    for obj in results:
+        yield name, obj
+
+class Federation:
+    def __init__(self, clients, timeout = 30, timeouts = {}, workers = None):
+        """
+        clients maps the names of the installations to their clients. timeout is the
+        timeout in seconds for all installations not in timeouts.
+        """
+        self.clients = dict(clients)
+        self.timeout = timeout
+        self.timeouts = dict(timeouts)
+        # every installation has at most one request that timed out and one new request
+        self.executor = ThreadPoolExecutor(max(workers or 4, len(self.clients) * 2))
+        self.busy = set()
+        self.lock = threading.Lock()
+    
+    def close(self):
+        self.executor.shutdown(wait = False)
+    
+    def get_client(self, name):
+        return self.clients[name]
+    
+    def get_timeout(self, name):
+        return self.timeouts.get(name, self.timeout)
+    
+    def set_timeout(self, name, timeout):
+        self.timeouts[name] = timeout
+    
+    def is_busy(self, name):
+        "Returns True if a request to the installation timed out and is still running."
+        with self.lock:
+            return name in self.busy
+    
+    def _set_busy(self, name, future):
+        with self.lock:
+            self.busy.add(name)
+        future.add_done_callback(lambda future: self._set_idle(name))
+    
+    def _set_idle(self, name):
+        with self.lock:
+            self.busy.discard(name)
+    
+    def call(self, method, *args, sort_key = None, reverse = False, **kw):
+        """
+        Call the client-method with the given name and arguments on all installations.
+        Returns FederatedResults, lists returned by the method are flattened.
+        """
+        return FederatedResults(self, lambda client: getattr(client, method)(*args, **kw), sort_key, reverse)
+    
+    def search_bugs(self, sort_key = None, reverse = False, **kw):
+        "Same as Bugzilla.search_bugs on all installations."
+        return self.call("search_bugs", sort_key = sort_key, reverse = reverse, **kw)
+    
+    def get_bugs(self, bug_ids, sort_key = None, reverse = False, **kw):
+        """
+        Get the bugs with the given ids or aliases from all installations. Installations
+        without some of the bugs return the others.
+        """
+        return self.call("search_bugs", sort_key = sort_key, reverse = reverse, id = list(bug_ids), **kw)
+    
+    def search_users(self, sort_key = None, reverse = False, **kw):
+        "Same as Bugzilla.search_users on all installations."
+        return self.call("search_users", sort_key = sort_key, reverse = reverse, **kw)
+    
+    def get_user(self, user_id, **kw):
+        "Look up a user on all installations, installations not knowing the user fail."
+        return self.call("get_user", user_id, **kw)
@@ -0,0 +1,484 @@
+"""
+A local full-text index over comments and the summaries and whiteboards of bugs.
+Documents are tokenized into lowercase words and stored in postings lists, which map
+every word to the documents (and the positions inside these documents) that contain it.
+Queries are a list of words that all have to be found in a document. A word ending with
+* matches all words with that prefix, words in double quotes have to appear as a phrase.
+The hits are ranked with BM25.
+
+If the index has a directory, flush() writes the documents added since the last flush
+into a new, immutable segment-file. Segments are memory-mapped when the index is opened,
+the words are found with a binary search in the file, so only the postings of the
+searched words are read from disk. Adding a document with
+the same key as an existing one (e.g. a bug whose summary changed) replaces it, merge()
+compacts all segments into one and drops replaced documents.
+update_comments fetches the new comments of a bug with new_since and indexes them, the
+time of the newest comment per bug is stored in the index to continue there.
+"""
+
+import json
+import math
+import mmap
+import os
+import re
+import struct
+from bisect import bisect_left
+from .objects import BugzillaObject
+from .util import encode_varint, decode_varint, parse_bugzilla_datetime, encode_bugzilla_datetime
+
+SEGMENT_MAGIC = b"BZFT"
+SEGMENT_VERSION = 2
+# magic, version, number of documents, number of terms, total length of the documents and
+# the length of the names of the document-kinds
+SEGMENT_HEADER = struct.Struct("<4sIIIQI")
+# kind (an index into the names), id, bug-id and length of a document
+DOC = struct.Struct("<IqqI")
+OFFSET = struct.Struct("<Q")
+MANIFEST_FILE = "manifest.json"
+
+# BM25-parameters
+K1 = 1.2
+B = 0.75
+
+TOKEN_RE = re.compile(r"\w+")
+QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+class SearchHit(BugzillaObject):
+    ATTRIBUTES = {
+        "kind": "",
+        "id": -1,
+        "bug_id": -1,
+        "score": 0.0
+    }
+    
+    def __init__(self, attributes = {}):
+        BugzillaObject.__init__(self, attributes)
+        self.set_default_attributes(SearchHit.ATTRIBUTES)
+
+class MemorySegment:
+    # the segment new documents are added to. docs is a list of (kind, id, bug_id, length),
+    # the postings map words to {document-number: [positions]}
+    def __init__(self):
+        self.docs = []
+        self.postings = {}
+        self.sorted_terms = None
+        self.total_length = 0
+    
+    def __len__(self):
+        return len(self.docs)
+    
+    def add(self, key, bug_id, tokens):
+        doc = len(self.docs)
+        self.docs.append((key[0], key[1], bug_id, len(tokens)))
+        self.total_length += len(tokens)
+        for position, token in enumerate(tokens):
+            self.postings.setdefault(token, {}).setdefault(doc, []).append(position)
+        self.sorted_terms = None
+        return doc
+    
+    def get_doc(self, doc):
+        return self.docs[doc]
+    
+    def get_postings(self, term):
+        return self.postings.get(term, {})
+    
+    def get_terms(self, prefix = ""):
+        "Returns the sorted terms starting with prefix."
+        if self.sorted_terms is None:
+            self.sorted_terms = sorted(self.postings)
+        i = bisect_left(self.sorted_terms, prefix)
+        terms = []
+        while i < len(self.sorted_terms) and self.sorted_terms[i].startswith(prefix):
+            terms.append(self.sorted_terms[i])
+            i += 1
+        return terms
+    
+    def encode(self):
+        """
+        Returns the segment as bytes. After the header and the names of the document-kinds
+        follow fixed-width records of the documents, the offsets of the terms and of their
+        postings lists, the sorted terms and the postings. Every postings list is a sequence
+        of varints: the delta to the previous document number, the number of positions and
+        the deltas of the positions.
+        """
+        kinds = sorted(set(doc[0] for doc in self.docs))
+        kind_indexes = {kind: i for i, kind in enumerate(kinds)}
+        kind_data = "\n".join(kinds).encode("utf-8")
+        
+        docs = bytearray()
+        for kind, obj_id, bug_id, length in self.docs:
+            docs.extend(DOC.pack(kind_indexes[kind], obj_id, bug_id, length))
+        
+        blob = bytearray()
+        term_data = bytearray()
+        term_offsets = [0]
+        postings_offsets = [0]
+        for term in self.get_terms():
+            previous = 0
+            for doc, positions in sorted(self.postings[term].items()):
+                encode_varint(doc - previous, blob)
+                encode_varint(len(positions), blob)
+                last = 0
+                for position in positions:
+                    encode_varint(position - last, blob)
+                    last = position
+                previous = doc
+            term_data.extend(term.encode("utf-8"))
+            term_offsets.append(len(term_data))
+            postings_offsets.append(len(blob))
+        
+        data = bytearray(SEGMENT_HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION, len(self.docs), len(term_offsets) - 1,
+                                            self.total_length, len(kind_data)))
+        data.extend(kind_data)
+        # the arrays start at multiples of 8
+        data.extend(bytes(-len(data) % 8))
+        data.extend(struct.pack("<%iQ" % len(term_offsets), *term_offsets))
+        data.extend(struct.pack("<%iQ" % len(postings_offsets), *postings_offsets))
+        data.extend(docs)
+        data.extend(term_data)
+        data.extend(blob)
+        return bytes(data)
+
+class DiskSegment:
+    # an immutable, memory-mapped segment written by MemorySegment.encode. only the header
+    # is read on open, the terms are found with a binary search in the mapped file
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+        if len(self.data) < SEGMENT_HEADER.size or self.data[:4] != SEGMENT_MAGIC:
+            self.close()
+            raise ValueError("%s is not a full-text segment" % path)
+        magic, version, self.doc_count, self.term_count, self.total_length, kinds_length = SEGMENT_HEADER.unpack_from(self.data)
+        if version != SEGMENT_VERSION:
+            self.close()
+            raise ValueError("Unsupported segment version %i" % version)
+        
+        pos = SEGMENT_HEADER.size
+        self.kinds = self.data[pos:pos + kinds_length].decode("utf-8").split("\n")
+        pos += kinds_length
+        pos += -pos % 8
+        self.term_offsets = pos
+        self.postings_offsets = pos + 8 * (self.term_count + 1)
+        self.docs = self.postings_offsets + 8 * (self.term_count + 1)
+        self.terms = self.docs + DOC.size * self.doc_count
+        self.postings = self.terms + self._offset(self.term_offsets, self.term_count)
+    
+    def __len__(self):
+        return self.doc_count
+    
+    def close(self):
+        self.data.close()
+        self.file.close()
+    
+    def _offset(self, table, i):
+        return OFFSET.unpack_from(self.data, table + 8 * i)[0]
+    
+    def _term(self, i):
+        # the term as utf-8, bytes compare like the strings they encode
+        return self.data[self.terms + self._offset(self.term_offsets, i):self.terms + self._offset(self.term_offsets, i + 1)]
+    
+    def _find(self, term):
+        # returns the index of the first term >= term
+        lo, hi = 0, self.term_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term(mid) < term:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+    
+    def get_doc(self, doc):
+        kind, obj_id, bug_id, length = DOC.unpack_from(self.data, self.docs + DOC.size * doc)
+        return self.kinds[kind], obj_id, bug_id, length
+    
+    def get_postings(self, term):
+        term = term.encode("utf-8")
+        i = self._find(term)
+        if i == self.term_count or self._term(i) != term:
+            return {}
+        pos = self.postings + self._offset(self.postings_offsets, i)
+        end = self.postings + self._offset(self.postings_offsets, i + 1)
+        postings = {}
+        doc = 0
+        while pos < end:
+            delta, pos = decode_varint(self.data, pos)
+            count, pos = decode_varint(self.data, pos)
+            doc += delta
+            positions = []
+            position = 0
+            for j in range(count):
+                delta, pos = decode_varint(self.data, pos)
+                position += delta
+                positions.append(position)
+            postings[doc] = positions
+        return postings
+    
+    def get_terms(self, prefix = ""):
+        "Returns the sorted terms starting with prefix."
+        prefix = prefix.encode("utf-8")
+        terms = []
+        i = self._find(prefix)
+        while i < self.term_count:
+            term = self._term(i)
+            if not term.startswith(prefix): break
+            terms.append(term.decode("utf-8"))
+            i += 1
+        return terms
+
+class FullTextIndex:
+    def __init__(self, directory = None):
+        self.directory = directory
+        self.segments = []
+        self.memory = MemorySegment()
+        # maps document-keys to the (segment, document-number) of their latest version
+        self.latest = {}
+        # the summed length of the latest documents, for BM25
+        self.live_length = 0
+        # the time of the newest indexed comment per bug
+        self.cursors = {}
+        self.segment_counter = 0
+        
+        if directory is not None:
+            os.makedirs(directory, exist_ok = True)
+            self._open()
+    
+    def _open(self):
+        path = os.path.join(self.directory, MANIFEST_FILE)
+        if not os.path.isfile(path):
+            return
+        with open(path) as file:
+            manifest = json.load(file)
+        
+        self.segment_counter = manifest["counter"]
+        self.cursors = {int(bug_id): parse_bugzilla_datetime(time) for bug_id, time in manifest["cursors"].items()}
+        for name in manifest["segments"]:
+            self.segments.append(DiskSegment(os.path.join(self.directory, name)))
+        for segment in self.segments:
+            for doc in range(len(segment)):
+                kind, obj_id, bug_id, length = segment.get_doc(doc)
+                self._set_latest((kind, obj_id), segment, doc, length)
+    
+    def _set_latest(self, key, segment, doc, length):
+        old = self.latest.get(key)
+        if old is not None: self.live_length -= old[0].get_doc(old[1])[3]
+        self.latest[key] = (segment, doc)
+        self.live_length += length
+    
+    def _write_manifest(self):
+        manifest = {
+            "counter": self.segment_counter,
+            "segments": [os.path.basename(segment.path) for segment in self.segments],
+            "cursors": {str(bug_id): encode_bugzilla_datetime(time) for bug_id, time in self.cursors.items()}
+        }
+        path = os.path.join(self.directory, MANIFEST_FILE)
+        with open(path + ".tmp", "w") as file:
+            json.dump(manifest, file)
+        os.replace(path + ".tmp", path)
+    
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+    
+    def __len__(self):
+        return len(self.latest)
+    
+    def add_document(self, kind, obj_id, bug_id, text):
+        """
+        Index a document. kind and obj_id identify the document, e.g. ("comment", 42).
+        """
+        key = (kind, obj_id)
+        tokens = tokenize(text)
+        self._set_latest(key, self.memory, self.memory.add(key, bug_id, tokens), len(tokens))
+    
+    def add_comment(self, comment):
+        self.add_document("comment", comment.id, comment.bug_id, comment.text)
+        time = comment.creation_time or comment.time
+        if time is not None and (comment.bug_id not in self.cursors or self.cursors[comment.bug_id] < time):
+            self.cursors[comment.bug_id] = time
+    
+    def add_comments(self, comments):
+        for comment in comments:
+            self.add_comment(comment)
+    
+    def add_bug(self, bug):
+        """
+        Index the summary and the whiteboard of a bug.
+        """
+        self.add_document("bug", bug.id, bug.id, "%s\n%s" % (bug.get("summary", ""), bug.get("whiteboard", "")))
+    
+    def update_comments(self, bugzilla, bug_id):
+        """
+        Fetch and index all comments of a bug that were added since the last update of
+        this bug. Returns the list of new comments.
+        """
+        kw = {}
+        if bug_id in self.cursors:
+            kw["new_since"] = encode_bugzilla_datetime(self.cursors[bug_id])
+        comments = bugzilla.get_comments_by_bug(bug_id, **kw)
+        # new_since includes comments made at exactly that time
+        comments = [comment for comment in comments
+                    if ("comment", comment.id) not in self.latest]
+        self.add_comments(comments)
+        return comments
+    
+    def flush(self):
+        """
+        Write all documents added since the last flush into a new segment.
+        """
+        if self.directory is None:
+            raise ValueError("This index has no directory to flush to")
+        if not len(self.memory):
+            self._write_manifest()
+            return
+        
+        self._write_segments([self.memory])
+    
+    def merge(self):
+        """
+        Merge all segments and unflushed documents into a single segment. Replaced
+        documents are dropped.
+        """
+        if self.directory is None:
+            raise ValueError("This index has no directory to merge into")
+        self._write_segments(self.segments + [self.memory], replace = True)
+    
+    def _write_segments(self, sources, replace = False):
+        merged = MemorySegment()
+        latest = {}
+        for segment in sources:
+            docs = self._live_docs(segment)
+            if not docs: continue
+            # the positions are rebuilt from the postings of the source segment
+            tokens = {doc: [] for doc in docs}
+            for term in segment.get_terms():
+                for doc, positions in segment.get_postings(term).items():
+                    if doc in tokens:
+                        tokens[doc].extend((position, term) for position in positions)
+            for doc in sorted(docs):
+                kind, obj_id, bug_id, length = segment.get_doc(doc)
+                latest[(kind, obj_id)] = merged.add((kind, obj_id), bug_id, [term for position, term in sorted(tokens[doc])])
+        
+        self.segment_counter += 1
+        name = "segment-%06i.bzft" % self.segment_counter
+        path = os.path.join(self.directory, name)
+        with open(path + ".tmp", "wb") as file:
+            file.write(merged.encode())
+        os.replace(path + ".tmp", path)
+        
+        old = [segment for segment in self.segments if segment in sources]
+        new = DiskSegment(path)
+        self.segments = [segment for segment in self.segments if segment not in sources] + [new]
+        self.memory = MemorySegment()
+        for key, doc in latest.items():
+            self.latest[key] = (new, doc)
+        self._write_manifest()
+        
+        if replace:
+            for segment in old:
+                segment.close()
+                os.remove(segment.path)
+    
+    def _is_live(self, segment, doc):
+        # replaced documents stay in their segment until it is merged
+        kind, obj_id, bug_id, length = segment.get_doc(doc)
+        return self.latest.get((kind, obj_id)) == (segment, doc)
+    
+    def _live_docs(self, segment):
+        return {doc for doc in range(len(segment)) if self._is_live(segment, doc)}
+    
+    def _all_segments(self):
+        return self.segments + [self.memory]
+    
+    def _expand(self, term):
+        # returns the terms matched by a query-term, which can be a prefix
+        if not term.endswith("*"):
+            return {term}
+        prefix = term[:-1].lower()
+        terms = set()
+        for segment in self._all_segments():
+            terms.update(segment.get_terms(prefix))
+        return terms
+    
+    def _parse_query(self, query):
+        # returns a list of clauses, every clause is a list of term-sets that have to
+        # appear one after another
+        clauses = []
+        for phrase, word in QUERY_RE.findall(query):
+            if phrase:
+                clause = [self._expand(term) for term in tokenize(phrase)]
+            else:
+                prefix = word.endswith("*")
+                clause = [self._expand(term) for term in tokenize(word)]
+                if prefix and clause:
+                    clause[-1] = self._expand(tokenize(word)[-1] + "*")
+            if clause: clauses.append(clause)
+        return clauses
+    
+    def _match_clause(self, segment, clause):
+        # returns {document-number: term frequency} of the latest documents matching the clause
+        postings = []
+        for terms in clause:
+            merged = {}
+            for term in terms:
+                for doc, positions in segment.get_postings(term).items():
+                    merged.setdefault(doc, set()).update(positions)
+            postings.append(merged)
+        if not postings:
+            return {}
+        
+        docs = {doc for doc in postings[0] if self._is_live(segment, doc)}
+        for merged in postings[1:]:
+            docs &= set(merged)
+        matches = {}
+        for doc in docs:
+            if len(postings) == 1:
+                count = len(postings[0][doc])
+            else:
+                count = sum(1 for start in postings[0][doc]
+                            if all(start + i in postings[i][doc] for i in range(1, len(postings))))
+            if count: matches[doc] = count
+        return matches
+    
+    def search(self, query, limit = 10, kind = None):
+        """
+        Search the index and return a list of SearchHits ordered by their score. kind can
+        be "comment" or "bug" to search only comments or only bugs.
+        """
+        clauses = self._parse_query(query)
+        if not clauses:
+            return []
+        
+        segments = self._all_segments()
+        # only the latest versions of the documents count
+        doc_count = len(self.latest) or 1
+        average_length = self.live_length / doc_count or 1
+        
+        # the document frequencies of the clauses are summed over all segments
+        matches = [[self._match_clause(segment, clause) for clause in clauses] for segment in segments]
+        idfs = []
+        for i in range(len(clauses)):
+            df = sum(len(segment_matches[i]) for segment_matches in matches)
+            idfs.append(math.log(1 + (doc_count - df + 0.5) / (df + 0.5)))
+        
+        hits = []
+        for segment, segment_matches in zip(segments, matches):
+            docs = set(segment_matches[0])
+            for clause_matches in segment_matches[1:]:
+                docs &= set(clause_matches)
+            for doc in docs:
+                doc_kind, obj_id, bug_id, length = segment.get_doc(doc)
+                if kind is not None and doc_kind != kind: continue
+                
+                score = 0.0
+                for idf, clause_matches in zip(idfs, segment_matches):
+                    tf = clause_matches[doc]
+                    score += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / average_length))
+                hits.append(SearchHit({"kind": doc_kind, "id": obj_id, "bug_id": bug_id, "score": score}))
+        
+        hits.sort(key = lambda hit: (-hit.score, hit.kind, hit.id))
+        return hits if limit is None else hits[:limit]
@@ -0,0 +1,211 @@
+"""
+A dependency-graph of bugs, built from the link-fields blocks, depends_on, dupe_of and
+see_also. The graph is walked breadth-first and every level of the walk is fetched in
+as few requests as possible: all unknown bugs of the level are requested with one
+search_bugs-call (split into chunks of chunk_size ids) that only includes the fields
+needed for the graph. Fetched bugs are cached, so later walks only request bugs that
+were not seen before. Call invalidate to forget bugs whose links have changed.
+see_also only creates edges for urls pointing to the same bugzilla-installation.
+"""
+
+import re
+from .util import chunks
+
+LINK_FIELDS = ("blocks", "depends_on", "dupe_of", "see_also")
+NODE_FIELDS = ("id", "status", "resolution", "is_open") + LINK_FIELDS
+
+class BugGraph:
+    def __init__(self, bugzilla, chunk_size = 200):
+        self.bugzilla = bugzilla
+        self.chunk_size = chunk_size
+        # bug-id to bug, inaccessible bugs are stored as None so they are not fetched again
+        self.nodes = {}
+        base_url = bugzilla.url[:-len("rest/")]
+        self.see_also_re = re.compile(re.escape(base_url) + r"show_bug\.cgi\?id=(\d+)$")
+        self.requests = 0
+    
+    def __contains__(self, bug_id):
+        return bug_id in self.nodes
+    
+    def get_node(self, bug_id):
+        return self.nodes.get(bug_id)
+    
+    def invalidate(self, bug_ids = None):
+        """
+        Remove the given bugs from the cache, or all bugs if no ids are given.
+        """
+        if bug_ids is None:
+            self.nodes.clear()
+        else:
+            for bug_id in bug_ids:
+                self.nodes.pop(bug_id, None)
+    
+    def fetch(self, bug_ids):
+        """
+        Fetch all given bugs that are not cached yet.
+        """
+        missing = sorted({bug_id for bug_id in bug_ids if bug_id not in self.nodes})
+        for chunk in chunks(missing, self.chunk_size):
+            self.requests += 1
+            for bug in self.bugzilla.search_bugs(id = chunk, include_fields = NODE_FIELDS):
+                self.nodes[bug.id] = bug
+            for bug_id in chunk:
+                self.nodes.setdefault(bug_id, None)
+    
+    def get_edges(self, bug_id, fields = ("depends_on", )):
+        """
+        Returns the ids linked to the given bug through the given fields. The bug has to
+        be fetched already.
+        """
+        bug = self.nodes.get(bug_id)
+        if bug is None:
+            return []
+        edges = []
+        for field in fields:
+            value = bug.get(field)
+            if field == "see_also":
+                for url in value or []:
+                    match = self.see_also_re.match(url)
+                    if match: edges.append(int(match.group(1)))
+            elif isinstance(value, list):
+                edges.extend(value)
+            elif value is not None:
+                edges.append(value)
+        return edges
+    
+    def walk(self, roots, fields = ("depends_on", ), max_depth = None):
+        """
+        Walk the graph breadth-first from the given root-ids along the given link-fields.
+        Returns a dict mapping every reached bug-id to its distance from the roots.
+        """
+        if isinstance(roots, int): roots = [roots]
+        depths = {root: 0 for root in roots}
+        frontier = list(depths)
+        depth = 0
+        while frontier and (max_depth is None or depth < max_depth):
+            self.fetch(frontier)
+            depth += 1
+            next_frontier = []
+            for bug_id in frontier:
+                for linked in self.get_edges(bug_id, fields):
+                    if linked not in depths:
+                        depths[linked] = depth
+                        next_frontier.append(linked)
+            frontier = next_frontier
+        self.fetch(frontier)
+        return depths
+    
+    def closure(self, root, fields = ("depends_on", )):
+        """
+        Returns the set of bugs reachable from root, without root itself.
+        """
+        reached = set(self.walk(root, fields))
+        reached.discard(root)
+        return reached
+    
+    def get_adjacency(self, roots, fields = ("depends_on", )):
+        """
+        Returns the subgraph reachable from the roots as dict of bug-id to list of ids.
+        """
+        return {bug_id: self.get_edges(bug_id, fields) for bug_id in self.walk(roots, fields)}
+    
+    def find_cycles(self, roots, fields = ("depends_on", )):
+        """
+        Returns a list of cycles in the subgraph reachable from the roots. Every cycle is
+        a sorted list of the ids of a strongly connected component.
+        """
+        adjacency = self.get_adjacency(roots, fields)
+        # an iterative version of tarjan's algorithm, bug-graphs can be very deep
+        index = {}
+        lowlink = {}
+        stack = []
+        on_stack = set()
+        cycles = []
+        counter = 0
+        for start in adjacency:
+            if start in index: continue
+            work = [(start, 0)]
+            while work:
+                node, i = work.pop()
+                if i == 0:
+                    index[node] = lowlink[node] = counter
+                    counter += 1
+                    stack.append(node)
+                    on_stack.add(node)
+                edges = adjacency.get(node, [])
+                if i < len(edges):
+                    work.append((node, i + 1))
+                    linked = edges[i]
+                    if linked not in index:
+                        work.append((linked, 0))
+                    elif linked in on_stack:
+                        lowlink[node] = min(lowlink[node], index[linked])
+                    continue
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node: break
+                    if len(component) > 1 or node in edges:
+                        cycles.append(sorted(component))
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+        return cycles
+    
+    def is_open(self, bug_id):
+        bug = self.nodes.get(bug_id)
+        return bug is not None and bug.is_open
+    
+    def open_blockers(self, root):
+        """
+        Returns the sorted ids of all open bugs the given bug transitively depends on.
+        """
+        return sorted(bug_id for bug_id in self.closure(root) if self.is_open(bug_id))
+    
+    def critical_path(self, root):
+        """
+        Returns the longest chain of open bugs the given bug depends on, starting at root.
+        This is the chain of bugs that has to be fixed one after another before root can
+        be fixed. Closed bugs end a chain. Raises a ValueError if the dependencies contain
+        a cycle.
+        """
+        adjacency = self.get_adjacency(root)
+        if self.find_cycles(root):
+            raise ValueError("The dependencies of bug %i contain a cycle" % root)
+        
+        # longest paths in a dag, computed in reverse topological order
+        order = []
+        visited = set()
+        for start in adjacency:
+            if start in visited: continue
+            visited.add(start)
+            work = [(start, iter(adjacency[start]))]
+            while work:
+                node, edges = work[-1]
+                for linked in edges:
+                    if linked not in visited and linked in adjacency:
+                        visited.add(linked)
+                        work.append((linked, iter(adjacency[linked])))
+                        break
+                else:
+                    work.pop()
+                    order.append(node)
+        
+        length = {}
+        successor = {}
+        for node in order:
+            length[node] = 0
+            if node != root and not self.is_open(node):
+                continue
+            for linked in adjacency[node]:
+                if linked in length and self.is_open(linked) and length[linked] + 1 > length[node]:
+                    length[node] = length[linked] + 1
+                    successor[node] = linked
+        
+        path = [root]
+        while path[-1] in successor:
+            path.append(successor[path[-1]])
+        return path
@@ -0,0 +1,131 @@
+"""
+An identity map deduplicates the objects that bugzilla sends over and over again.
+A search_bugs-result contains the same assignees, creators and cc's for nearly every
+bug, and the histories of these bugs contain the same changes (e.g. status NEW to
+ASSIGNED) thousands of times. If an identity map is set on the client, all equal user
+details and changes are decoded into one shared instance, and common strings are
+interned so that only one copy of every product-, status- or email-string exists.
+Shared instances are immutable, since changing the assignee of one bug would otherwise
+change the assignee of every bug the user is assigned to. If you want to change such
+an object, use the copy-method to get a mutable version.
+The map keeps at most max_size users and max_size changes. When it is full, the entries
+that were used least recently are dropped; objects already returned stay valid.
+A map can be shared by threads, e.g. by a prefetcher or a federation using one client.
+"""
+
+from copy import deepcopy
+from sys import intern
+import threading
+from .objects import User, Change
+
+class FrozenBugzillaObject:
+    # mixin for bugzilla-objects that are shared across results. all methods that
+    # would modify the dict raise an error.
+    FROZEN = True
+    
+    def _frozen(self, *args, **kw):
+        raise TypeError("%s is shared by the identity map and cannot be modified" % type(self).__name__)
+    
+    __setitem__ = __delitem__ = _frozen
+    __setattr__ = __delattr__ = _frozen
+    clear = pop = popitem = setdefault = update = _frozen
+    
+    def _init_frozen(self, attributes, defaults = {}):
+        dict.__init__(self, attributes)
+        for key, value in deepcopy(defaults).items():
+            dict.setdefault(self, key, value)
+    
+    def copy(self):
+        # the mutable class is the one after the mixin
+        return type(self).__mro__[2](dict(self))
+
+class FrozenUser(FrozenBugzillaObject, User):
+    def __init__(self, attributes = {}):
+        # user details only contain some of the attributes of a user, the missing ones
+        # (e.g. groups) are left out instead of being filled with made-up defaults
+        self._init_frozen(attributes)
+
+class FrozenChange(FrozenBugzillaObject, Change):
+    def __init__(self, attributes = {}):
+        self._init_frozen(attributes, Change.ATTRIBUTES)
+
+class IdentityMap:
+    # the values of these fields repeat across most results and are interned
+    INTERNED_FIELDS = ("added", "classification", "component", "creator", "email", "field_name",
+                    "name", "op_sys", "platform", "priority", "product", "real_name", "removed",
+                    "requestee", "resolution", "setter", "severity", "status", "target_milestone",
+                    "version", "who")
+    
+    def __init__(self, max_size = 10000):
+        if max_size < 1:
+            raise ValueError("The maximum size has to be at least 1")
+        self.max_size = max_size
+        self.users = {}
+        self.changes = {}
+        self.hits = 0
+        self.lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self.users) + len(self.changes)
+    
+    def clear(self):
+        with self.lock:
+            self.users.clear()
+            self.changes.clear()
+            self.hits = 0
+    
+    def get_hits(self):
+        return self.hits
+    
+    def intern(self, value):
+        return intern(value) if isinstance(value, str) else value
+    
+    def intern_fields(self, dct):
+        """
+        Intern the values of all fields in INTERNED_FIELDS inplace. Lists of strings
+        (e.g. keywords) are interned element by element.
+        """
+        for field in IdentityMap.INTERNED_FIELDS:
+            value = dct.get(field)
+            if isinstance(value, str):
+                dct[field] = intern(value)
+            elif isinstance(value, list):
+                dct[field] = [self.intern(obj) for obj in value]
+    
+    def _key(self, dct):
+        key = tuple(sorted(dct.items(), key = lambda item: item[0]))
+        try:
+            hash(key)
+            return key
+        except TypeError:
+            return None # unhashable values, this object cannot be shared
+    
+    def _get_shared(self, cache, cls, data):
+        self.intern_fields(data)
+        key = self._key(data)
+        if key is None:
+            return cls(data)
+        
+        # dicts keep their insertion order, the first entry is the least recently used
+        with self.lock:
+            obj = cache.pop(key, None)
+            if obj is None:
+                obj = cls(data)
+                if len(cache) >= self.max_size: del cache[next(iter(cache))]
+            else:
+                self.hits += 1
+            cache[key] = obj
+            return obj
+    
+    def get_user(self, data):
+        """
+        Returns the shared FrozenUser for the given user-detail-dict. Details like
+        assigned_to_detail only contain id, name, real_name and email.
+        """
+        return self._get_shared(self.users, FrozenUser, data)
+    
+    def get_change(self, data):
+        """
+        Returns the shared FrozenChange for the given change-dict of a bug-history.
+        """
+        return self._get_shared(self.changes, FrozenChange, data)
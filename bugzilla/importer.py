@@ -0,0 +1,225 @@
+"""
+Imports bugs with their comments and attachments into a bugzilla-installation. The input
+are jsonl-files (optionally gzip-compressed) with one record per line in the format
+written by bugzilla.export:
+
+    {"bug": {...}, "comments": [...], "attachments": [...]}
+
+Records are imported in parallel, but the steps of one record always run in order: the
+bug is created first, then its comments in order and then its attachments. The first
+comment (count 0) becomes the description of the new bug and comments belonging to an
+attachment are sent along with that attachment. Attachments either contain their data
+base64-encoded in "data" or the path of a file relative to the input-file in "file".
+Flags of bugs and attachments are created by their name, status and requestee; the ids
+of flag types differ between installations.
+Every created object is appended to a journal (journal.jsonl in the state-directory)
+mapping old ids to new ids. An interrupted import skips everything found in the journal
+when it is started again; only an object created right before the interruption can be
+created twice. After all records are imported, blocks and depends_on are rewritten to
+the new ids in a second pass.
+
+    python -m bugzilla.importer https://bugzilla.example.com/ state-directory export-directory
+"""
+
+import argparse
+import base64
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from . import Bugzilla, Bug
+from .objects import AttachmentFlag
+from .parallel import bounded_map
+
+JOURNAL_FILE = "journal.jsonl"
+
+def import_flags(flags):
+    "Returns flags to create on another installation, only name, status and requestee are kept."
+    return [AttachmentFlag({"name": flag.name, "status": flag.status, "requestee": flag.requestee}) for flag in flags]
+
+def open_records(path):
+    """
+    Yield (record, directory) for every line of a jsonl-file or of every shard in the
+    manifest of an export-directory.
+    """
+    if os.path.isdir(path):
+        with open(os.path.join(path, "manifest.json")) as file:
+            manifest = json.load(file)
+        for key in sorted(manifest["ranges"], key = lambda key: int(key.split("-")[0])):
+            yield from open_records(os.path.join(path, manifest["ranges"][key]["file"]))
+        return
+    
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding = "utf-8") as file:
+        for line in file:
+            if line.strip(): yield json.loads(line), os.path.dirname(path)
+
+class Journal:
+    """
+    The append-only log of everything an import has created. Lines are written and
+    flushed one at a time, so a crash loses at most the line being written.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.bugs = {}
+        self.links = {}
+        self.comments = {}
+        self.attachments = {}
+        self.linked = set()
+        if os.path.isfile(path):
+            with open(path, encoding = "utf-8") as file:
+                for line in file:
+                    # the last line might be incomplete after a crash
+                    try: self._apply(json.loads(line))
+                    except ValueError: pass
+        self.file = open(path, "a", encoding = "utf-8")
+    
+    def _apply(self, entry):
+        if entry["type"] == "bug":
+            self.bugs[entry["old"]] = entry["new"]
+            self.links[entry["old"]] = (entry["blocks"], entry["depends_on"])
+        elif entry["type"] == "comment":
+            self.comments[entry["old"]] = entry["new"]
+        elif entry["type"] == "attachment":
+            self.attachments[entry["old"]] = entry["new"]
+        elif entry["type"] == "links":
+            self.linked.add(entry["old"])
+    
+    def write(self, entry):
+        with self.lock:
+            self._apply(entry)
+            self.file.write(json.dumps(entry) + "\n")
+            self.file.flush()
+    
+    def close(self):
+        self.file.close()
+
+class Importer:
+    def __init__(self, bugzilla, directory, workers = 4, progress = None):
+        self.bugzilla = bugzilla
+        self.directory = directory
+        self.workers = workers
+        self.progress = progress
+        os.makedirs(directory, exist_ok = True)
+        self.journal = Journal(os.path.join(directory, JOURNAL_FILE))
+    
+    def get_bug_id(self, old_id):
+        "Returns the new id of an imported bug or None."
+        return self.journal.bugs.get(old_id)
+    
+    def run(self, paths):
+        """
+        Import all records of the given files or export-directories and rewrite the
+        dependencies afterwards. Returns the number of records imported by this call.
+        """
+        records = (record for path in paths for record in open_records(path))
+        count = 0
+        started = time.time()
+        for record, result in bounded_map(self.import_record, records, self.workers):
+            if result: count += 1
+            if self.progress is not None:
+                elapsed = time.time() - started
+                self.progress("records", count, count / elapsed if elapsed else 0.0)
+        self.link_bugs()
+        return count
+    
+    def import_record(self, record_and_directory):
+        """
+        Import one record, skipping the parts that are in the journal already. Returns
+        False if the whole record was imported before.
+        """
+        record, directory = record_and_directory
+        bug = self.bugzilla._get_bug(record["bug"])
+        bug.flags = import_flags(bug.flags)
+        comments = sorted((self.bugzilla._get_comment(data) for data in record.get("comments", [])),
+                        key = lambda comment: comment.count)
+        attachment_comments = {comment.attachment_id: comment for comment in comments if comment.attachment_id}
+        
+        new_id = self.get_bug_id(bug.id)
+        done = new_id is not None
+        if new_id is None:
+            kw = {}
+            if comments and comments[0].count == 0:
+                kw["description"] = comments[0].text
+            new_id = self.bugzilla.add_bug(bug, **kw)
+            self.journal.write({"type": "bug", "old": bug.id, "new": new_id,
+                                "blocks": bug.blocks, "depends_on": bug.depends_on})
+        
+        for comment in comments:
+            if comment.count == 0 or comment.attachment_id or comment.id in self.journal.comments:
+                continue
+            done = False
+            comment_id = self.bugzilla.add_comment(comment, new_id)
+            self.journal.write({"type": "comment", "old": comment.id, "new": comment_id})
+        
+        for data in record.get("attachments", []):
+            if data["id"] in self.journal.attachments:
+                continue
+            done = False
+            data = dict(data)
+            filename = data.pop("file", None)
+            if filename is not None:
+                with open(os.path.join(directory, filename), "rb") as file:
+                    data["data"] = base64.b64encode(file.read()).decode("ascii")
+            attachment = self.bugzilla._get_attachment(data)
+            attachment.flags = import_flags(attachment.flags)
+            comment = attachment_comments.get(attachment.id)
+            attachment_id = self.bugzilla.add_attachment(attachment, new_id, comment.text if comment else "")[0]
+            self.journal.write({"type": "attachment", "old": attachment.id, "new": attachment_id})
+        
+        return not done
+    
+    def link_bugs(self):
+        """
+        Rewrite blocks and depends_on of all imported bugs to the new ids. References to
+        bugs that were not imported are dropped. Bugs linked before are skipped.
+        """
+        pending = [old_id for old_id in self.journal.bugs if old_id not in self.journal.linked]
+        count = 0
+        started = time.time()
+        for old_id, result in bounded_map(self.link_bug, pending, self.workers):
+            count += 1
+            if self.progress is not None:
+                elapsed = time.time() - started
+                self.progress("links", count, count / elapsed if elapsed else 0.0)
+    
+    def link_bug(self, old_id):
+        blocks, depends_on = self.journal.links[old_id]
+        blocks = [self.journal.bugs[bug_id] for bug_id in blocks if bug_id in self.journal.bugs]
+        depends_on = [self.journal.bugs[bug_id] for bug_id in depends_on if bug_id in self.journal.bugs]
+        if blocks or depends_on:
+            # the bug is clean and has no other fields, so only the dependencies are sent
+            bug = Bug({"id": self.journal.bugs[old_id]})
+            bug.mark_clean()
+            self.bugzilla.update_bug(bug, set_ = {"blocks": blocks, "depends_on": depends_on})
+        self.journal.write({"type": "links", "old": old_id})
+    
+    def close(self):
+        self.journal.close()
+
+def print_progress(stage, count, rate):
+    sys.stderr.write("\r%s: %i, %.1f/s  " % (stage, count, rate))
+    sys.stderr.flush()
+
+def main(args = None):
+    parser = argparse.ArgumentParser(description = "Import bugs into a bugzilla-installation")
+    parser.add_argument("url", help = "the url of the bugzilla-installation, ending with /")
+    parser.add_argument("directory", help = "the directory for the journal of the import")
+    parser.add_argument("paths", nargs = "+", help = "jsonl-files or export-directories")
+    parser.add_argument("--api-key", help = "the api-key to log in with")
+    parser.add_argument("--workers", type = int, default = 4)
+    args = parser.parse_args(args)
+    
+    importer = Importer(Bugzilla(args.url, args.api_key), args.directory, args.workers, print_progress)
+    try:
+        importer.run(args.paths)
+    finally:
+        importer.close()
+    sys.stderr.write("\n")
+
+if __name__ == "__main__":
+    main()
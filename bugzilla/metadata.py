@@ -0,0 +1,327 @@
+"""
+A local index of the field- and product-metadata of a bugzilla-installation. It is used
+to validate bugs before they are sent, so that invalid values for the status, the
+resolution, the component and so on are found without a round trip to bugzilla.
+The index is built with build() and can be saved to and loaded from a file. Calling
+refresh() checks the last audit times and only reloads the fields or products if
+they have changed since the index was built. If only components, versions, milestones
+or flag types changed, only that part of the products is reloaded.
+If the index is set on the client via set_metadata_index, add_bug and update_bug
+validate their payloads before sending them.
+"""
+
+import json
+import os
+from . import BugzillaException
+from .objects import Product
+from .util import parse_bugzilla_datetime, encode_bugzilla_datetime
+
+# the names of fields in a bug-payload and their names in the field-api
+FIELD_NAMES = {
+    "status": "bug_status",
+    "severity": "bug_severity",
+    "platform": "rep_platform",
+    "summary": "short_desc",
+    "whiteboard": "status_whiteboard",
+    "url": "bug_file_loc",
+    "assigned_to": "assigned_to",
+    "qa_contact": "qa_contact"
+}
+PAYLOAD_NAMES = {field: key for key, field in FIELD_NAMES.items()}
+
+# fields whose valid values are defined per product
+PRODUCT_FIELDS = {
+    "component": "components",
+    "version": "versions",
+    "target_milestone": "milestones"
+}
+
+# field-types with a fixed list of values, see
+# https://bugzilla.readthedocs.io/en/5.0/api/core/v1/field.html#fields
+FIELD_TYPE_SINGLE_SELECT = 2
+FIELD_TYPE_MULTI_SELECT = 3
+FIELD_TYPE_KEYWORDS = 8
+SELECT_FIELD_TYPES = (FIELD_TYPE_SINGLE_SELECT, FIELD_TYPE_MULTI_SELECT, FIELD_TYPE_KEYWORDS)
+
+# the audit-classes that invalidate the fields or products of the index
+FIELD_AUDIT_CLASSES = ("Bugzilla::Field", "Bugzilla::Field::Choice", "Bugzilla::Status",
+                    "Bugzilla::Keyword")
+PRODUCT_AUDIT_CLASSES = ("Bugzilla::Product", "Bugzilla::Component", "Bugzilla::Version",
+                    "Bugzilla::Milestone", "Bugzilla::FlagType")
+
+# the product-fields reloaded if only their audit-class changed. a change of
+# Bugzilla::Product reloads the products completely.
+CLASS_FIELDS = {
+    "Bugzilla::Component": ["components"],
+    "Bugzilla::Version": ["versions"],
+    "Bugzilla::Milestone": ["milestones"],
+    # the flag types are part of the components
+    "Bugzilla::FlagType": ["components"]
+}
+
+INDEX_FORMAT_VERSION = 1
+
+class MetadataIndex:
+    def __init__(self, bugzilla):
+        self.bugzilla = bugzilla
+        self.fields = {}
+        self.products = {}
+        # the product-names passed to build, None for all accessible products
+        self.product_names = None
+        self.audit_times = {}
+    
+    def build(self, products = None):
+        """
+        Load all fields and the given products from bugzilla. products can be a list of
+        product-names, if it is None all accessible products are loaded. The component,
+        version and milestone of bugs in other products are not validated then.
+        """
+        self.audit_times = self._get_audit_times()
+        self.product_names = None if products is None else list(products)
+        self._load_fields()
+        self._load_products(self.product_names)
+    
+    def refresh(self):
+        """
+        Reload the fields and products if bugzilla's audit log has changed since the index
+        has been built or refreshed. Returns True if anything was reloaded. If the index was
+        built for all products, products created since are loaded too.
+        """
+        audit_times = self._get_audit_times()
+        changed = {cls for cls in audit_times if audit_times[cls] != self.audit_times.get(cls)}
+        
+        if changed & set(FIELD_AUDIT_CLASSES):
+            self._load_fields()
+        if "Bugzilla::Product" in changed:
+            self._load_products(self.product_names)
+        elif changed & set(CLASS_FIELDS):
+            self._update_products(sorted({field for cls in changed & set(CLASS_FIELDS) for field in CLASS_FIELDS[cls]}))
+        # only set once everything is reloaded, so a failed refresh is repeated
+        self.audit_times = audit_times
+        return bool(changed)
+    
+    def refresh_field(self, name):
+        """
+        Reload a single field by its name.
+        """
+        for field in self.bugzilla.get_fields(name):
+            self.fields[field.name] = field
+    
+    def refresh_product(self, name):
+        """
+        Reload a single product by its name.
+        """
+        product = self.bugzilla.get_product(name)
+        # the dicts are replaced and not modified, readers in other threads see either state
+        self.products = dict(self.products, **{product.name: product})
+    
+    def _get_audit_times(self):
+        return {cls: self.bugzilla.get_last_audit_time(cls)
+                for cls in FIELD_AUDIT_CLASSES + PRODUCT_AUDIT_CLASSES}
+    
+    def _load_fields(self):
+        self.fields = {field.name: field for field in self.bugzilla.get_fields()}
+    
+    def _load_products(self, names):
+        if names is None:
+            products = self._search_products("ids", self.bugzilla.get_accessible_product_ids())
+        elif names:
+            products = self._search_products("names", names)
+        else:
+            products = []
+        self.products = {product.name: product for product in products}
+    
+    def _update_products(self, fields):
+        # reload some fields of the products, the loaded products are not modified
+        products = self.products
+        ids = [product.id for product in products.values()]
+        loaded = {product.id: product for product in self._search_products("ids", ids, include_fields = ["id"] + fields)}
+        self.products = {name: Product(dict(product, **{field: loaded[product.id][field] for field in fields}))
+                        for name, product in products.items() if product.id in loaded}
+    
+    def _search_products(self, key, values, **kw):
+        "Returns the products with the given ids or names."
+        kw[key] = values
+        return self.bugzilla.search_products(**kw)
+    
+    def save(self, path):
+        """
+        Save the index as json to the given file.
+        """
+        data = {
+            "version": INDEX_FORMAT_VERSION,
+            "audit_times": {cls: encode_bugzilla_datetime(time) for cls, time in self.audit_times.items()},
+            "fields": list(self.fields.values()),
+            "products": list(self.products.values()),
+            "product_names": self.product_names
+        }
+        # readers of the file never see a partly written index
+        with open(path + ".tmp", "w") as file:
+            json.dump(data, file)
+        os.replace(path + ".tmp", path)
+    
+    def load(self, path):
+        """
+        Load an index that was saved with save. Call refresh afterwards to make sure
+        the loaded index is up to date.
+        """
+        with open(path) as file:
+            data = json.load(file)
+        if data.get("version") != INDEX_FORMAT_VERSION:
+            raise ValueError("Unsupported metadata index version %r" % data.get("version"))
+        
+        self.audit_times = {cls: None if time is None else parse_bugzilla_datetime(time)
+                            for cls, time in data["audit_times"].items()}
+        self.fields = {field["name"]: self.bugzilla._get_field(field) for field in data["fields"]}
+        self.products = {product["name"]: self.bugzilla._get_product(product) for product in data["products"]}
+        # older files don't know how the index was built, refresh the loaded products
+        self.product_names = data["product_names"] if "product_names" in data else list(self.products)
+    
+    def get_field(self, key):
+        """
+        Returns the BugField for a payload-key like "status" or "cf_foo", or None if the
+        field is unknown.
+        """
+        return self.fields.get(FIELD_NAMES.get(key, key))
+    
+    def get_product(self, name):
+        return self.products.get(name)
+    
+    def get_legal_values(self, key, product = None, active_only = True):
+        """
+        Returns the set of valid values for the given payload-key or None if the field
+        is not a select-field. For component, version and target_milestone the product
+        has to be given. New bugs can only use active values, while existing bugs may
+        keep values that have been deactivated; pass active_only = False for those.
+        """
+        if key in PRODUCT_FIELDS:
+            product = self.products.get(product)
+            if product is None:
+                return None
+            return {obj.name for obj in product[PRODUCT_FIELDS[key]] if obj.is_active or not active_only}
+        
+        field = self.get_field(key)
+        if field is None or not field["values"]:
+            return None
+        if field.is_custom and field.type not in SELECT_FIELD_TYPES:
+            return None
+        return {value.name for value in field["values"] if value.name and (value.is_active or not active_only)}
+    
+    def get_transitions(self, status):
+        """
+        Returns the set of statuses the given status can change to. Pass None to get the
+        statuses a new bug can be created with.
+        """
+        field = self.fields.get("bug_status")
+        if field is None:
+            return None
+        for value in field["values"]:
+            # the initial pseudo-status has no name
+            if (value.name or None) == (status or None):
+                return {target["name"] for target in value.can_change_to}
+        return set()
+    
+    def validate_transition(self, old_status, new_status):
+        """
+        Returns a list of errors for a status-change, the list is empty if bugzilla
+        allows the change.
+        """
+        if old_status == new_status:
+            return []
+        transitions = self.get_transitions(old_status)
+        if transitions is None or new_status in transitions:
+            return []
+        if old_status:
+            return ["The status cannot change from '%s' to '%s'" % (old_status, new_status)]
+        return ["A bug cannot be created with the status '%s'" % new_status]
+    
+    def _payload_values(self, value):
+        # values can be single values, lists or add/remove/set-dicts for update_bug
+        if isinstance(value, dict):
+            values = []
+            for key in ("add", "set"):
+                values.extend(self._payload_values(value.get(key, [])))
+            return values
+        elif isinstance(value, (list, tuple, set)):
+            return list(value)
+        elif value is None or value == "":
+            return []
+        return [value]
+    
+    def _is_visible(self, field, get_value):
+        if not field.visibility_field or not field.visibility_values:
+            return True
+        visible_for = self._payload_values(get_value(PAYLOAD_NAMES.get(field.visibility_field, field.visibility_field)))
+        return bool(set(visible_for) & set(field.visibility_values))
+    
+    def _validate_payload(self, data, bug, active_only):
+        def get_value(key):
+            if key in data:
+                return data[key]
+            return None if bug is None else bug.get(key)
+        
+        errors = []
+        product = get_value("product")
+        # an index of selected products doesn't know whether the other products exist
+        if product is not None and self.product_names is None and self.products and product not in self.products:
+            errors.append("Unknown product '%s'" % product)
+        
+        for key, value in data.items():
+            legal = self.get_legal_values(key, product, active_only)
+            if legal is not None:
+                for obj in self._payload_values(value):
+                    if obj not in legal:
+                        errors.append("Invalid value '%s' for field '%s'" % (obj, key))
+            
+            field = self.get_field(key)
+            if field is None or not field.is_custom or not self._payload_values(value):
+                continue
+            # a custom field may only be visible for some values of another field
+            if not self._is_visible(field, get_value):
+                errors.append("The field '%s' is only visible if '%s' is one of %s" %
+                            (key, field.visibility_field, ", ".join(field.visibility_values)))
+            # and so may be single values of a custom field
+            if field.value_field:
+                controller = set(self._payload_values(get_value(PAYLOAD_NAMES.get(field.value_field, field.value_field))))
+                for value_obj in field["values"]:
+                    if value_obj.name in self._payload_values(value) and value_obj.visibility_values \
+                            and not controller & set(value_obj.visibility_values):
+                        errors.append("The value '%s' of field '%s' is only valid if '%s' is one of %s" %
+                                    (value_obj.name, key, field.value_field, ", ".join(value_obj.visibility_values)))
+        return errors
+    
+    def validate_add_json(self, data):
+        """
+        Returns a list of errors found in the payload of add_bug. The list is empty if the
+        payload is valid according to the index.
+        """
+        errors = self._validate_payload(data, None, True)
+        if data.get("status"):
+            errors.extend(self.validate_transition(None, data["status"]))
+        for key, field in self.fields.items():
+            key = PAYLOAD_NAMES.get(key, key)
+            # hidden fields can't be set, so they aren't required either
+            if field.is_mandatory and field.is_custom and not data.get(key) and self._is_visible(field, data.get):
+                errors.append("The mandatory field '%s' is not set" % key)
+        return errors
+    
+    def validate_update_json(self, data, bug = None, old_status = None):
+        """
+        Returns a list of errors found in the payload of update_bug. bug is the bug that is
+        updated, it is used to look up values that are not part of the payload. If the old
+        status is given, the status transition is validated too.
+        """
+        errors = self._validate_payload(data, bug, False)
+        if old_status and data.get("status"):
+            errors.extend(self.validate_transition(old_status, data["status"]))
+        return errors
+    
+    def check_add_json(self, data):
+        errors = self.validate_add_json(data)
+        if errors:
+            raise BugzillaException(-1, "; ".join(errors))
+    
+    def check_update_json(self, data, bug = None, old_status = None):
+        errors = self.validate_update_json(data, bug, old_status)
+        if errors:
+            raise BugzillaException(-1, "; ".join(errors))
@@ -3,8 +3,15 @@ from copy import deepcopy
 from .util import encode_bugzilla_date
 
 class BugzillaObject(dict):
+    # maps keys of update_json to the attributes they are built from, if they differ
+    JSON_SOURCES = {}
+    
     # Treat the object-attributes as dict-indizes for easier jsoning
     def __getattr__(self, attr):
+        # special methods are looked up by copy, pickle and co. They must not be
+        # mistaken for missing dict-keys
+        if attr.startswith("__") and attr.endswith("__"):
+            raise AttributeError(attr)
         return self.__getitem__(attr)
     
     def __setattr__(self, attr, value):
@@ -16,8 +23,13 @@ class BugzillaObject(dict):
     def __repr__(self):
         return "%s(%s)" % (type(self).__name__, dict.__repr__(self))
     
+    # pickle and deepcopy would refill the dict item by item, which fails for virtual
+    # attributes that bugzilla sends along (e.g. a bug's assigned_to) and is slow
+    def __reduce__(self):
+        return (_restore_object, (type(self), dict(self)), self.__dict__ or None)
+    
     # return a jsonable object that will be sent if the bugzilla object wants to
-    # be added. This includes only fields that can be sent. Since classes have 
+    # be added. This includes only fields that can be sent. Since classes have
     # default 'invalid' values set in the constructor subclasses should check if
     # these values are 'invalid' and only return those values which are valid.
     # The id_only parameter is the same as in the to_json-method
@@ -45,6 +57,58 @@ class BugzillaObject(dict):
     def set_default_attributes(self, attributes):
         for key, value in deepcopy(attributes).items():
             self.setdefault(key, value)
+    
+    # change tracking. mark_clean remembers the current values, afterwards get_changed_fields
+    # returns the attributes modified since. nested lists, dicts and objects are copied, so
+    # that appending to a list or changing a flag in place counts as a change too. the
+    # objects returned by the client are marked clean.
+    def mark_clean(self):
+        original = dict(self)
+        for key, value in original.items():
+            if isinstance(value, (list, dict)): original[key] = _snapshot(value)
+        self.__dict__["_original"] = original
+    
+    # returns the set of attributes that were changed, added or removed since mark_clean
+    # or None if the object was never marked clean
+    def get_changed_fields(self):
+        original = self.__dict__.get("_original")
+        if original is None: return None
+        
+        changed = {key for key in self if key not in original or dict.__getitem__(self, key) != original[key]}
+        changed.update(key for key in original if key not in self)
+        return changed
+    
+    def get_original_value(self, attr, default = None):
+        original = self.__dict__.get("_original")
+        if original is None: return default
+        return original.get(attr, default)
+    
+    # like update_json, but only with the fields built from changed attributes. objects
+    # that were never marked clean return the full update_json.
+    def changed_update_json(self):
+        dct = self.update_json()
+        changed = self.get_changed_fields()
+        if changed is None: return dct
+        
+        return {key: value for key, value in dct.items() if self.JSON_SOURCES.get(key, key) in changed}
+
+def _snapshot(value):
+    # copies the containers of a value, the immutable leaves and frozen objects of an
+    # identity map are shared. faster than deepcopy, which is called for every loaded object
+    if isinstance(value, list):
+        return [_snapshot(obj) if isinstance(obj, (list, dict)) else obj for obj in value]
+    if isinstance(value, dict) and not getattr(type(value), "FROZEN", False):
+        copied = dict.__new__(type(value))
+        dict.update(copied, value)
+        for key, obj in value.items():
+            if isinstance(obj, (list, dict)): dict.__setitem__(copied, key, _snapshot(obj))
+        return copied
+    return value
+
+def _restore_object(cls, dct):
+    obj = dict.__new__(cls)
+    dict.update(obj, dct)
+    return obj
 
 # Note that this class has a lot of _detail-fields. To avoid unnecessary lines of code,
 # the none-_detail-fields will just refer to the _detail-fields. E.g. creator wil look up
@@ -54,6 +118,8 @@ class Bug(BugzillaObject):
     # I'll check this later
     CUSTOM_FIELD_PREFIX = "cf_"
     
+    JSON_SOURCES = {"assigned_to": "assigned_to_detail", "qa_contact": "qa_contact_detail"}
+    
     ATTRIBUTES = {
         "alias": [],
         "assigned_to_detail": None,
@@ -190,6 +256,8 @@ class Product(BugzillaObject):
         return self.id != -1
 
 class Component(BugzillaObject):
+    JSON_SOURCES = {"default_assignee": "default_assigned_to"}
+    
     ATTRIBUTES = {
         "id": -1,
         "name": "",
@@ -343,23 +411,15 @@ class Attachment(BugzillaObject):
         
         BugzillaObject.__setitem__(self, attr, value)
     
-    def add_json(self, id_only = False):
+    # with_data = False leaves out the data, e.g. for uploads that stream it separately
+    def add_json(self, id_only = False, with_data = True):
         dct = {}
         for field in ("is_patch", "summary", "content_type", "file_name", "is_private"):
             dct[field] = self[field]
         
-        dct["data"] = base64.b64encode(self.data).decode("ascii")
-        dct["flags"] = []
-        for flag in self.flags:
-            flag_dct = {
-                "name": flag.name,
-                "type_id": flag.type_id,
-                "status": flag.status
-            }
-            if flag.requestee: flag_dct["requestee"] = flag.requestee
-            
-            dct["flags"].append(flag_dct)
-            
+        if with_data: dct["data"] = base64.b64encode(self.data).decode("ascii")
+        dct["flags"] = [flag.to_json() for flag in self.flags]
+        
         return dct
     
     def can_be_added(self):
@@ -370,16 +430,7 @@ class Attachment(BugzillaObject):
         for field in ("file_name", "summary", "content_type", "is_patch", "is_private", "is_obsolete"):
             dct[field] = self[field]
         
-        dct["flags"] = []
-        for flag in self.flags:
-            flag_dct = {
-                "name": flag.name,
-                "type_id": flag.type_id,
-                "status": flag.status
-            }
-            if flag.requestee: flag_dct["requestee"] = flag.requestee
-            
-            dct["flags"].append(flag_dct)
+        dct["flags"] = [flag.to_json() for flag in self.flags]
         
         return dct
     
@@ -401,6 +452,14 @@ class AttachmentFlag(BugzillaObject):
     def __init__(self, attributes = {}):
         BugzillaObject.__init__(self, attributes)
         self.set_default_attributes(AttachmentFlag.ATTRIBUTES)
+    
+    # returns the flag as bugs and attachments send it. a flag without a valid type_id
+    # is identified by its name
+    def to_json(self):
+        dct = {"name": self.name, "status": self.status}
+        if self.type_id != -1: dct["type_id"] = self.type_id
+        if self.requestee: dct["requestee"] = self.requestee
+        return dct
 
 class History(BugzillaObject):
     ATTRIBUTES = {
@@ -507,6 +566,8 @@ class BugFieldValue(BugzillaObject):
         self.set_default_attributes(BugFieldValue.ATTRIBUTES)
 
 class User(BugzillaObject):
+    JSON_SOURCES = {"full_name": "real_name"}
+    
     ATTRIBUTES = {
         "id": -1,
         "real_name": "",
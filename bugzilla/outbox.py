@@ -0,0 +1,241 @@
+"""
+A durable outbox for writes to bugs. Automations often change the same bug several times
+in a row: add a keyword, set the priority, add a comment. The outbox accepts these writes
+without waiting for bugzilla, stores them in an sqlite-database and sends them in the
+background. All pending updates of a bug are merged into one update_bug-request: later
+values of a field replace earlier ones, adds and removes of the same key are combined and
+one comment is sent along with the update. Further comments are added with add_comment.
+The outbox is flushed every flush_interval seconds or as soon as max_pending writes are
+waiting. Every write returns a Future, resolved with the UpdateResults of the merged
+update or the id of the added comment. Writes are only removed from the database when
+bugzilla has accepted them, so the writes of a crashed process are sent when the outbox
+is opened again. A crash between the request and the removal sends that write twice.
+
+    outbox = Outbox(bugzilla, "outbox.sqlite")
+    outbox.update_bug(1234, add = {"keywords": ["regression"]})
+    outbox.update_bug(1234, priority = "P1")
+    future = outbox.add_comment(1234, "Raised the priority")
+    future.result()
+"""
+
+import json
+import sqlite3
+import threading
+from concurrent.futures import Future
+from . import BugzillaException
+from .objects import Bug, Comment
+from .parallel import bounded_map
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS writes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    bug_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS writes_bug_id ON writes (bug_id);
+"""
+
+UPDATE = "update"
+COMMENT = "comment"
+
+# the fields of a comment that can be sent with an update
+UPDATE_COMMENT_FIELDS = {"comment": "body", "is_private": "is_private", "is_markdown": "is_markdown"}
+
+def merge_writes(writes):
+    """
+    Merges a list of (kind, data) of one bug in their order. Returns the keyword-parameters
+    of update_bug (fields, add, remove and set_, and comment if a comment is sent with the
+    update) or None if there is no update, and the comments to add separately.
+    """
+    fields = {}
+    # key -> ["set", values] or ["delta", add, remove]
+    lists = {}
+    comments = []
+    for kind, data in writes:
+        if kind == COMMENT:
+            comments.append(data)
+            continue
+        fields.update(data.get("fields", {}))
+        for key, values in data.get("set", {}).items():
+            lists[key] = ["set", list(values)]
+        for operation in ("add", "remove"):
+            for key, values in data.get(operation, {}).items():
+                state = lists.setdefault(key, ["delta", [], []])
+                for value in values:
+                    if state[0] == "set":
+                        if operation == "add" and value not in state[1]: state[1].append(value)
+                        if operation == "remove" and value in state[1]: state[1].remove(value)
+                        continue
+                    # the last operation on a value wins
+                    added, removed = state[1], state[2]
+                    if value in added: added.remove(value)
+                    if value in removed: removed.remove(value)
+                    (added if operation == "add" else removed).append(value)
+    
+    if not fields and not lists:
+        return None, comments
+    update = dict(fields)
+    update["add"] = {key: state[1] for key, state in lists.items() if state[0] == "delta" and state[1]}
+    update["remove"] = {key: state[2] for key, state in lists.items() if state[0] == "delta" and state[2]}
+    update["set_"] = {key: state[1] for key, state in lists.items() if state[0] == "set"}
+    if comments and set(comments[0]) <= set(UPDATE_COMMENT_FIELDS):
+        update["comment"] = {UPDATE_COMMENT_FIELDS[key]: value for key, value in comments.pop(0).items()}
+    return update, comments
+
+class Outbox:
+    def __init__(self, bugzilla, path, flush_interval = 2.0, max_pending = 100, workers = 4, start = True):
+        """
+        Opens the outbox in the sqlite-database at path. Writes left by a previous process
+        are sent with the first flush. If start is False, no background thread is started
+        and only flush() sends the writes.
+        """
+        self.bugzilla = bugzilla
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        # flushes run one at a time, writes can be added meanwhile
+        self.flush_lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread = False)
+        self.db.executescript(SCHEMA)
+        self.futures = {}
+        self.pending = self.db.execute("SELECT COUNT(*) FROM writes").fetchone()[0]
+        self.closed = False
+        self.thread = None
+        if start:
+            self.thread = threading.Thread(target = self._run, daemon = True)
+            self.thread.start()
+    
+    def __len__(self):
+        "Returns the number of writes waiting to be sent."
+        with self.lock:
+            return self.pending
+    
+    def _add(self, bug_id, kind, data):
+        future = Future()
+        with self.lock:
+            if self.closed:
+                raise BugzillaException(-1, "The outbox is closed")
+            with self.db:
+                seq = self.db.execute("INSERT INTO writes (bug_id, kind, data) VALUES (?, ?, ?)",
+                                    (bug_id, kind, json.dumps(data))).lastrowid
+            self.futures[seq] = future
+            self.pending += 1
+            if self.pending >= self.max_pending: self.condition.notify()
+        return future
+    
+    def update_bug(self, bug_id, add = {}, remove = {}, set_ = {}, **fields):
+        """
+        Queue an update of a bug. The parameters are the same as for Bugzilla.update_bug,
+        the fields to change are passed as keyword-parameters, e.g. priority = "P1". Returns
+        a Future for the list of UpdateResults.
+        """
+        if (set(add) | set(remove)) & set(set_):
+            raise ValueError("You can not use the same keys in _set and add/remove")
+        data = {"fields": fields, "add": {key: list(values) for key, values in add.items()},
+                "remove": {key: list(values) for key, values in remove.items()},
+                "set": {key: list(values) for key, values in set_.items()}}
+        return self._add(bug_id, UPDATE, data)
+    
+    def add_comment(self, bug_id, comment, **kw):
+        """
+        Queue a comment. comment is a Comment or its text, further keyword-parameters are
+        the same as for Bugzilla.add_comment. Returns a Future for the id of the comment,
+        or for the UpdateResults if the comment is sent with an update.
+        """
+        if isinstance(comment, str): comment = Comment({"text": comment})
+        if not comment.can_be_added():
+            raise BugzillaException(-1, "This comment does not have the required fields set")
+        data = comment.add_json()
+        data.update(kw)
+        return self._add(bug_id, COMMENT, data)
+    
+    def _run(self):
+        failed = False
+        while True:
+            with self.lock:
+                # after an error the next try waits, even if many writes are waiting
+                if not self.closed and (failed or self.pending < self.max_pending):
+                    self.condition.wait(self.flush_interval)
+                if self.closed: return
+            try:
+                self.flush()
+                failed = False
+            except Exception:
+                # the writes that were not rejected are tried again
+                failed = True
+    
+    def flush(self):
+        """
+        Send all waiting writes. Writes rejected by bugzilla are removed and their futures
+        fail with the BugzillaException. After other errors the writes are kept for the
+        next flush. The first error is raised after all bugs have been tried.
+        """
+        with self.flush_lock:
+            with self.lock:
+                rows = self.db.execute("SELECT seq, bug_id, kind, data FROM writes ORDER BY seq").fetchall()
+            by_bug = {}
+            for seq, bug_id, kind, data in rows:
+                by_bug.setdefault(bug_id, []).append((seq, kind, json.loads(data)))
+            
+            error = None
+            for bug_id, result in bounded_map(lambda bug_id: self._try_send(bug_id, by_bug[bug_id]), by_bug, self.workers):
+                if isinstance(result, Exception) and error is None: error = result
+            if error is not None:
+                raise error
+    
+    def _try_send(self, bug_id, writes):
+        try:
+            self._send(bug_id, writes)
+        except Exception as e:
+            return e
+    
+    def _send(self, bug_id, writes):
+        update, comments = merge_writes([(kind, data) for seq, kind, data in writes])
+        comment_seqs = [seq for seq, kind, data in writes if kind == COMMENT]
+        update_seqs = [seq for seq, kind, data in writes if kind == UPDATE]
+        if update is not None:
+            if "comment" in update: update_seqs.append(comment_seqs.pop(0))
+            bug = Bug({"id": bug_id})
+            # only the merged fields are sent
+            bug.mark_clean()
+            self._complete(update_seqs, lambda: self.bugzilla.update_bug(bug, **update))
+        for seq, data in zip(comment_seqs, comments):
+            comment = Comment({"text": data.pop("comment"), "is_private": data.pop("is_private", False),
+                            "is_markdown": data.pop("is_markdown", False), "tags": data.pop("comment_tags", [])})
+            self._complete([seq], lambda: self.bugzilla.add_comment(comment, bug_id, **data))
+    
+    def _complete(self, seqs, request):
+        # sends a request for the writes with the given seqs and removes them afterwards
+        try:
+            result = request()
+        except BugzillaException as e:
+            # bugzilla rejected the writes, sending them again fails again
+            self._remove(seqs, exception = e)
+            raise
+        self._remove(seqs, result = result)
+    
+    def _remove(self, seqs, result = None, exception = None):
+        with self.lock:
+            with self.db:
+                self.db.executemany("DELETE FROM writes WHERE seq = ?", [(seq,) for seq in seqs])
+            self.pending -= len(seqs)
+            futures = [self.futures.pop(seq) for seq in seqs if seq in self.futures]
+        for future in futures:
+            if exception is None:
+                future.set_result(result)
+            else:
+                future.set_exception(exception)
+    
+    def close(self, flush = True):
+        "Stop the background thread and flush the waiting writes unless flush is False."
+        with self.lock:
+            self.closed = True
+            self.condition.notify()
+        if self.thread is not None: self.thread.join()
+        try:
+            if flush: self.flush()
+        finally:
+            self.db.close()
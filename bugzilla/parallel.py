@@ -0,0 +1,32 @@
+"""
+Helpers to run requests in parallel. All bulk-tools of this package use threads, since
+the time is spent waiting for bugzilla and not in python.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+def bounded_map(function, items, max_workers = 4, max_pending = None):
+    """
+    Call function for every item in a thread-pool and yield (item, result) in the order
+    the calls complete. At most max_pending calls (by default twice the number of
+    workers) are submitted at a time, so items can be a generator of any length and
+    the results never pile up in memory. If a call raises an exception, the remaining
+    calls are cancelled and the exception is raised.
+    """
+    if max_pending is None: max_pending = max_workers * 2
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers) as executor:
+        pending = {}
+        try:
+            while True:
+                for item in items:
+                    pending[executor.submit(function, item)] = item
+                    if len(pending) >= max_pending: break
+                if not pending:
+                    return
+                done, not_done = wait(pending, return_when = FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+        finally:
+            for future in pending:
+                future.cancel()
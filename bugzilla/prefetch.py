@@ -0,0 +1,135 @@
+"""
+Fetches the comments, history and attachments of bugs ahead of a loop that processes
+them. A loop calling get_comments_by_bug, get_bug_history and get_attachments_by_bug for
+every bug waits for the network and then for its own work, one after the other. The
+Prefetcher wraps the bugs and requests the related data of the next window bugs in a
+thread-pool while the caller works on the current one, so the loop takes about as long
+as the slower of both.
+The related data waiting to be consumed is limited by the window and by max_memory, a
+rough estimate of the bytes of comment-texts and attachment-data held. Requests still
+running count with the average size of the data fetched so far, and until the first
+data has arrived only one bug is fetched ahead.
+
+    for bug, related in Prefetcher(bugzilla, bugzilla.search_bugs(product = "Firefox"),
+                                related = ("comments", "history"), window = 16):
+        process(bug, related["comments"], related["history"])
+"""
+
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# the related data that can be prefetched and the client-method loading it for one bug
+RELATED = {
+    "comments": "get_comments_by_bug",
+    "history": "get_bug_history",
+    "attachments": "get_attachments_by_bug"
+}
+
+def estimate_size(objects):
+    "A rough size in bytes of a list of comments, history-entries or attachments."
+    size = 0
+    for obj in objects:
+        size += 200
+        for value in obj.values():
+            if isinstance(value, (str, bytes)): size += len(value)
+            elif isinstance(value, list): size += 100 * len(value)
+    return size
+
+class Prefetcher:
+    def __init__(self, bugzilla, bugs, related = ("comments",), window = 8, workers = 4,
+                max_memory = 256 * 1024 * 1024, **kw):
+        """
+        bugs is an iterable of bugs or bug-ids, related lists the keys of RELATED to fetch.
+        Up to window bugs are fetched ahead with workers threads. No further bugs are
+        fetched if the data not yet consumed and the data expected for the running requests
+        would exceed max_memory bytes.
+        Further keyword-parameters are passed to every request, e.g. exclude_fields.
+        """
+        for key in related:
+            if key not in RELATED:
+                raise ValueError("Unknown related data %r, use %s" % (key, ", ".join(RELATED)))
+        if window < 1:
+            raise ValueError("The window has to contain at least one bug")
+        self.bugzilla = bugzilla
+        self.bugs = bugs
+        self.related = tuple(related)
+        self.window = window
+        self.workers = workers
+        self.max_memory = max_memory
+        self.kw = kw
+        self.lock = threading.Lock()
+        # the estimated bytes fetched and not yet consumed, and the bytes expected for the
+        # requests still running
+        self.held = 0
+        # key -> [bytes, number] of all data fetched, for the expected size of a request
+        self.fetched = {key: [0, 0] for key in self.related}
+    
+    def get_expected_size(self):
+        "Returns the bytes the related data of a bug is expected to take, or None if unknown."
+        with self.lock:
+            if any(number == 0 for size, number in self.fetched.values()): return None
+            return sum(size // number for size, number in self.fetched.values())
+    
+    def _fetch(self, key, bug, expected):
+        try:
+            result = getattr(self.bugzilla, RELATED[key])(bug, **self.kw)
+        except Exception:
+            with self.lock:
+                self.held -= expected
+            raise
+        size = estimate_size(result)
+        with self.lock:
+            # the expected size is replaced by the real one
+            self.held += size - expected
+            self.fetched[key][0] += size
+            self.fetched[key][1] += 1
+        return result, size
+    
+    def _submit(self, executor, bug_id):
+        expected = {}
+        with self.lock:
+            for key, (size, number) in self.fetched.items():
+                expected[key] = size // number if number else 0
+                self.held += expected[key]
+        return {key: (executor.submit(self._fetch, key, bug_id, expected[key]), expected[key]) for key in self.related}
+    
+    def _has_room(self, pending):
+        # the first bug is always fetched, so a single huge bug cannot stall the loop
+        if not pending: return True
+        if len(pending) >= self.window: return False
+        expected = self.get_expected_size()
+        return expected is not None and self.held + expected <= self.max_memory
+    
+    def __iter__(self):
+        bugs = iter(self.bugs)
+        pending = deque()
+        executor = ThreadPoolExecutor(self.workers)
+        try:
+            exhausted = False
+            while True:
+                while not exhausted and self._has_room(pending):
+                    bug = next(bugs, None)
+                    if bug is None:
+                        exhausted = True
+                        break
+                    bug_id = bug if isinstance(bug, (int, str)) else bug.id
+                    pending.append((bug, self._submit(executor, bug_id)))
+                if not pending:
+                    return
+                
+                bug, futures = pending.popleft()
+                related = {}
+                for key, (future, expected) in futures.items():
+                    related[key], size = future.result()
+                    with self.lock:
+                        self.held -= size
+                yield bug, related
+        finally:
+            # shutdown only cancels the queued requests itself since python 3.9
+            for bug, futures in pending:
+                for future, expected in futures.values():
+                    if future.cancel():
+                        with self.lock:
+                            self.held -= expected
+            executor.shutdown(wait = False)
@@ -0,0 +1,159 @@
+"""
+Routes the requests of a client to several web heads of one bugzilla-installation. GET-
+requests go to the read-replicas, to the one with the fewest outstanding requests, the
+other requests always go to the primary, the url of the client. Every endpoint has a
+circuit breaker: after failure_threshold failed or slow requests in a row it is left out
+for reset_timeout seconds, then one trial request decides whether it is used again. A GET
+that fails on a replica is retried on the next one, and the primary answers the reads if
+no replica is available.
+With read_your_writes, the reads go to the primary for that many seconds after a write,
+so the replicas have time to catch up on it.
+
+    pool = EndpointPool(["https://replica1.example.com/", "https://replica2.example.com/"])
+    bugzilla = Bugzilla("https://bugzilla.example.com/", endpoint_pool = pool)
+"""
+
+import threading
+import time
+from urllib.error import HTTPError, URLError
+from .util import rest_url
+
+# the methods that can be sent to a replica and be repeated
+IDEMPOTENT_METHODS = ("GET", "HEAD")
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+    
+    def __init__(self, failure_threshold = 3, reset_timeout = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CircuitBreaker.CLOSED
+        self.failures = 0
+        self.opened = None
+    
+    def is_available(self, now):
+        "Returns True if a request may be sent, an open breaker lets one trial request pass."
+        if self.state == CircuitBreaker.CLOSED:
+            return True
+        return self.state == CircuitBreaker.OPEN and now - self.opened >= self.reset_timeout
+    
+    def start(self):
+        "Called when a request is sent, the first request after opening is the trial."
+        if self.state == CircuitBreaker.OPEN:
+            self.state = CircuitBreaker.HALF_OPEN
+    
+    def record(self, success, now):
+        if success:
+            self.state = CircuitBreaker.CLOSED
+            self.failures = 0
+            return
+        self.failures += 1
+        if self.state == CircuitBreaker.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = CircuitBreaker.OPEN
+            self.opened = now
+
+class Endpoint:
+    def __init__(self, url, breaker):
+        self.url = url
+        self.breaker = breaker
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        # the moving average of the response times in seconds
+        self.latency = None
+    
+    def get_stats(self):
+        return {"url": self.url, "state": self.breaker.state, "outstanding": self.outstanding,
+                "requests": self.requests, "failures": self.failures, "latency": self.latency}
+
+class EndpointPool:
+    def __init__(self, replicas, failure_threshold = 3, reset_timeout = 30, slow_threshold = None,
+                read_your_writes = 0):
+        """
+        replicas is a list of urls of read-only web heads. A request taking longer than
+        slow_threshold seconds counts as failed. read_your_writes is the number of seconds
+        reads go to the primary after a write.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.slow_threshold = slow_threshold
+        self.read_your_writes = read_your_writes
+        self.lock = threading.Lock()
+        self.replicas = [self._endpoint(rest_url(url)) for url in replicas]
+        self.primaries = {}
+        self.last_write = None
+    
+    def _endpoint(self, url):
+        return Endpoint(url, CircuitBreaker(self.failure_threshold, self.reset_timeout))
+    
+    def _is_failure(self, error):
+        # errors reported by bugzilla and client-errors are answers of a healthy endpoint
+        if isinstance(error, HTTPError): return error.code >= 500
+        return isinstance(error, (URLError, OSError))
+    
+    def get_stats(self):
+        "Returns a list of dicts with the state and counters of every endpoint."
+        with self.lock:
+            return [endpoint.get_stats() for endpoint in list(self.primaries.values()) + self.replicas]
+    
+    def _choose(self, method, primary, tried, now):
+        # called with the lock held
+        if method in IDEMPOTENT_METHODS and (self.last_write is None or now - self.last_write >= self.read_your_writes):
+            candidates = [endpoint for endpoint in self.replicas if endpoint not in tried and endpoint.breaker.is_available(now)]
+            if candidates:
+                # endpoints that failed recently are only used if the others are busier
+                return min(candidates, key = lambda endpoint: (endpoint.outstanding, endpoint.breaker.failures, endpoint.latency or 0))
+        # the primary is used even if its breaker is open, there is nothing else left
+        return None if primary in tried else primary
+    
+    def request(self, method, url, send):
+        """
+        Call send with the url of the chosen endpoint and return its result. url is the
+        url of the primary.
+        """
+        with self.lock:
+            primary = self.primaries.get(url)
+            if primary is None:
+                primary = self.primaries[url] = self._endpoint(url)
+        tried = []
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                endpoint = self._choose(method, primary, tried, now)
+                if endpoint is None:
+                    raise error
+                if endpoint.breaker.is_available(now): endpoint.breaker.start()
+                endpoint.outstanding += 1
+                endpoint.requests += 1
+                if method not in IDEMPOTENT_METHODS: self.last_write = now
+            tried.append(endpoint)
+            
+            try:
+                return self._send(endpoint, send)
+            except Exception as e:
+                # a failed read is repeated on the next endpoint
+                if method not in IDEMPOTENT_METHODS or not self._is_failure(e):
+                    raise
+                error = e
+    
+    def _send(self, endpoint, send):
+        started = time.monotonic()
+        success = False
+        try:
+            result = send(endpoint.url)
+            success = True
+            return result
+        except Exception as e:
+            success = not self._is_failure(e)
+            raise
+        finally:
+            now = time.monotonic()
+            elapsed = now - started
+            if self.slow_threshold is not None and elapsed > self.slow_threshold: success = False
+            with self.lock:
+                endpoint.outstanding -= 1
+                endpoint.latency = elapsed if endpoint.latency is None else endpoint.latency * 0.8 + elapsed * 0.2
+                if not success: endpoint.failures += 1
+                endpoint.breaker.record(success, now)
@@ -0,0 +1,234 @@
+"""
+The schema of the json-objects the REST-api returns, and the decoders generated from it.
+For every class the schema lists the fields that have to be converted: timestamps, bools,
+base64-data and nested objects. At import time a decoder-function is generated for every
+class, that converts the fields in one straight pass, runs the identity map hooks, sets
+the defaults of ATTRIBUTES without deepcopying them and marks updatable objects clean.
+The client's _get_*-methods call these decoders, see DECODERS.
+SOURCES contains the generated code of every decoder for debugging.
+"""
+
+from base64 import b64decode
+from copy import deepcopy
+from datetime import datetime
+from . import objects
+from .util import parse_bugzilla_datetime
+
+DATETIME = ("datetime",)
+BOOL = ("bool",)
+BASE64 = ("base64",)
+
+# a nested object or a list of nested objects of the given class. if shared is the name of
+# a method of the identity map, that method is used instead while an identity map is set.
+def OBJECT(cls, shared = None):
+    return ("object", cls, shared)
+
+def LIST(cls, shared = None):
+    return ("list", cls, shared)
+
+# a function(client, value) returning the converted value
+def FUNCTION(function):
+    return ("function", function)
+
+def _decode_flag_types(client, value):
+    # the flag-types of a component are split by their target
+    for key in ("bug", "attachment"):
+        if value.get(key) is not None:
+            value[key] = [DECODERS[objects.FlagType](client, obj) for obj in value[key]]
+    return value
+
+# fields: the converted fields, interned: intern the values of the identity map's
+# INTERNED_FIELDS, clean: mark the object clean, drop: fields that are removed
+SCHEMAS = {
+    objects.Attachment: {
+        "fields": {
+            "creation_time": DATETIME,
+            "last_change_time": DATETIME,
+            "data": BASE64,
+            "is_private": BOOL,
+            "is_obsolete": BOOL,
+            "is_patch": BOOL,
+            "flags": LIST(objects.AttachmentFlag)
+        },
+        "drop": ["size"],
+        "clean": True
+    },
+    objects.AttachmentFlag: {
+        "fields": {
+            "creation_date": DATETIME,
+            "modification_date": DATETIME
+        },
+        "interned": True
+    },
+    objects.Bug: {
+        "fields": {
+            "creation_time": DATETIME,
+            "flags": LIST(objects.AttachmentFlag),
+            "is_cc_accessible": BOOL,
+            "is_confirmed": BOOL,
+            "is_open": BOOL,
+            "is_creator_accessible": BOOL,
+            "last_change_time": DATETIME,
+            "assigned_to_detail": OBJECT(None, "get_user"),
+            "cc_detail": LIST(None, "get_user"),
+            "creator_detail": OBJECT(None, "get_user"),
+            "qa_contact_detail": OBJECT(None, "get_user")
+        },
+        "interned": True,
+        "clean": True
+    },
+    objects.History: {
+        "fields": {
+            "when": DATETIME,
+            "changes": LIST(objects.Change, "get_change")
+        },
+        "interned": True
+    },
+    objects.Change: {},
+    objects.Product: {
+        "fields": {
+            "components": LIST(objects.Component),
+            "versions": LIST(objects.Version),
+            "milestones": LIST(objects.Milestone)
+        },
+        "clean": True
+    },
+    objects.Component: {
+        "fields": {
+            "flag_types": FUNCTION(_decode_flag_types)
+        },
+        "clean": True
+    },
+    objects.FlagType: {
+        "clean": True
+    },
+    objects.Version: {},
+    objects.Milestone: {},
+    objects.Classification: {},
+    objects.UpdateResult: {
+        "fields": {
+            "last_change_time": DATETIME
+        }
+    },
+    objects.Comment: {
+        "fields": {
+            "time": DATETIME,
+            "creation_time": DATETIME
+        },
+        "interned": True
+    },
+    objects.BugField: {
+        "fields": {
+            "values": LIST(objects.BugFieldValue)
+        }
+    },
+    objects.BugFieldValue: {},
+    objects.User: {
+        "fields": {
+            "groups": LIST(objects.Group),
+            "saved_searches": LIST(objects.Search),
+            "saved_reports": LIST(objects.Search)
+        },
+        "clean": True
+    },
+    objects.Group: {
+        "fields": {
+            "membership": LIST(objects.User)
+        },
+        "clean": True
+    },
+    objects.Search: {}
+}
+
+def parse_datetime(string):
+    # strptime is slow, the format of bugzilla's timestamps is fixed
+    if len(string) == 20 and string[4::3] == "--T::Z":
+        try:
+            return datetime(int(string[0:4]), int(string[5:7]), int(string[8:10]),
+                            int(string[11:13]), int(string[14:16]), int(string[17:19]))
+        except ValueError:
+            pass
+    return parse_bugzilla_datetime(string)
+
+def _generate(cls, schema):
+    name = cls.__name__
+    lines = ["def decode_%s(client, data):" % name]
+    fields = schema.get("fields", {})
+    shared = [(field, spec) for field, spec in fields.items() if spec[0] in ("object", "list") and spec[2]]
+    if schema.get("interned") or shared:
+        lines.append("    identity_map = client.identity_map")
+    
+    for field, spec in fields.items():
+        kind = spec[0]
+        if kind == "bool":
+            lines.append("    if %r in data: data[%r] = bool(data[%r])" % (field, field, field))
+            continue
+        if kind in ("object", "list") and spec[2]:
+            continue # after interning
+        
+        lines.append("    value = data.get(%r)" % field)
+        if kind == "datetime":
+            lines.append("    if value is not None: data[%r] = parse_datetime(value)" % field)
+        elif kind == "base64":
+            lines.append("    if value is not None: data[%r] = b64decode(value)" % field)
+        elif kind == "object":
+            lines.append("    if value is not None: data[%r] = decode_%s(client, value)" % (field, spec[1].__name__))
+        elif kind == "list":
+            lines.append("    if value is not None: data[%r] = [decode_%s(client, obj) for obj in value]" % (field, spec[1].__name__))
+        elif kind == "function":
+            lines.append("    if value is not None: data[%r] = function_%s_%s(client, value)" % (field, name, field))
+    
+    if schema.get("interned"):
+        lines.append("    if identity_map is not None: identity_map.intern_fields(data)")
+    for field, (kind, target, method) in shared:
+        if kind == "object":
+            shared_code, local_code = "identity_map.%s(value)" % method, "decode_%s(client, value)"
+        else:
+            shared_code, local_code = "[identity_map.%s(obj) for obj in value]" % method, "[decode_%s(client, obj) for obj in value]"
+        lines.append("    value = data.get(%r)" % field)
+        if target is None:
+            # without an identity map the dicts are kept
+            lines.append("    if value is not None and identity_map is not None: data[%r] = %s" % (field, shared_code))
+        else:
+            lines.append("    if value is not None:")
+            lines.append("        data[%r] = %s if identity_map is not None else %s" % (field, shared_code, local_code % target.__name__))
+    
+    for field in schema.get("drop", []):
+        lines.append("    data.pop(%r, None)" % field)
+    
+    # the same defaults as set_default_attributes, new lists and dicts for every object
+    for field, default in cls.ATTRIBUTES.items():
+        if isinstance(default, (list, dict)):
+            value = "deepcopy(%s.ATTRIBUTES[%r])" % (name, field) if default else repr(default)
+        elif default is None or isinstance(default, (bool, int, float, str, bytes)):
+            value = repr(default)
+        else:
+            value = "%s.ATTRIBUTES[%r]" % (name, field)
+        lines.append("    if %r not in data: data[%r] = %s" % (field, field, value))
+    
+    lines.append("    obj = new(%s)" % name)
+    lines.append("    update(obj, data)")
+    if schema.get("clean"):
+        lines.append("    obj.mark_clean()")
+    lines.append("    return obj")
+    return "\n".join(lines) + "\n"
+
+def _compile():
+    namespace = {
+        "b64decode": b64decode,
+        "deepcopy": deepcopy,
+        "parse_datetime": parse_datetime,
+        "new": dict.__new__,
+        "update": dict.update
+    }
+    sources = {}
+    for cls, schema in SCHEMAS.items():
+        namespace[cls.__name__] = cls
+        for field, spec in schema.get("fields", {}).items():
+            if spec[0] == "function":
+                namespace["function_%s_%s" % (cls.__name__, field)] = spec[1]
+        sources[cls] = _generate(cls, schema)
+        exec(compile(sources[cls], "<decoder %s>" % cls.__name__, "exec"), namespace)
+    return {cls: namespace["decode_%s" % cls.__name__] for cls in SCHEMAS}, sources
+
+DECODERS, SOURCES = _compile()
@@ -0,0 +1,76 @@
+"""
+Coalescing of concurrent identical requests. While a request is in flight, every other
+thread asking for the same key waits for it instead of sending its own request. Each
+caller gets its own copy of the result, since the client decodes the json-objects in place.
+"""
+
+import threading
+
+def copy_json(obj):
+    # faster than deepcopy for the dicts, lists and scalars of a json-response
+    if isinstance(obj, dict):
+        return {key: copy_json(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [copy_json(value) for value in obj]
+    return obj
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.generation = 0
+        self.coalesced = 0
+    
+    def do(self, key, function):
+        """
+        Call function, unless a call for the same key is in flight already. In that case
+        wait for it and return a copy of its result or raise its exception.
+        """
+        with self.lock:
+            key = (self.generation, key)
+            call = self.calls.get(key)
+            if call is None:
+                call = self.calls[key] = _Call()
+                leader = True
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+        
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return copy_json(call.result)
+        
+        try:
+            call.result = function()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+                waiters = call.waiters
+            call.event.set()
+        # the waiters copy the result after the event, so the leader must not hand out
+        # the original while they might still be copying it
+        return copy_json(call.result) if waiters else call.result
+    
+    def forget(self):
+        """
+        Let calls started from now on not join the calls in flight. The client calls this
+        after every modifying request, so a read after a write never gets an older result.
+        """
+        with self.lock:
+            self.generation += 1
+    
+    def get_coalesced_count(self):
+        return self.coalesced
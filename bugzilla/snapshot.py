@@ -0,0 +1,337 @@
+"""
+A read-only snapshot file of bugs, meant to be opened by many processes at once. The file
+is opened with mmap, so all processes share the pages of the operating system's cache
+and nothing is parsed on open: opening takes the same time for any number of bugs.
+Every bug is a fixed-width record of the fields in COLUMNS. Strings are stored once in a
+string heap and referenced by their index, lists are stored in a list heap. A direct-
+address table maps every bug-id between the lowest and the highest id to its record, so
+a lookup by id is one array access. If the ids are so sparse that this table would be
+larger than a sorted array of the ids, the array is stored instead and a lookup is a
+binary search. The remaining attributes of a bug (its flags, the
+user-details, custom fields, ...) are encoded with bugzilla.codec and only decoded when
+one of them is accessed.
+get() returns a BugView, a read-only view with the attributes of a Bug that reads its
+fields from the mapped file when they are accessed. to_bug() turns it into a Bug.
+
+    write_snapshot("bugs.snapshot", bugs)
+    snapshot = Snapshot("bugs.snapshot")
+    bug = snapshot.get(1234)
+    print(bug.status, bug.keywords)
+"""
+
+import json
+import mmap
+from bisect import bisect_left
+import os
+import struct
+from copy import deepcopy
+from datetime import datetime, timedelta
+from . import codec
+from .objects import Bug
+
+MAGIC = b"BZSN"
+SNAPSHOT_VERSION = 2
+
+INT = "int"
+BOOL = "bool"
+DATETIME = "datetime"
+STRING = "string"
+STRING_LIST = "string_list"
+INT_LIST = "int_list"
+
+# the columns of a record and their types. values of other types are kept with the
+# remaining attributes.
+COLUMNS = [
+    ("id", INT), ("dupe_of", INT),
+    ("is_open", BOOL), ("is_confirmed", BOOL), ("is_cc_accessible", BOOL), ("is_creator_accessible", BOOL),
+    ("creation_time", DATETIME), ("last_change_time", DATETIME),
+    ("assigned_to", STRING), ("classification", STRING), ("component", STRING), ("creator", STRING),
+    ("deadline", STRING), ("op_sys", STRING), ("platform", STRING), ("priority", STRING), ("product", STRING),
+    ("qa_contact", STRING), ("resolution", STRING), ("severity", STRING), ("status", STRING),
+    ("summary", STRING), ("target_milestone", STRING), ("url", STRING), ("version", STRING),
+    ("whiteboard", STRING),
+    ("alias", STRING_LIST), ("cc", STRING_LIST), ("groups", STRING_LIST), ("keywords", STRING_LIST),
+    ("see_also", STRING_LIST),
+    ("blocks", INT_LIST), ("depends_on", INT_LIST)
+]
+COLUMN_NAMES = [name for name, kind in COLUMNS]
+# the virtual attributes of Bug, they are built from the _detail-attributes
+VIRTUAL = ("assigned_to", "cc", "creator", "qa_contact")
+
+FORMATS = {INT: "q", BOOL: "B", DATETIME: "q", STRING: "I", STRING_LIST: "Q", INT_LIST: "Q"}
+# the stored value of None (or of a value kept with the remaining attributes)
+MISSING = {INT: -2 ** 63, BOOL: 2, DATETIME: -2 ** 63, STRING: 2 ** 32 - 1, STRING_LIST: 2 ** 64 - 1, INT_LIST: 2 ** 64 - 1}
+# the remaining attributes: offset and length in the extra heap
+RECORD = struct.Struct("<" + "".join(FORMATS[kind] for name, kind in COLUMNS) + "QI")
+# magic, version, bug count, lowest id, id slots (0 for a sorted array of the ids), the
+# offsets of the column names, the id table, the records, the string offsets, the string
+# data, the list heap and the extra heap
+HEADER = struct.Struct("<4sIQqQQQQQQQQ")
+UINT32 = struct.Struct("<I")
+
+EPOCH = datetime(1970, 1, 1)
+
+def _fits(kind, value):
+    if kind == INT: return isinstance(value, int) and not isinstance(value, bool) and -2 ** 63 < value < 2 ** 63
+    if kind == BOOL: return isinstance(value, bool)
+    if kind == DATETIME: return isinstance(value, datetime) and value.microsecond == 0 and value.tzinfo is None
+    if kind == STRING: return isinstance(value, str)
+    if kind == STRING_LIST: return isinstance(value, list) and all(isinstance(item, str) for item in value)
+    return isinstance(value, list) and all(isinstance(item, int) and not isinstance(item, bool) for item in value)
+
+def write_snapshot(path, bugs):
+    """
+    Write the bugs to a snapshot file at path. The file is replaced atomically, readers
+    that have the old file open keep reading the old file.
+    """
+    bugs = sorted(bugs, key = lambda bug: bug.id)
+    strings = {}
+    string_data = bytearray()
+    string_offsets = []
+    list_heap = bytearray()
+    extra_heap = bytearray()
+    records = bytearray()
+    
+    def string(value):
+        index = strings.get(value)
+        if index is None:
+            index = strings[value] = len(string_offsets)
+            string_offsets.append(len(string_data))
+            string_data.extend(value.encode("utf-8"))
+        return index
+    
+    for bug in bugs:
+        values = []
+        extra = {key: value for key, value in bug.items() if key not in COLUMN_NAMES}
+        for name, kind in COLUMNS:
+            value = bug[name] if name in VIRTUAL else bug.get(name)
+            if value is None or not _fits(kind, value):
+                # virtual attributes can be rebuilt from the _detail-attributes
+                if value is not None and name not in VIRTUAL: extra[name] = value
+                values.append(MISSING[kind])
+            elif kind == BOOL:
+                values.append(int(value))
+            elif kind == DATETIME:
+                values.append(int((value - EPOCH).total_seconds()))
+            elif kind == STRING:
+                values.append(string(value))
+            elif kind == STRING_LIST:
+                values.append(len(list_heap))
+                list_heap.extend(struct.pack("<I%iI" % len(value), len(value), *map(string, value)))
+            elif kind == INT_LIST:
+                values.append(len(list_heap))
+                list_heap.extend(struct.pack("<I%iq" % len(value), len(value), *value))
+            else:
+                values.append(value)
+        data = codec.encode(extra) if extra else b""
+        values.extend((len(extra_heap), len(data)))
+        extra_heap.extend(data)
+        records.extend(RECORD.pack(*values))
+    string_offsets.append(len(string_data))
+    
+    for previous, bug in zip(bugs, bugs[1:]):
+        if previous.id == bug.id:
+            raise ValueError("The bug %i is contained twice" % bug.id)
+    min_id = bugs[0].id if bugs else 0
+    slots = bugs[-1].id - min_id + 1 if bugs else 0
+    if 4 * slots <= 8 * len(bugs):
+        id_table = bytearray(4 * slots)
+        for index, bug in enumerate(bugs):
+            UINT32.pack_into(id_table, 4 * (bug.id - min_id), index + 1)
+    else:
+        # e.g. the bugs 1 and 2000000000 would need a table of 8 GB
+        slots = 0
+        id_table = struct.pack("<%iq" % len(bugs), *(bug.id for bug in bugs))
+    
+    names = json.dumps(COLUMNS).encode("utf-8")
+    sections = [names, id_table, records, struct.pack("<%iQ" % len(string_offsets), *string_offsets),
+                string_data, list_heap, extra_heap]
+    offsets = []
+    position = HEADER.size
+    for section in sections:
+        # aligned sections, so the arrays can be read with aligned accesses
+        position += -position % 8
+        offsets.append(position)
+        position += len(section)
+    
+    with open(path + ".tmp", "wb") as file:
+        file.write(HEADER.pack(MAGIC, SNAPSHOT_VERSION, len(bugs), min_id, slots, *offsets))
+        for offset, section in zip(offsets, sections):
+            file.write(bytes(offset - file.tell()))
+            file.write(section)
+    os.replace(path + ".tmp", path)
+
+class Snapshot:
+    def __init__(self, path):
+        """
+        Open a snapshot file. Only the header is read, the rest is mapped into memory.
+        """
+        self.file = open(path, "rb")
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise ValueError("%s is not a snapshot file" % path)
+        if len(self.data) < HEADER.size or self.data[:4] != MAGIC:
+            self.close()
+            raise ValueError("%s is not a snapshot file" % path)
+        (magic, version, self.count, self.min_id, self.slots, names, self.id_table, self.records,
+            self.string_offsets, self.string_data, self.list_heap, self.extra_heap) = HEADER.unpack_from(self.data)
+        if version != SNAPSHOT_VERSION or json.loads(self.data[names:self.id_table].rstrip(b"\0")) != [list(column) for column in COLUMNS]:
+            self.close()
+            raise ValueError("Unsupported snapshot version %r or columns" % version)
+        
+        # the sorted ids of a sparse snapshot, a view of the mapped file
+        self.ids = None
+        if self.slots == 0 and self.count:
+            self.ids = memoryview(self.data)[self.id_table:self.id_table + 8 * self.count].cast("q")
+        
+        # the position and the unpacking struct of every column in a record
+        self.columns = {}
+        position = 0
+        for name, kind in COLUMNS:
+            self.columns[name] = (position, struct.Struct("<" + FORMATS[kind]), kind)
+            position += struct.calcsize("<" + FORMATS[kind])
+        self.extra_position = position
+    
+    def close(self):
+        # the mmap can't be closed while a view of it exists
+        if getattr(self, "ids", None) is not None: self.ids.release()
+        self.data.close()
+        self.file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        self.close()
+    
+    def __len__(self):
+        return self.count
+    
+    def __contains__(self, bug_id):
+        return self._record(bug_id) is not None
+    
+    def __iter__(self):
+        "Iterates over the views of all bugs, ordered by their id."
+        for index in range(self.count):
+            yield BugView(self, self.records + index * RECORD.size)
+    
+    def _record(self, bug_id):
+        if not isinstance(bug_id, int): return None
+        if self.ids is not None:
+            index = bisect_left(self.ids, bug_id)
+            if index == self.count or self.ids[index] != bug_id: return None
+            return self.records + index * RECORD.size
+        slot = bug_id - self.min_id
+        if slot < 0 or slot >= self.slots:
+            return None
+        index = UINT32.unpack_from(self.data, self.id_table + 4 * slot)[0]
+        return None if index == 0 else self.records + (index - 1) * RECORD.size
+    
+    def get(self, bug_id):
+        "Returns the BugView of the bug with the given id, or None."
+        record = self._record(bug_id)
+        return None if record is None else BugView(self, record)
+    
+    def get_ids(self):
+        return [view.id for view in self]
+    
+    def get_string(self, index):
+        start, end = struct.unpack_from("<QQ", self.data, self.string_offsets + 8 * index)
+        return self.data[self.string_data + start:self.string_data + end].decode("utf-8")
+    
+    def get_value(self, record, name):
+        # returns the value of a column, or MISSING if the value is None or in the extra data
+        position, unpacker, kind = self.columns[name]
+        value = unpacker.unpack_from(self.data, record + position)[0]
+        if value == MISSING[kind]:
+            return MISSING
+        if kind == STRING:
+            return self.get_string(value)
+        if kind == BOOL:
+            return bool(value)
+        if kind == DATETIME:
+            return EPOCH + timedelta(seconds = value)
+        if kind == STRING_LIST:
+            count = UINT32.unpack_from(self.data, self.list_heap + value)[0]
+            return [self.get_string(index) for index in struct.unpack_from("<%iI" % count, self.data, self.list_heap + value + 4)]
+        if kind == INT_LIST:
+            count = UINT32.unpack_from(self.data, self.list_heap + value)[0]
+            return list(struct.unpack_from("<%iq" % count, self.data, self.list_heap + value + 4))
+        return value
+    
+    def get_extra(self, record):
+        offset, length = struct.unpack_from("<QI", self.data, record + self.extra_position)
+        if not length: return {}
+        return codec.decode(self.data[self.extra_heap + offset:self.extra_heap + offset + length])
+
+class BugView:
+    """
+    A read-only view of a bug in a snapshot. Attributes are read like those of a Bug,
+    bug.status or bug["status"], and decoded on every access. Lists and objects returned
+    are copies, modifying them doesn't change the snapshot.
+    """
+    
+    __slots__ = ("snapshot", "record", "extra", "details")
+    
+    def __init__(self, snapshot, record):
+        self.snapshot = snapshot
+        self.record = record
+        self.extra = None
+        # a Bug of the extra data, it builds the virtual attributes from the _detail-attributes
+        self.details = None
+    
+    def _get_extra(self):
+        if self.extra is None: self.extra = self.snapshot.get_extra(self.record)
+        return self.extra
+    
+    def __getitem__(self, key):
+        if key in self.snapshot.columns:
+            value = self.snapshot.get_value(self.record, key)
+            if value is not MISSING: return value
+            if key in VIRTUAL:
+                if self.details is None: self.details = Bug(self._get_extra())
+                return self.details[key]
+            return self._get_extra().get(key)
+        extra = self._get_extra()
+        if key in extra: return extra[key]
+        if key in Bug.ATTRIBUTES: return deepcopy(Bug.ATTRIBUTES[key])
+        raise KeyError(key)
+    
+    def __getattr__(self, attr):
+        if attr.startswith("__") and attr.endswith("__"):
+            raise AttributeError(attr)
+        try:
+            return self[attr]
+        except KeyError:
+            raise AttributeError(attr)
+    
+    def __contains__(self, key):
+        return key in self.snapshot.columns or key in self._get_extra() or key in Bug.ATTRIBUTES
+    
+    def get(self, key, default = None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+    
+    def keys(self):
+        return set(self.snapshot.columns) | set(self._get_extra()) | set(Bug.ATTRIBUTES)
+    
+    def __repr__(self):
+        return "BugView(%r)" % self.id
+    
+    def to_bug(self):
+        "Returns the bug as a Bug-object, marked clean like the bugs of the client."
+        data = self._get_extra().copy()
+        for name in self.snapshot.columns:
+            if name in VIRTUAL: continue
+            value = self.snapshot.get_value(self.record, name)
+            if value is not MISSING:
+                data[name] = value
+            elif name not in data and name in Bug.ATTRIBUTES:
+                data[name] = None
+        bug = Bug(data)
+        bug.mark_clean()
+        return bug
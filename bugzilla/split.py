@@ -0,0 +1,164 @@
+"""
+Runs searches that return more bugs than the max_search_results of the bugzilla-
+installation, which would silently cut off the results. If a search returns max_results
+bugs (or count_only says it would), it is split into disjoint ranges of bug-ids or of
+creation times. The ranges are searched in parallel and ranges that hit the limit again
+are split further. Without count_only, the first search is ordered by the split field,
+so its bugs are kept and only the range after them is split. The size of new ranges
+follows the density of bugs seen so far, so that most ranges return just under the
+limit. The results are merged, deduplicated and ordered by id.
+
+    bugs = QuerySplitter(bugzilla, max_results = 10000).search(product = "Firefox")
+"""
+
+import math
+import time
+from datetime import datetime, timedelta
+from . import BugzillaException
+from .parallel import bounded_map
+from .util import range_chart, encode_bugzilla_datetime
+
+EPOCH = datetime(1970, 1, 1)
+
+class QuerySplitter:
+    # the searchable column of every split field
+    COLUMNS = {"bug_id": "bug_id", "creation_time": "creation_ts"}
+    
+    def __init__(self, bugzilla, max_results = 10000, field = "bug_id", workers = 4, fill = 0.8):
+        if field not in QuerySplitter.COLUMNS:
+            raise ValueError("Searches can be split by %s" % " or ".join(QuerySplitter.COLUMNS))
+        self.bugzilla = bugzilla
+        self.max_results = max_results
+        self.field = field
+        self.workers = workers
+        # the share of max_results a range is sized for
+        self.target = max(1, int(max_results * fill))
+        self.requests = 0
+        self.bugs_seen = 0
+        self.span_seen = 0
+    
+    def _value(self, bound):
+        # the chart-value of a numeric bound
+        if self.field == "creation_time":
+            return encode_bugzilla_datetime(EPOCH + timedelta(seconds = bound))
+        return bound
+    
+    def _search(self, query, lo, hi):
+        self.requests += 1
+        kw = dict(query)
+        kw.update(range_chart(QuerySplitter.COLUMNS[self.field], self._value(lo), self._value(hi), query))
+        return self.bugzilla.search_bugs(**kw)
+    
+    def _count(self, query, lo, hi):
+        self.requests += 1
+        kw = dict(query)
+        kw.update(range_chart(QuerySplitter.COLUMNS[self.field], self._value(lo), self._value(hi), query))
+        return self.bugzilla.count_bugs(**kw)
+    
+    def get_bounds(self, query):
+        """
+        Returns the numeric range [lo, hi) containing all bugs of the query. Creation times
+        are seconds since the epoch.
+        """
+        first = self.bugzilla.search_bugs(include_fields = ["id", "creation_time"], order = "bug_id ASC", limit = 1, **query)
+        if not first: return None
+        if self.field == "creation_time":
+            # the bug with the lowest id is usually the oldest one, but imported bugs might be
+            # older. search() adds a range before it for those.
+            return self._bound(first[0]), self.get_end(query)
+        return first[0].id, self.get_end(query)
+    
+    def get_end(self, query):
+        "Returns the end of the range containing all bugs of the query."
+        if self.field == "creation_time":
+            return int(time.time()) + 1
+        last = self.bugzilla.search_bugs(include_fields = ["id"], order = "bug_id DESC", limit = 1, **query)
+        return last[0].id + 1
+    
+    def _bound(self, bug):
+        # the numeric value of the split field of a bug
+        if self.field == "creation_time":
+            return int((bug.creation_time - EPOCH).total_seconds())
+        return bug.id
+    
+    def _first_search(self, query):
+        """
+        Searches without count_only. The bugs are ordered by the split field, so a truncated
+        result still holds all bugs before the last one and only the rest has to be split.
+        """
+        self.requests += 1
+        kw = dict(query, order = "%s ASC" % QuerySplitter.COLUMNS[self.field])
+        field = "id" if self.field == "bug_id" else self.field
+        if "include_fields" in kw and field not in kw["include_fields"]:
+            kw["include_fields"] = list(kw["include_fields"]) + [field]
+        return self.bugzilla.search_bugs(**kw)
+    
+    def split(self, lo, hi, count = None):
+        """
+        Split [lo, hi) into ranges that should hold target bugs each. count is the number
+        of bugs in the range if it is known.
+        """
+        if count is not None:
+            parts = math.ceil(count / self.target)
+        elif self.span_seen and self.bugs_seen:
+            parts = math.ceil((hi - lo) * self.bugs_seen / self.span_seen / self.target)
+        else:
+            parts = 2
+        parts = max(2, min(parts, hi - lo))
+        bounds = [lo + (hi - lo) * i // parts for i in range(parts)] + [hi]
+        return [(bounds[i], bounds[i + 1]) for i in range(parts) if bounds[i] < bounds[i + 1]]
+    
+    def search(self, **query):
+        """
+        Same as Bugzilla.search_bugs, but returns all bugs even if there are more than
+        max_results. limit and offset cannot be used.
+        """
+        if "limit" in query or "offset" in query:
+            raise ValueError("limit and offset cannot be used for split searches")
+        
+        count = None
+        results = {}
+        if self.bugzilla.supports_count_only():
+            self.requests += 1
+            count = self.bugzilla.count_bugs(**query)
+            if count < self.max_results:
+                self.requests += 1
+                return sorted(self.bugzilla.search_bugs(**query), key = lambda bug: bug.id)
+            bounds = self.get_bounds(query)
+            if bounds is None: return []
+            pending = self.split(bounds[0], bounds[1], count)
+            if self.field == "creation_time" and bounds[0] > 0: pending.append((0, bounds[0]))
+        else:
+            bugs = self._first_search(query)
+            if len(bugs) < self.max_results:
+                return sorted(bugs, key = lambda bug: bug.id)
+            # the bugs at the last creation time might have been cut off, they are searched again
+            lo = min(self._bound(bug) for bug in bugs)
+            start = max(self._bound(bug) for bug in bugs) + (1 if self.field == "bug_id" else 0)
+            for bug in bugs:
+                if self._bound(bug) < start: results[bug.id] = bug
+            self.bugs_seen += len(results)
+            self.span_seen += start - lo
+            end = self.get_end(query)
+            pending = self.split(start, end) if start < end else []
+        
+        while pending:
+            truncated = []
+            for (lo, hi), bugs in bounded_map(lambda bug_range: self._search(query, *bug_range), pending, self.workers):
+                if len(bugs) < self.max_results:
+                    self.bugs_seen += len(bugs)
+                    self.span_seen += hi - lo
+                    for bug in bugs: results[bug.id] = bug
+                elif hi - lo == 1:
+                    raise BugzillaException(-1, "More than %i bugs share the same %s" % (self.max_results, self.field))
+                else:
+                    truncated.append((lo, hi))
+            
+            pending = []
+            if self.bugzilla.supports_count_only():
+                for (lo, hi), count in bounded_map(lambda bug_range: self._count(query, *bug_range), truncated, self.workers):
+                    pending.extend(self.split(lo, hi, count))
+            else:
+                for lo, hi in truncated:
+                    pending.extend(self.split(lo, hi))
+        return [results[bug_id] for bug_id in sorted(results)]
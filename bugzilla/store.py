@@ -0,0 +1,224 @@
+"""
+A local store for bugs that answers search_bugs-queries without asking bugzilla.
+The store is fed with the results of search_bugs (or any other list of bugs) and keeps
+hash indexes on the categorical fields and sorted indexes on the timestamps, so a query
+only touches the bugs that match. search accepts the same keyword-parameters as
+Bugzilla.search_bugs, a list of values matches any of them (just like bugzilla does).
+creation_time and last_change_time match bugs changed at this time or later, a tuple
+(start, end) can be passed to search a range. Both ends are inclusive and can be None.
+The results are the stored Bug-objects themselves, sorted by their id. They must not be
+modified while they are stored, the indexes would not know about the change. Add a
+modified bug again with add_bug to index its new values.
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from .util import parse_bugzilla_datetime
+
+# search-parameters that are looked up in a hash index. The values are the functions
+# returning the indexed values of a bug.
+def _single(field):
+    return lambda bug: [bug[field]]
+
+def _multi(field):
+    return lambda bug: bug[field]
+
+HASH_FIELDS = {
+    "alias": _multi("alias"),
+    "assigned_to": _single("assigned_to"),
+    "cc": _multi("cc"),
+    "classification": _single("classification"),
+    "component": _single("component"),
+    "creator": _single("creator"),
+    "id": _single("id"),
+    "keywords": _multi("keywords"),
+    "op_sys": _single("op_sys"),
+    "platform": _single("platform"),
+    "priority": _single("priority"),
+    "product": _single("product"),
+    "qa_contact": _single("qa_contact"),
+    "resolution": _single("resolution"),
+    "severity": _single("severity"),
+    "status": _single("status"),
+    "target_milestone": _single("target_milestone"),
+    "version": _single("version")
+}
+
+# search-parameters that are looked up in a sorted index
+SORTED_FIELDS = ("creation_time", "last_change_time")
+
+# search-parameters that match substrings, these have to scan the candidates
+SUBSTRING_FIELDS = ("summary", "url", "whiteboard")
+
+class BugStore:
+    def __init__(self, bugs = ()):
+        self.bugs = {}
+        self.hash_indexes = {field: {} for field in HASH_FIELDS}
+        self.sorted_indexes = {field: [] for field in SORTED_FIELDS}
+        self.unsorted = set()
+        # the number of entries of removed bugs left in the sorted indexes
+        self.stale = {field: 0 for field in SORTED_FIELDS}
+        # bug-id -> (the hash-index values, the sorted-index values) it was indexed with
+        self.indexed = {}
+        self.add_bugs(bugs)
+    
+    def __len__(self):
+        return len(self.bugs)
+    
+    def __contains__(self, bug_id):
+        return bug_id in self.bugs
+    
+    def __iter__(self):
+        return iter(self.bugs.values())
+    
+    def get(self, bug_id):
+        return self.bugs.get(bug_id)
+    
+    def sync(self, bugzilla, **kw):
+        """
+        Run search_bugs with the given keyword-parameters and add the result to the store.
+        Returns the list of found bugs.
+        """
+        bugs = bugzilla.search_bugs(**kw)
+        self.add_bugs(bugs)
+        return bugs
+    
+    def add_bugs(self, bugs):
+        for bug in bugs:
+            self.add_bug(bug)
+    
+    def add_bug(self, bug):
+        """
+        Add a bug to the store. A stored bug with the same id is replaced.
+        """
+        if bug.id in self.bugs:
+            self.remove_bug(bug.id)
+        
+        self.bugs[bug.id] = bug
+        hashed = {}
+        for field, values in HASH_FIELDS.items():
+            index = self.hash_indexes[field]
+            hashed[field] = self._hashable(values(bug))
+            for value in hashed[field]:
+                index.setdefault(value, set()).add(bug.id)
+        times = {}
+        for field in SORTED_FIELDS:
+            if bug[field] is not None:
+                times[field] = bug[field]
+                self.sorted_indexes[field].append((bug[field], bug.id))
+                self.unsorted.add(field)
+        self.indexed[bug.id] = (hashed, times)
+    
+    def remove_bug(self, bug_id):
+        del self.bugs[bug_id]
+        hashed, times = self.indexed.pop(bug_id)
+        for field, values in hashed.items():
+            index = self.hash_indexes[field]
+            for value in values:
+                ids = index[value]
+                ids.discard(bug_id)
+                if not ids: del index[value]
+        # the entries in the sorted indexes are skipped until the index is compacted,
+        # removing them one by one would make replacing many bugs quadratic
+        for field in times:
+            self.stale[field] += 1
+    
+    def _hashable(self, values):
+        # a bug might have been loaded without some fields, e.g. via include_fields
+        return [value for value in values if value is not None and not isinstance(value, (list, dict))]
+    
+    def _is_current(self, field, time, bug_id):
+        # entries of removed or replaced bugs stay in the sorted indexes for a while
+        indexed = self.indexed.get(bug_id)
+        return indexed is not None and indexed[1].get(field) == time
+    
+    def _sorted_index(self, field):
+        index = self.sorted_indexes[field]
+        if self.stale[field] > len(index) // 2:
+            # duplicates of bugs replaced with the same time are dropped too
+            entries = {(time, bug_id) for time, bug_id in index if self._is_current(field, time, bug_id)}
+            self.sorted_indexes[field] = list(entries)
+            self.stale[field] = 0
+            self.unsorted.add(field)
+        # the sorted indexes are sorted lazily, adding many bugs would be quadratic otherwise
+        if field in self.unsorted:
+            self.sorted_indexes[field].sort(key = lambda entry: (entry[0], entry[1]))
+            self.unsorted.discard(field)
+        return self.sorted_indexes[field]
+    
+    def _to_datetime(self, value):
+        if value is None or isinstance(value, datetime):
+            return value
+        return parse_bugzilla_datetime(value)
+    
+    def _time_bounds(self, field, value):
+        # returns the slice of the sorted index matching the given time or time range
+        if isinstance(value, (tuple, list)):
+            start, end = value
+        else:
+            start, end = value, None
+        start, end = self._to_datetime(start), self._to_datetime(end)
+        
+        index = self._sorted_index(field)
+        lo = 0 if start is None else bisect_left(index, (start, ))
+        hi = len(index) if end is None else bisect_right(index, (end, float("inf")))
+        return start, end, lo, hi
+    
+    def search_ids(self, **kw):
+        """
+        Returns the sorted list of ids of all bugs matching the query, see search.
+        """
+        limit = kw.pop("limit", None)
+        offset = kw.pop("offset", 0)
+        
+        sets = []
+        ranges = []
+        substrings = {}
+        for key, value in kw.items():
+            if key in HASH_FIELDS:
+                index = self.hash_indexes[key]
+                if isinstance(value, (list, tuple, set)):
+                    ids = set()
+                    for obj in value:
+                        ids |= index.get(obj, set())
+                else:
+                    ids = index.get(value, set())
+                sets.append(ids)
+            elif key in SORTED_FIELDS:
+                ranges.append((key, ) + self._time_bounds(key, value))
+            elif key in SUBSTRING_FIELDS:
+                substrings[key] = value if isinstance(value, (list, tuple, set)) else [value]
+            else:
+                raise ValueError("The search-parameter '%s' is not supported by the local store" % key)
+        
+        # the smallest sets are intersected first, the time ranges are only turned into
+        # sets if they are smaller than the candidates found in the hash indexes
+        candidates = None
+        for ids in sorted(sets, key = len):
+            candidates = ids if candidates is None else candidates & ids
+        for field, start, end, lo, hi in sorted(ranges, key = lambda entry: entry[4] - entry[3]):
+            if candidates is not None and len(candidates) < hi - lo:
+                candidates = {bug_id for bug_id in candidates if self.bugs[bug_id][field] is not None
+                            and (start is None or self.bugs[bug_id][field] >= start)
+                            and (end is None or self.bugs[bug_id][field] <= end)}
+            else:
+                ids = {bug_id for time, bug_id in self.sorted_indexes[field][lo:hi] if self._is_current(field, time, bug_id)}
+                candidates = ids if candidates is None else candidates & ids
+        if candidates is None:
+            candidates = self.bugs.keys()
+        
+        result = []
+        for bug_id in sorted(candidates):
+            bug = self.bugs[bug_id]
+            if all(any(sub.lower() in (bug[key] or "").lower() for sub in subs) for key, subs in substrings.items()):
+                result.append(bug_id)
+        
+        result = result[offset:]
+        return result if limit is None else result[:limit]
+    
+    def search(self, **kw):
+        """
+        Search the stored bugs. The keyword-parameters are the same as for
+        Bugzilla.search_bugs, see the module-documentation for the details.
+        """
+        return [self.bugs[bug_id] for bug_id in self.search_ids(**kw)]
@@ -0,0 +1,195 @@
+"""
+Uploads attachments from files or streams without loading them into memory. add_attachment
+needs the whole file in Attachment.data and holds it three times while sending: as bytes,
+base64-encoded and inside the json-body. The upload pipeline writes the json-body while it
+is sent instead: the fields of the attachment, then the file in chunks that are base64-
+encoded one at a time. So an upload needs about two chunks of memory, whatever the size of
+the file is. The Uploader runs several uploads in parallel, limits the number of uploads to
+fit a memory budget, retries uploads failing with network- or server-errors and reports
+its progress.
+
+    uploader = Uploader(bugzilla, workers = 4, progress = print_progress)
+    for upload, result in uploader.run([Upload(Attachment({"file_name": "build.log",
+                                "summary": "Build log", "content_type": "text/plain"}), "build.log", 1234)]):
+        print(upload.source, result)
+"""
+
+import base64
+import json
+import os
+import threading
+import time
+from urllib.error import HTTPError, URLError
+from . import BugzillaException
+from .parallel import bounded_map
+
+DEFAULT_CHUNK_SIZE = 3 * 256 * 1024
+
+class AttachmentBody:
+    """
+    The json-body of a create-attachment request with the data read from a file or a
+    stream. It is an iterable of bytes, that can be iterated again for a retry if the
+    source is a path or a seekable stream. counter is called with the number of bytes
+    read from the source, and with minus the bytes of the last try when it is retried.
+    """
+    
+    def __init__(self, fields, source, size = None, chunk_size = DEFAULT_CHUNK_SIZE, counter = None):
+        # whole base64-groups per chunk, so the encoded chunks can simply be joined
+        self.chunk_size = max(3, chunk_size - chunk_size % 3)
+        self.source = source
+        self.counter = counter
+        self.start = None if isinstance(source, str) or not source.seekable() else source.tell()
+        self.iterated = False
+        # the bytes counted by the current iteration
+        self.counted = 0
+        if size is None:
+            if isinstance(source, str):
+                size = os.path.getsize(source)
+            elif self.start is not None:
+                size = source.seek(0, os.SEEK_END) - self.start
+                source.seek(self.start)
+        self.size = size
+        
+        fields = dict(fields)
+        fields.pop("data", None)
+        self.prefix = (json.dumps(fields)[:-1] + (", " if fields else "") + '"data": "').encode("ascii")
+        self.suffix = b'"}'
+    
+    def get_content_length(self):
+        "The length of the body, None if the size of an unseekable stream is not known."
+        if self.size is None: return None
+        return len(self.prefix) + (self.size + 2) // 3 * 4 + len(self.suffix)
+    
+    def can_retry(self):
+        return isinstance(self.source, str) or self.start is not None or not self.iterated
+    
+    def __iter__(self):
+        if not self.can_retry():
+            raise BugzillaException(-1, "The attachment stream cannot be sent again")
+        self.iterated = True
+        # a retry sends the data again, it is only counted once
+        self._count(-self.counted)
+        yield self.prefix
+        if isinstance(self.source, str):
+            with open(self.source, "rb") as file:
+                yield from self._encode(file)
+        else:
+            if self.start is not None: self.source.seek(self.start)
+            yield from self._encode(self.source)
+        yield self.suffix
+    
+    def _count(self, size):
+        self.counted += size
+        if self.counter is not None and size: self.counter(size)
+    
+    def _encode(self, file):
+        read = 0
+        buffer = b""
+        while True:
+            chunk = file.read(self.chunk_size - len(buffer))
+            if not chunk: break
+            read += len(chunk)
+            buffer += chunk
+            # streams may return less than asked for, the rest waits for the next chunk
+            if len(buffer) < self.chunk_size: continue
+            self._count(len(buffer))
+            yield base64.b64encode(buffer)
+            buffer = b""
+        if buffer:
+            self._count(len(buffer))
+            yield base64.b64encode(buffer)
+        if self.size is not None and read != self.size:
+            raise BugzillaException(-1, "The attachment has %i bytes instead of %i" % (read, self.size))
+
+class Upload:
+    """
+    One attachment to upload. attachment holds the fields of the attachment like file_name,
+    summary and content_type, its data is ignored. source is a path or a binary stream,
+    size is only needed for unseekable streams, which are sent chunked otherwise. ids is
+    a bug-id or a list of those.
+    """
+    
+    def __init__(self, attachment, source, ids, comment = "", size = None):
+        if not attachment.can_be_added():
+            raise BugzillaException(-1, "This attachment does not have the required fields set")
+        self.attachment = attachment
+        self.source = source
+        self.ids = [ids] if isinstance(ids, int) else list(ids)
+        self.comment = comment
+        self.size = size
+    
+    def get_fields(self):
+        # the data is streamed by AttachmentBody, any data of the attachment isn't encoded
+        fields = self.attachment.add_json(with_data = False)
+        fields["ids"] = self.ids
+        fields["comment"] = self.comment
+        return fields
+
+class Uploader:
+    def __init__(self, bugzilla, workers = 4, max_memory = 64 * 1024 * 1024, chunk_size = DEFAULT_CHUNK_SIZE,
+                retries = 3, backoff = 1.0, progress = None):
+        """
+        Uploads run in up to workers threads, but not more than fit into max_memory bytes
+        with chunks of chunk_size bytes. Failed uploads are retried up to retries times
+        after backoff, 2 * backoff, ... seconds. progress is called with the number of
+        finished uploads, the number of all uploads (None for generators), the bytes sent
+        and the rate in bytes per second.
+        """
+        # a chunk is held once as bytes and once base64-encoded
+        per_upload = chunk_size * 7 // 3
+        if max_memory < per_upload:
+            raise ValueError("max_memory has to fit at least one chunk of %i bytes" % per_upload)
+        self.bugzilla = bugzilla
+        self.workers = max(1, min(workers, max_memory // per_upload))
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.backoff = backoff
+        self.progress = progress
+        self.lock = threading.Lock()
+        self.bytes_sent = 0
+        self.started = None
+    
+    def _count(self, size):
+        with self.lock:
+            self.bytes_sent += size
+    
+    def _is_retryable(self, error):
+        # errors reported by bugzilla and client-errors fail again
+        if isinstance(error, HTTPError): return error.code >= 500
+        return isinstance(error, (URLError, OSError)) and not isinstance(error, FileNotFoundError)
+    
+    def upload(self, upload):
+        """
+        Upload one attachment and return the list of new attachment-ids. Note that a retry
+        after a timeout may create the attachment twice, if bugzilla got the first request.
+        """
+        body = AttachmentBody(upload.get_fields(), upload.source, upload.size, self.chunk_size, self._count)
+        attempt = 0
+        while True:
+            try:
+                return [int(i) for i in self.bugzilla._post("bug/%i/attachment" % upload.ids[0], body)["ids"]]
+            except Exception as e:
+                if attempt >= self.retries or not self._is_retryable(e) or not body.can_retry():
+                    raise
+            time.sleep(self.backoff * 2 ** attempt)
+            attempt += 1
+    
+    def _try_upload(self, upload):
+        try:
+            return self.upload(upload)
+        except Exception as e:
+            return e
+    
+    def run(self, uploads):
+        """
+        Upload all Uploads and yield (upload, result) in the order they finish. The result
+        is the list of new attachment-ids or the exception of a failed upload.
+        """
+        total = len(uploads) if hasattr(uploads, "__len__") else None
+        self.bytes_sent = 0
+        self.started = time.time()
+        for done, (upload, result) in enumerate(bounded_map(self._try_upload, uploads, self.workers, self.workers), 1):
+            if self.progress is not None:
+                elapsed = time.time() - self.started
+                self.progress(done, total, self.bytes_sent, self.bytes_sent / elapsed if elapsed else 0.0)
+            yield upload, result
@@ -21,4 +21,49 @@ def encode_bugzilla_date(dt):
     if dt is None:
         return None
     
-    return dt.strftime(BUGZILLA_DATE_FORMAT)
\ No newline at end of file
+    return dt.strftime(BUGZILLA_DATE_FORMAT)
+
+# the rest-url of a bugzilla-installation, the url has to end with /
+def rest_url(url):
+    if not url.endswith("/"):
+        raise ValueError("Url has to end with /")
+    if not url.endswith("rest/"):
+        url += "rest/"
+    return url
+
+# unsigned LEB128-varints, used by the binary file formats of this package
+def encode_varint(value, out):
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def decode_varint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+# splits a sequence into lists of at most size elements, used to batch requests
+def chunks(sequence, size):
+    sequence = list(sequence)
+    return [sequence[i:i + size] for i in range(0, len(sequence), size)]
+
+# returns search-parameters restricting a search to lo <= field < hi. Bugzilla's
+# boolean charts (f1, o1, v1, ...) are used, starting at the first chart number not used
+# by the given search-parameters. Either bound can be None.
+def range_chart(field, lo, hi, kw = {}):
+    params = {}
+    chart = 1
+    for operator, value in (("greaterthaneq", lo), ("lessthan", hi)):
+        if value is None: continue
+        while "f%i" % chart in kw: chart += 1
+        params["f%i" % chart] = field
+        params["o%i" % chart] = operator
+        params["v%i" % chart] = value
+        chart += 1
+    return params
@@ -0,0 +1,183 @@
+"""
+A watcher that reports changed bugs for one or more search-queries. For every query
+the watcher keeps a high-water mark, the last_change_time of the newest change it has
+seen. A poll only asks for the id and the last_change_time of bugs changed since that
+mark, and only the bugs that actually changed are fetched completely, along with their
+new comments and history-entries. Since bugzilla's timestamps only have a precision of
+seconds and last_change_time-searches include the given second, the bugs (and comments)
+seen in the last second are remembered and not reported twice.
+The first poll of a query without a since-time only sets the high-water mark.
+Changes are delivered as ChangeEvents to the registered callbacks, by the return-value
+of poll, or by iterating the watcher asynchronously:
+
+    async for event in watcher:
+        ...
+
+run() polls in a loop until stop() is called. The polling interval adapts to the
+number of changes: it is halved after a poll that found changes and grows by half when
+nothing changed, staying between min_interval and max_interval.
+"""
+
+import asyncio
+import threading
+from .objects import BugzillaObject
+from .util import chunks, encode_bugzilla_datetime, encode_bugzilla_date
+
+class ChangeEvent(BugzillaObject):
+    ATTRIBUTES = {
+        "query": "",
+        "bug": None,
+        "comments": [],
+        "history": []
+    }
+    
+    def __init__(self, attributes = {}):
+        BugzillaObject.__init__(self, attributes)
+        self.set_default_attributes(ChangeEvent.ATTRIBUTES)
+
+class WatchedQuery:
+    def __init__(self, name, query, since = None):
+        self.name = name
+        self.query = query
+        self.high_water = since
+        # the bug-ids and comment-ids that were reported with a time equal to the mark
+        self.seen_bugs = set()
+        self.seen_comments = set()
+
+class ChangeWatcher:
+    def __init__(self, bugzilla, min_interval = 10, max_interval = 300, fetch_comments = True,
+                fetch_history = True, chunk_size = 200):
+        self.bugzilla = bugzilla
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.fetch_comments = fetch_comments
+        self.fetch_history = fetch_history
+        self.chunk_size = chunk_size
+        self.queries = {}
+        self.callbacks = []
+        self.stopped = threading.Event()
+    
+    def watch(self, name, since = None, **query):
+        """
+        Watch the bugs matching the search-query given as keyword-parameters. The name
+        identifies the query in the ChangeEvents. If since is a datetime, changes after
+        that time will be reported by the first poll.
+        """
+        self.queries[name] = WatchedQuery(name, query, since)
+    
+    def unwatch(self, name):
+        del self.queries[name]
+    
+    def get_high_water_mark(self, name):
+        return self.queries[name].high_water
+    
+    def add_callback(self, callback):
+        """
+        Add a function that is called with every ChangeEvent.
+        """
+        self.callbacks.append(callback)
+    
+    def remove_callback(self, callback):
+        self.callbacks.remove(callback)
+    
+    def get_interval(self):
+        return self.interval
+    
+    def poll(self):
+        """
+        Poll all watched queries once and return the list of ChangeEvents. The events are
+        passed to the callbacks too.
+        """
+        events = []
+        for watched in list(self.queries.values()):
+            events.extend(self._poll_query(watched))
+        
+        if events:
+            self.interval = max(self.min_interval, self.interval / 2)
+        else:
+            self.interval = min(self.max_interval, self.interval * 1.5)
+        
+        for event in events:
+            for callback in self.callbacks:
+                callback(event)
+        return events
+    
+    def _poll_query(self, watched):
+        kw = dict(watched.query)
+        kw["include_fields"] = ["id", "last_change_time"]
+        baseline = watched.high_water is None
+        if not baseline:
+            kw["last_change_time"] = encode_bugzilla_datetime(watched.high_water)
+        
+        since = watched.high_water
+        changed = []
+        for bug in self.bugzilla.search_bugs(**kw):
+            if since is not None and (bug.last_change_time < since or
+                    (bug.last_change_time == since and bug.id in watched.seen_bugs)):
+                continue
+            changed.append(bug)
+        if not changed:
+            return []
+        
+        # move the high-water mark and remember the bugs seen in its second. the ids seen at
+        # the old mark are still needed to filter the comments made at exactly that time
+        seen_bugs = set(watched.seen_bugs)
+        seen_comments = set(watched.seen_comments)
+        high_water = max(bug.last_change_time for bug in changed)
+        if high_water != since:
+            watched.seen_bugs = set()
+            watched.seen_comments = set()
+        watched.seen_bugs.update(bug.id for bug in changed if bug.last_change_time == high_water)
+        watched.high_water = high_water
+        if baseline:
+            return []
+        
+        return self._fetch_events(watched, sorted(bug.id for bug in changed), since, high_water, seen_bugs, seen_comments)
+    
+    def _fetch_events(self, watched, bug_ids, since, high_water, seen_bugs, seen_comments):
+        events = []
+        for chunk in chunks(bug_ids, self.chunk_size):
+            comments = histories = {}
+            if self.fetch_comments:
+                comments = self.bugzilla.get_comments_by_bugs(chunk, new_since = encode_bugzilla_datetime(since))
+            if self.fetch_history:
+                # the history can only be filtered by date, the rest is done here
+                histories = self.bugzilla.get_bug_histories(chunk, new_since = encode_bugzilla_date(since))
+            
+            for bug in self.bugzilla.search_bugs(id = chunk):
+                bug_comments = [comment for comment in comments.get(bug.id, [])
+                                if comment.creation_time is None or comment.creation_time > since or
+                                (comment.creation_time == since and comment.id not in seen_comments)]
+                for comment in bug_comments:
+                    if comment.creation_time == high_water:
+                        watched.seen_comments.add(comment.id)
+                history = [entry for entry in histories.get(bug.id, []) if entry.when > since or
+                        (entry.when == since and bug.id not in seen_bugs)]
+                events.append(ChangeEvent({"query": watched.name, "bug": bug, "comments": bug_comments,
+                                        "history": history}))
+        return events
+    
+    def run(self):
+        """
+        Poll until stop is called. Exceptions raised while polling are not caught.
+        """
+        self.stopped.clear()
+        while not self.stopped.is_set():
+            self.poll()
+            self.stopped.wait(self.interval)
+    
+    def stop(self):
+        self.stopped.set()
+    
+    def __aiter__(self):
+        return self._iterate()
+    
+    async def _iterate(self):
+        self.stopped.clear()
+        loop = asyncio.get_running_loop()
+        while not self.stopped.is_set():
+            # the requests are blocking, so they are run in the default executor
+            for event in await loop.run_in_executor(None, self.poll):
+                yield event
+            await asyncio.sleep(self.interval)
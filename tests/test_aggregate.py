@@ -0,0 +1,96 @@
+from bugzilla import Bugzilla
+from bugzilla.aggregate import Aggregator, pivot
+from bugzilla.metadata import MetadataIndex
+import unittest
+
+BUGS = [
+    {"id": 1, "product": "Firefox", "status": "NEW", "keywords": ["crash"], "resolution": ""},
+    {"id": 2, "product": "Firefox", "status": "NEW", "keywords": ["crash", "perf"], "resolution": ""},
+    {"id": 3, "product": "Firefox", "status": "RESOLVED", "keywords": [], "resolution": "FIXED"},
+    {"id": 4, "product": "Thunderbird", "status": "NEW", "keywords": ["perf"], "resolution": ""},
+    {"id": 5, "product": "Thunderbird", "status": "ASSIGNED", "keywords": ["crash"], "resolution": ""}
+]
+
+VALUES = {"product": ["Firefox", "Thunderbird"], "status": ["NEW", "ASSIGNED", "RESOLVED"], "keywords": ["crash", "perf"]}
+
+class CountingBugzilla(Bugzilla):
+    # answers searches from BUGS, with or without support for count_only
+    def __init__(self, count_only):
+        Bugzilla.__init__(self, "http://localhost/")
+        self.count_only = count_only
+        self.searches = []
+    
+    def _read_request(self, method, path, post_data, **kw):
+        self.searches.append(kw)
+        bugs = [bug for bug in BUGS if all(self.matches(bug, field, kw[field]) for field in kw if field in bug)]
+        if self.count_only and "count_only" in kw:
+            return {"bug_count": len(bugs)}
+        return {"bugs": [{field: bug[field] for field in kw.get("include_fields", bug)} for bug in bugs]}
+    
+    def matches(self, bug, field, value):
+        values = value if isinstance(value, list) else [value]
+        if isinstance(bug[field], list): return any(value in bug[field] for value in values)
+        return bug[field] in values
+
+class TestAggregator(unittest.TestCase):
+    """
+    Counts the same bugs with and without count_only
+    """
+    
+    def count_both(self, dimensions, index = None, **kw):
+        remote = CountingBugzilla(True)
+        remote.set_metadata_index(index)
+        rows = Aggregator(remote, workers = 4).count(dimensions, **kw)
+        # one request to detect count_only and one per cell
+        self.assertGreater(len(remote.searches), 1)
+        local = CountingBugzilla(False)
+        local.set_metadata_index(index)
+        self.assertEqual(Aggregator(local).count(dimensions, **kw), rows)
+        self.assertEqual(len(local.searches), 2)
+        return rows
+    
+    def test_grid(self):
+        rows = self.count_both(["product", "status"], values = VALUES)
+        self.assertEqual(pivot(rows, "product", "status"), {"Firefox": {"NEW": 2, "RESOLVED": 1},
+                                                            "Thunderbird": {"NEW": 1, "ASSIGNED": 1}})
+        rows = self.count_both(["status"], values = VALUES, zeros = True, product = "Thunderbird")
+        self.assertEqual(rows, [{"status": "ASSIGNED", "count": 1}, {"status": "NEW", "count": 1},
+                                {"status": "RESOLVED", "count": 0}])
+    
+    def test_query_on_a_dimension(self):
+        # the query limits the values of the dimension, it isn't replaced by them
+        rows = self.count_both(["product"], values = VALUES, product = "Firefox")
+        self.assertEqual(rows, [{"product": "Firefox", "count": 3}])
+        rows = self.count_both(["product", "status"], values = VALUES, zeros = True, status = ["NEW", "ASSIGNED"])
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(sum(row["count"] for row in rows), 4)
+    
+    def test_multi_valued(self):
+        rows = self.count_both(["keywords"], values = VALUES)
+        self.assertEqual(rows, [{"keywords": "crash", "count": 3}, {"keywords": "perf", "count": 2}])
+        rows = self.count_both(["keywords"], values = VALUES, keywords = "crash")
+        self.assertEqual(rows, [{"keywords": "crash", "count": 3}])
+    
+    def test_empty_values(self):
+        # the index doesn't list the empty resolution of open bugs, both paths leave them out
+        zilla = Bugzilla("http://localhost/")
+        index = MetadataIndex(zilla)
+        index.fields = {"resolution": zilla._get_field({"name": "resolution", "type": 2, "values": [
+            {"name": "", "is_active": True}, {"name": "FIXED", "is_active": True}]})}
+        rows = self.count_both(["resolution"], index = index)
+        self.assertEqual(rows, [{"resolution": "FIXED", "count": 1}])
+        # unless they are asked for
+        rows = self.count_both(["resolution"], values = {"resolution": ["", "FIXED"]})
+        self.assertEqual(rows, [{"resolution": "", "count": 4}, {"resolution": "FIXED", "count": 1}])
+    
+    def test_count_bugs(self):
+        zilla = CountingBugzilla(True)
+        self.assertEqual(zilla.count_bugs(product = "Firefox", include_fields = ["summary"]), 3)
+        self.assertEqual(zilla.searches[-1]["include_fields"], ["id"])
+        self.assertEqual(CountingBugzilla(False).count_bugs(status = "NEW", count_only = 1), 3)
+        self.assertRaises(ValueError, Aggregator(zilla).count, [])
+        # count_only is detected once per client
+        searches = len(zilla.searches)
+        self.assertTrue(zilla.supports_count_only() and zilla.supports_count_only())
+        self.assertFalse(CountingBugzilla(False).supports_count_only())
+        self.assertEqual(len(zilla.searches), searches + 1)
@@ -0,0 +1,72 @@
+from bugzilla import Bugzilla
+from bugzilla.asof import AsOfIndex, BugTimeline
+from datetime import datetime
+import unittest
+
+BUG = {
+    "id": 1, "status": "RESOLVED", "resolution": "FIXED", "priority": "P1", "creation_time": "2020-01-01T00:00:00Z",
+    "keywords": ["crash", "regression"], "blocks": [7], "cc_detail": [{"name": "a@example.com"}],
+    "assigned_to_detail": {"name": "dev@example.com"}, "flags": [{"name": "review", "status": "+"}]
+}
+
+HISTORY = [
+    {"when": "2020-01-02T00:00:00Z", "who": "a", "changes": [
+        {"field_name": "status", "removed": "NEW", "added": "ASSIGNED"},
+        {"field_name": "assigned_to", "removed": "nobody@example.com", "added": "dev@example.com"}]},
+    {"when": "2020-01-03T00:00:00Z", "who": "a", "changes": [
+        {"field_name": "keywords", "removed": "", "added": "crash, regression"},
+        {"field_name": "blocks", "removed": "5", "added": "7"},
+        {"field_name": "flagtypes.name", "removed": "", "added": "review?(b@example.com)"}]},
+    {"when": "2020-01-04T00:00:00Z", "who": "b", "changes": [
+        {"field_name": "flagtypes.name", "removed": "review?(b@example.com)", "added": "review+"},
+        {"field_name": "is_obsolete", "removed": "0", "added": "1", "attachment_id": 3}]},
+    {"when": "2020-01-05T00:00:00Z", "who": "a", "changes": [
+        {"field_name": "status", "removed": "ASSIGNED", "added": "RESOLVED"},
+        {"field_name": "resolution", "removed": "", "added": "FIXED"},
+        {"field_name": "priority", "removed": "P3", "added": "P1"}]}
+]
+
+class TestAsOf(unittest.TestCase):
+    """
+    Rewinding a bug along its history
+    """
+    
+    def make_bug(self):
+        zilla = Bugzilla("http://localhost/")
+        bug = zilla._get_bug(dict(BUG))
+        history = [zilla._get_history(dict(entry, changes = [dict(change) for change in entry["changes"]])) for entry in HISTORY]
+        return bug, history
+    
+    def make_timeline(self, checkpoint_interval):
+        return BugTimeline(*self.make_bug(), checkpoint_interval = checkpoint_interval)
+    
+    def test_states(self):
+        for interval in (1, 2, 16):
+            timeline = self.make_timeline(interval)
+            self.assertIsNone(timeline.get_state(datetime(2019, 12, 31)))
+            
+            initial = timeline.get_state(datetime(2020, 1, 1, 12))
+            self.assertEqual((initial["status"], initial["priority"], initial["resolution"]), ("NEW", "P3", ""))
+            self.assertEqual((initial["keywords"], initial["blocks"], initial["flags"]), ([], [5], []))
+            self.assertEqual(initial["assigned_to"], "nobody@example.com")
+            self.assertEqual(initial["cc"], ["a@example.com"])
+            
+            # changes made at exactly the given time are included
+            state = timeline.get_state(datetime(2020, 1, 3))
+            self.assertEqual(state["status"], "ASSIGNED")
+            self.assertEqual(sorted(state["keywords"]), ["crash", "regression"])
+            self.assertEqual(state["flags"], ["review?(b@example.com)"])
+            
+            self.assertEqual(timeline.get_state(datetime(2020, 1, 4, 12))["flags"], ["review+"])
+            current = timeline.get_state(datetime(2021, 1, 1))
+            self.assertEqual((current["status"], current["blocks"]), ("RESOLVED", [7]))
+    
+    def test_changes(self):
+        self.assertEqual([value for when, value in self.make_timeline(2).get_changes("status")],
+                        ["NEW", "ASSIGNED", "RESOLVED"])
+    
+    def test_index(self):
+        index = AsOfIndex(checkpoint_interval = 4)
+        index.add(*self.make_bug())
+        self.assertEqual(index.select(datetime(2020, 1, 3), lambda state: state["status"] != "RESOLVED"), [1])
+        self.assertEqual(index.select(datetime(2020, 1, 6), lambda state: state["status"] != "RESOLVED"), [])
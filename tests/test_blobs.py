@@ -0,0 +1,89 @@
+from bugzilla import Bugzilla
+from bugzilla.blobs import BlobStore, AttachmentCache
+from datetime import datetime
+import base64
+import os
+import shutil
+import tempfile
+import unittest
+
+class AttachmentBugzilla(Bugzilla):
+    # serves one attachment and counts the downloads of its data
+    def __init__(self):
+        Bugzilla.__init__(self, "http://localhost/")
+        self.last_change_time = "2020-01-01T00:00:00Z"
+        self.downloads = 0
+    
+    def _read_request(self, method, path, post_data, **kw):
+        attachment = {"id": 5, "bug_id": 1, "last_change_time": self.last_change_time}
+        if "last_change_time" not in kw.get("include_fields", ["last_change_time"]):
+            del attachment["last_change_time"]
+        if "data" not in kw.get("exclude_fields", ""):
+            self.downloads += 1
+            attachment["data"] = base64.b64encode(b"log").decode("ascii")
+        return {"attachments": {"5": attachment}}
+
+class TestBlobStore(unittest.TestCase):
+    """
+    The local attachment store and the cache in front of a client
+    """
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = BlobStore(self.directory)
+    
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+    
+    def test_deduplication(self):
+        first = self.store.put(1, b"same data", datetime(2020, 1, 1))
+        second = self.store.put(2, b"same data")
+        self.assertEqual(first, second)
+        self.assertEqual(self.store.get_size(), 9)
+        self.assertEqual(len(self.store), 2)
+        
+        self.assertEqual(self.store.get(1, datetime(2020, 1, 1)), b"same data")
+        self.assertIsNone(self.store.get(1, datetime(2021, 1, 1)))
+        mapped = self.store.open(2)
+        self.assertEqual(mapped[:4], b"same")
+        mapped.close()
+        
+        self.store.remove(1)
+        self.assertEqual(self.store.get(2), b"same data")
+    
+    def test_eviction(self):
+        for i in range(5):
+            self.store.put(i, bytes([i]) * 100)
+        self.store.get(0)
+        self.assertEqual(self.store.evict(250), 3)
+        self.assertEqual(self.store.get(0), bytes(100))
+        self.assertEqual(self.store.get(4), bytes([4]) * 100)
+        self.assertIsNone(self.store.get(1))
+    
+    def test_integrity(self):
+        digest = self.store.put(1, b"data")
+        with open(self.store._path(digest), "wb") as file:
+            file.write(b"garbage")
+        self.assertEqual(self.store.check(), [digest])
+        self.assertIsNone(self.store.get(1))
+    
+    def test_cache(self):
+        zilla = AttachmentBugzilla()
+        cache = AttachmentCache(zilla, self.store)
+        self.assertEqual(cache.get_attachment(5).data, b"log")
+        self.assertEqual(cache.get_attachment(5).data, b"log")
+        self.assertEqual(zilla.downloads, 1)
+        
+        zilla.last_change_time = "2021-01-01T00:00:00Z"
+        self.assertEqual(cache.get_attachment(5).data, b"log")
+        self.assertEqual(zilla.downloads, 2)
+        
+        # the version is checked even if the caller didn't ask for it
+        zilla.last_change_time = "2022-01-01T00:00:00Z"
+        self.assertEqual(cache.get_attachment(5, include_fields = ["id"]).data, b"log")
+        self.assertEqual(zilla.downloads, 3)
+        # attachments without a version are never served from the store
+        attachment = zilla.get_attachment(5, include_fields = ["id"], exclude_fields = ["data"])
+        self.assertEqual(cache._load_data(attachment).data, b"log")
+        self.assertEqual(zilla.downloads, 4)
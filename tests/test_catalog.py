@@ -0,0 +1,100 @@
+from bugzilla import Bugzilla
+from bugzilla.catalog import Catalog
+from datetime import datetime
+import os
+import tempfile
+import time
+import unittest
+
+class CatalogBugzilla(Bugzilla):
+    # serves two products and counts the product-requests
+    def __init__(self):
+        Bugzilla.__init__(self, "http://localhost/")
+        self.audit_times = {}
+        self.versions = [{"name": "1.0", "is_active": True}]
+        self.requests = []
+    
+    def _read_request(self, method, path, post_data, **kw):
+        if path == "last_audit_time":
+            return {"last_audit_time": self.audit_times.get(kw["class"], "2019-01-01T00:00:00Z")}
+        if path == "product_accessible":
+            return {"ids": [1, 2]}
+        if path == "field/bug":
+            return {"fields": [{"name": "priority", "type": 2, "values": [{"name": "P1", "is_active": True}]}]}
+        self.requests.append(kw.get("include_fields"))
+        products = [{"id": product_id, "name": "Product %i" % product_id, "versions": list(self.versions),
+            "milestones": [], "components": [{"id": product_id * 10, "name": "General", "flag_types": {
+                "bug": [{"id": 7, "name": "review"}], "attachment": []}}]} for product_id in kw["ids"]]
+        if kw.get("include_fields"):
+            products = [{key: product[key] for key in kw["include_fields"]} for product in products]
+        return {"products": products}
+
+class TestCatalog(unittest.TestCase):
+    """
+    The product catalog against a fake product-api
+    """
+    
+    def setUp(self):
+        self.zilla = CatalogBugzilla()
+        self.catalog = Catalog(self.zilla, max_age = None)
+        self.catalog.build()
+    
+    def test_lookups(self):
+        self.assertEqual(self.catalog.get_product(2).name, "Product 2")
+        self.assertEqual(self.catalog.get_component("Product 1", "General").id, 10)
+        product, component = self.catalog.get_component_by_id(20)
+        self.assertEqual(product.name, "Product 2")
+        self.assertEqual(self.catalog.get_flag_type(7).name, "review")
+        self.assertEqual([flag_type.id for flag_type in self.catalog.get_flag_types("Product 1")["bug"]], [7])
+        self.assertIsNone(self.catalog.get_product("Nope"))
+    
+    def test_refresh_changed_classes(self):
+        self.assertFalse(self.catalog.refresh())
+        self.zilla.requests = []
+        self.zilla.audit_times["Bugzilla::Version"] = "2020-01-01T00:00:00Z"
+        self.zilla.versions.append({"name": "2.0", "is_active": True})
+        
+        self.assertTrue(self.catalog.refresh())
+        self.assertEqual(self.zilla.requests, [["id", "versions"]])
+        self.assertEqual([version.name for version in self.catalog.get_versions("Product 1")], ["1.0", "2.0"])
+        # the other fields are kept
+        self.assertEqual(self.catalog.get_component("Product 2", "General").id, 20)
+    
+    def test_metadata_index(self):
+        # the catalog validates payloads with the same products
+        self.zilla.set_metadata_index(self.catalog)
+        self.assertEqual(self.catalog.get_legal_values("version", "Product 1"), {"1.0"})
+        self.assertEqual(len(self.catalog.validate_add_json({"product": "Product 3", "priority": "P9"})), 2)
+    
+    def test_stale_while_revalidate(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "catalog.json")
+            self.catalog.save(path)
+            self.zilla.audit_times["Bugzilla::Product"] = "2020-01-01T00:00:00Z"
+            self.zilla.versions = []
+            
+            catalog = Catalog(self.zilla, max_age = 60)
+            catalog.load(path)
+            # the loaded catalog is served while it is revalidated
+            self.assertEqual(len(catalog.get_versions("Product 1")), 1)
+            catalog.wait()
+            self.assertIsNone(catalog.error)
+            self.assertEqual(catalog.get_versions("Product 1"), [])
+    
+    def test_revalidation_is_saved(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "catalog.json")
+            catalog = Catalog(self.zilla, max_age = 0)
+            catalog.start(path)
+            self.zilla.audit_times["Bugzilla::Milestone"] = "2020-01-01T00:00:00Z"
+            self.zilla.versions = []
+            self.zilla.audit_times["Bugzilla::Version"] = "2020-01-01T00:00:00Z"
+            time.sleep(0.01)
+            # the lookup starts the refresh, which saves the catalog to the file it started from
+            catalog.get_product(1)
+            catalog.wait()
+            self.assertIsNone(catalog.error)
+            saved = Catalog(self.zilla, max_age = None)
+            saved.load(path)
+            self.assertEqual(saved.get_versions("Product 1"), [])
+            self.assertEqual(saved.audit_times["Bugzilla::Version"], datetime(2020, 1, 1))
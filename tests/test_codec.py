@@ -0,0 +1,73 @@
+from bugzilla import Bug, Comment, Product, Component, User
+from bugzilla import codec
+from bugzilla.identity import FrozenUser
+from bugzilla.util import encode_varint
+from datetime import datetime, date
+import pickle
+import unittest
+
+class TestCodec(unittest.TestCase):
+    """
+    Round trips of bugzilla-objects through the binary codec
+    """
+    
+    def test_bug(self):
+        bug = Bug({
+            "id": 123456,
+            "status": "NEW",
+            "summary": "Crash ☃",
+            "creation_time": datetime(2017, 3, 4, 5, 6, 7),
+            "deadline": date(2020, 1, 1),
+            "assigned_to_detail": FrozenUser(User({"id": 5, "name": "dev@example.com"})),
+            "cc_detail": [{"id": 5, "name": "dev@example.com"}],
+            "blocks": [1, 2, 3],
+            "dupe_of": None,
+            "cf_score": -42,
+            "cf_weight": 0.5,
+            "cf_blob": b"\x00\xff"
+        })
+        decoded = codec.decode(codec.encode(bug))
+        self.assertIsInstance(decoded, Bug)
+        self.assertEqual(decoded, bug)
+        self.assertEqual(decoded.assigned_to, "dev@example.com")
+        self.assertIs(type(decoded.assigned_to_detail), User)
+        # like the bugs returned by the client, decoded bugs are clean
+        self.assertEqual(decoded.get_changed_fields(), set())
+        decoded.summary = "Hang"
+        self.assertEqual(decoded.changed_update_json(), {"summary": "Hang"})
+    
+    def test_defaults_are_skipped(self):
+        self.assertLess(len(codec.encode(Bug({"id": 1}))), 20)
+        decoded = codec.decode(codec.encode([Bug(), Bug()]))
+        decoded[0].keywords.append("crash")
+        self.assertEqual(decoded[1].keywords, [])
+    
+    def test_nested_objects(self):
+        product = Product({"name": "Desktop", "components": [Component({"name": "UI", "sort_key": 3})]})
+        comments = [Comment({"id": i, "text": "same text"}) for i in range(10)]
+        self.assertEqual(codec.decode(codec.encode(product)), product)
+        self.assertEqual(codec.decode(codec.encode(comments)), comments)
+    
+    def test_invalid_data(self):
+        with self.assertRaises(ValueError):
+            codec.decode(b"something else")
+        with self.assertRaises(TypeError):
+            codec.encode(Bug({"cf_set": {1, 2}}))
+    
+    def test_schema_version(self):
+        # a new attribute changes the version, data of the old one isn't decoded
+        data = codec.encode(Bug({"id": 1}))
+        Bug.ATTRIBUTES["new_field"] = ""
+        try:
+            self.assertNotEqual(codec._schema_version(), codec.SCHEMA_VERSION)
+        finally:
+            del Bug.ATTRIBUTES["new_field"]
+        self.assertEqual(codec._schema_version(), codec.SCHEMA_VERSION)
+        version = bytearray()
+        encode_varint(codec.SCHEMA_VERSION, version)
+        self.assertRaises(ValueError, codec.decode, codec.MAGIC + b"\x01" + data[4 + len(version):])
+    
+    def test_pickle(self):
+        # bugzilla sends virtual attributes along, these must not break pickle
+        bug = Bug({"id": 1, "assigned_to": "dev@example.com"})
+        self.assertEqual(pickle.loads(pickle.dumps(bug)), bug)
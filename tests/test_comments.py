@@ -0,0 +1,81 @@
+from bugzilla import Bugzilla
+from bugzilla.comments import CommentIterator
+from bugzilla.util import encode_bugzilla_datetime
+from datetime import datetime, timedelta
+import json
+import unittest
+
+START = datetime(2020, 1, 1)
+
+class ThreadBugzilla(Bugzilla):
+    # bug 1 has the comments 100 to 109 with one comment per day, the skeleton-requests
+    # and the fetched windows are recorded
+    def __init__(self, size = 10):
+        Bugzilla.__init__(self, "http://localhost/")
+        self.comments = {100 + i: {"id": 100 + i, "bug_id": 1, "count": i, "text": "comment %i" % i,
+                                "creation_time": encode_bugzilla_datetime(START + timedelta(days = i))}
+                        for i in range(size)}
+        self.skeletons = []
+        self.windows = []
+    
+    def get_comments_by_bug(self, bug_id, **kw):
+        self.skeletons.append(kw)
+        since = kw.get("new_since", "")
+        # the skeleton is returned in a different order than the counts
+        return [self._get_comment({field: data[field] for field in kw["include_fields"]})
+                for c_id, data in sorted(self.comments.items(), reverse = True) if data["creation_time"] >= since]
+    
+    def get_comment(self, c_id, **kw):
+        ids = [c_id] + kw["comment_ids"]
+        self.windows.append(ids)
+        return [self._get_comment(dict(self.comments[c_id])) for c_id in reversed(ids)]
+
+class TestCommentIterator(unittest.TestCase):
+    """
+    Pages through a fake comment thread
+    """
+    
+    def setUp(self):
+        self.zilla = ThreadBugzilla()
+    
+    def test_windows(self):
+        comments = CommentIterator(self.zilla, 1, window = 4)
+        self.assertIsNone(comments.get_cursor())
+        self.assertEqual([comment.count for comment in comments], list(range(10)))
+        self.assertEqual(self.zilla.windows, [[100, 101, 102, 103], [104, 105, 106, 107], [108, 109]])
+        self.assertEqual(self.zilla.skeletons, [{"include_fields": ["id", "count", "creation_time"]}])
+        self.assertEqual(comments.get_cursor(), {"bug_id": 1, "count": 9, "time": "2020-01-10T00:00:00Z"})
+    
+    def test_windows_are_fetched_lazily(self):
+        comments = iter(CommentIterator(self.zilla, 1, window = 3))
+        self.assertEqual([next(comments).count for i in range(3)], [0, 1, 2])
+        self.assertEqual(len(self.zilla.windows), 1)
+        next(comments)
+        self.assertEqual(len(self.zilla.windows), 2)
+    
+    def test_start(self):
+        comments = CommentIterator(self.zilla, 1, window = 5, start_count = 7)
+        self.assertEqual([comment.count for comment in comments], [7, 8, 9])
+        comments = CommentIterator(self.zilla, 1, window = 5, since = START + timedelta(days = 8))
+        self.assertEqual([comment.count for comment in comments], [8, 9])
+        self.assertEqual(self.zilla.skeletons[-1]["new_since"], "2020-01-09T00:00:00Z")
+    
+    def test_cursor(self):
+        comments = CommentIterator(self.zilla, 1, window = 3)
+        for comment in comments:
+            if comment.count == 4: break
+        cursor = json.loads(json.dumps(comments.get_cursor()))
+        # a comment made in the same second as the cursor is not skipped
+        self.zilla.comments[110] = dict(self.zilla.comments[104], id = 110, count = 10)
+        resumed = CommentIterator(self.zilla, 1, window = 3, cursor = cursor)
+        self.assertEqual([comment.count for comment in resumed], [5, 6, 7, 8, 9, 10])
+        self.assertRaises(ValueError, CommentIterator, self.zilla, 2, cursor = cursor)
+        self.assertRaises(ValueError, CommentIterator, self.zilla, 1, window = 0)
+    
+    def test_newest(self):
+        comments = CommentIterator(self.zilla, 1, window = 2)
+        self.assertEqual([comment.count for comment in comments.newest(3)], [7, 8, 9])
+        self.assertEqual(self.zilla.windows, [[107, 108], [109]])
+        self.assertEqual(comments.get_cursor()["count"], 9)
+        self.assertEqual(comments.newest(0), [])
+        self.assertEqual(len(CommentIterator(self.zilla, 1, start_count = 8).newest(5)), 2)
@@ -0,0 +1,90 @@
+from bugzilla import Bugzilla, Bug, User
+import copy
+import pickle
+import unittest
+
+class RecordingBugzilla(Bugzilla):
+    # answers every PUT with an empty result and remembers the payloads
+    def __init__(self):
+        Bugzilla.__init__(self, "http://localhost/")
+        self.payloads = []
+    
+    def _read_request(self, method, path, post_data, **kw):
+        self.payloads.append(post_data)
+        return {"bugs": [], "users": [], "attachments": []}
+
+class TestDirtyTracking(unittest.TestCase):
+    """
+    Change tracking of bugzilla-objects and the minimal update-payloads built from it
+    """
+    
+    def setUp(self):
+        self.zilla = RecordingBugzilla()
+        self.bug = self.zilla._get_bug({
+            "id": 7,
+            "status": "NEW",
+            "summary": "Crash",
+            "keywords": ["crash"],
+            "assigned_to_detail": {"id": 1, "name": "dev@example.com"},
+            "cf_build": "1"
+        })
+    
+    def test_changed_fields(self):
+        self.assertEqual(self.bug.get_changed_fields(), set())
+        self.bug.summary = "Crash on start"
+        self.bug.keywords.append("regression")
+        self.assertEqual(self.bug.get_changed_fields(), {"summary", "keywords"})
+        self.assertEqual(self.bug.get_original_value("summary"), "Crash")
+        self.assertIsNone(Bug().get_changed_fields())
+    
+    def test_minimal_update(self):
+        self.bug.status = "ASSIGNED"
+        self.bug.assigned_to_detail = User({"name": "other@example.com"})
+        self.zilla.update_bug(self.bug)
+        self.assertEqual(self.zilla.payloads[-1], {"ids": [7], "status": "ASSIGNED", "assigned_to": "other@example.com"})
+        
+        # the bug is clean after the update
+        self.zilla.update_bug(self.bug, add = {"keywords": ["perf"]})
+        self.assertEqual(self.zilla.payloads[-1], {"ids": [7], "keywords": {"add": ["perf"]}})
+    
+    def test_full_update(self):
+        self.zilla.update_bug(self.bug, full = True)
+        self.assertEqual(self.zilla.payloads[-1]["summary"], "Crash")
+        self.assertEqual(self.zilla.payloads[-1]["cf_build"], "1")
+        
+        # objects that were not loaded by the client send all fields
+        self.zilla.update_bug(Bug({"id": 8, "summary": "New"}))
+        self.assertIn("whiteboard", self.zilla.payloads[-1])
+    
+    def test_other_ids(self):
+        # the fields of the bug are applied to the other bugs in full
+        self.bug.summary = "Crash on start"
+        self.zilla.update_bug(self.bug, ids = [7, 8])
+        self.assertEqual(self.zilla.payloads[-1]["cf_build"], "1")
+        self.assertEqual(self.zilla.payloads[-1]["ids"], [7, 8])
+        
+        self.bug.summary = "Crash on exit"
+        self.zilla.update_bug(self.bug, ids = [7, 8], full = False)
+        self.assertEqual(self.zilla.payloads[-1], {"ids": [7, 8], "summary": "Crash on exit"})
+        self.zilla.update_bug(self.bug, ids = 7)
+        self.assertEqual(self.zilla.payloads[-1], {"ids": [7]})
+    
+    def test_nested_changes(self):
+        attachment = self.zilla._get_attachment({"id": 3, "bug_id": 7, "file_name": "log.txt",
+            "flags": [{"id": 1, "name": "review", "type_id": 4, "status": "?"}]})
+        attachment.flags[0].status = "+"
+        self.assertEqual(attachment.get_changed_fields(), {"flags"})
+        self.zilla.update_attachment(attachment)
+        self.assertEqual(self.zilla.payloads[-1]["flags"], [{"name": "review", "status": "+", "type_id": 4}])
+        self.assertEqual(attachment.get_changed_fields(), set())
+    
+    def test_renamed_fields(self):
+        user = self.zilla._get_user({"id": 3, "email": "a@example.com", "real_name": "A"})
+        user.real_name = "B"
+        self.zilla.update_user(user)
+        self.assertEqual(self.zilla.payloads[-1], {"ids": [3], "full_name": "B"})
+    
+    def test_copies_keep_tracking(self):
+        self.bug.summary = "Other"
+        self.assertEqual(copy.deepcopy(self.bug).get_changed_fields(), {"summary"})
+        self.assertEqual(pickle.loads(pickle.dumps(self.bug)).get_changed_fields(), {"summary"})
@@ -0,0 +1,149 @@
+from bugzilla import Bugzilla
+from bugzilla.export import Exporter
+from bugzilla.parallel import bounded_map
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+def make_bug(bug_id):
+    return {"id": bug_id, "product": "Desktop", "component": "UI", "version": "1.0", "summary": "Bug %i" % bug_id,
+            "status": "NEW", "creation_time": "2020-01-01T00:00:00Z", "keywords": ["crash"],
+            "blocks": [bug_id + 1] if bug_id < 5 else [], "depends_on": [bug_id - 1] if bug_id > 1 else [],
+            "flags": [{"id": bug_id, "name": "review", "type_id": 4, "status": "?", "setter": "a@example.com",
+                    "requestee": "b@example.com", "creation_date": "2020-01-02T00:00:00Z"}]}
+
+class ExportBugzilla(Bugzilla):
+    # a bugzilla with the bugs 1 to 5, every bug has a flag, two comments, the first
+    # bug blocks the second and so on. bug 2 has an attachment with a comment
+    def __init__(self, bug_ids = range(1, 6)):
+        Bugzilla.__init__(self, "http://localhost/")
+        self.bugs = {bug_id: make_bug(bug_id) for bug_id in bug_ids}
+        self.downloads = []
+    
+    def search_bugs(self, **kw):
+        if "id" in kw:
+            ids = kw["id"]
+        elif "f1" in kw:
+            ids = [bug_id for bug_id in self.bugs if kw["v1"] <= bug_id < kw["v2"]]
+        else:
+            ids = sorted(self.bugs, reverse = True)[:kw.get("limit")]
+        if kw.get("include_fields") == ["id"]:
+            return [self._get_bug({"id": bug_id}) for bug_id in ids]
+        return [self._get_bug(json.loads(json.dumps(self.bugs[bug_id]))) for bug_id in ids if bug_id in self.bugs]
+    
+    def get_comments_by_bugs(self, bug_ids, **kw):
+        comments = {}
+        for bug_id in bug_ids:
+            comments[bug_id] = [self._get_comment({"id": bug_id * 10, "bug_id": bug_id, "count": 0,
+                                                "text": "Description of %i" % bug_id}),
+                                self._get_comment({"id": bug_id * 10 + 1, "bug_id": bug_id, "count": 1,
+                                                "text": "Attached a log" if bug_id == 2 else "Confirmed",
+                                                "attachment_id": 100 if bug_id == 2 else None})]
+        return comments
+    
+    def get_bug_histories(self, bug_ids, **kw):
+        return {bug_id: [self._get_history({"when": "2020-01-03T00:00:00Z", "who": "a@example.com", "changes": [
+            {"field_name": "status", "removed": "UNCONFIRMED", "added": "NEW"}]})] for bug_id in bug_ids}
+    
+    def get_attachments_by_bugs(self, bug_ids, **kw):
+        return {2: [self._get_attachment(self.attachment(kw))]} if 2 in bug_ids else {}
+    
+    def get_attachment(self, attachment_id, **kw):
+        self.downloads.append(attachment_id)
+        return self._get_attachment(self.attachment(kw))
+    
+    def attachment(self, kw):
+        data = {"id": 100, "bug_id": 2, "file_name": "log.txt", "summary": "A log", "content_type": "text/plain",
+                "flags": [{"id": 7, "name": "approval", "type_id": 9, "status": "+", "setter": "a@example.com"}]}
+        if "data" not in kw.get("exclude_fields", []): data["data"] = "bG9nIGRhdGE="
+        return data
+
+def read_shards(directory):
+    records = []
+    with open(os.path.join(directory, "manifest.json")) as file:
+        manifest = json.load(file)
+    for key in sorted(manifest["ranges"]):
+        with gzip.open(os.path.join(directory, manifest["ranges"][key]["file"]), "rt", encoding = "utf-8") as file:
+            records.extend(json.loads(line) for line in file)
+    return records
+
+class TestBoundedMap(unittest.TestCase):
+    """
+    The thread-pool helper used by the bulk-tools
+    """
+    
+    def test_results(self):
+        results = dict(bounded_map(lambda i: i * i, range(20), 4))
+        self.assertEqual(results, {i: i * i for i in range(20)})
+    
+    def test_pending_limit(self):
+        # items are only taken from the generator when there is room for them
+        taken = []
+        def items():
+            for i in range(10):
+                taken.append(i)
+                yield i
+        for item, result in bounded_map(lambda i: i, items(), 2, 3):
+            self.assertLessEqual(len(taken), item + 4)
+        self.assertEqual(len(taken), 10)
+    
+    def test_error(self):
+        started = []
+        lock = threading.Lock()
+        def work(i):
+            with lock: started.append(i)
+            if i == 2: raise KeyError(i)
+            time.sleep(0.01)
+            return i
+        with self.assertRaises(KeyError):
+            for item, result in bounded_map(work, range(100), 2, 4):
+                pass
+        # the remaining items are neither submitted nor run
+        self.assertLess(len(started), 20)
+
+class TestExporter(unittest.TestCase):
+    """
+    Exports a fake bugzilla into a temporary directory
+    """
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.zilla = ExportBugzilla()
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def test_export(self):
+        progress = []
+        exporter = Exporter(self.zilla, self.directory, workers = 2, range_size = 2, chunk_size = 1,
+                            progress = lambda *args: progress.append(args))
+        self.assertEqual(exporter.run(), 5)
+        self.assertEqual([args[:2] for args in progress], [(1, 3), (2, 3), (3, 3)])
+        self.assertEqual(progress[-1][2], 5)
+        
+        records = read_shards(self.directory)
+        self.assertEqual([record["bug"]["id"] for record in records], [1, 2, 3, 4, 5])
+        record = records[1]
+        self.assertEqual(record["bug"]["blocks"], [3])
+        self.assertEqual(record["bug"]["flags"][0]["requestee"], "b@example.com")
+        self.assertEqual(record["bug"]["creation_time"], "2020-01-01T00:00:00Z")
+        self.assertEqual([comment["id"] for comment in record["comments"]], [20, 21])
+        self.assertEqual(record["history"][0]["changes"][0]["added"], "NEW")
+        attachment = record["attachments"][0]
+        self.assertNotIn("data", attachment)
+        with open(os.path.join(self.directory, attachment["file"]), "rb") as file:
+            self.assertEqual(file.read(), b"log data")
+    
+    def test_resume(self):
+        exporter = Exporter(self.zilla, self.directory, range_size = 2)
+        self.assertEqual(exporter.run(max_id = 4), 4)
+        # the finished ranges and the downloaded attachments are skipped
+        self.assertEqual(exporter.run(), 1)
+        self.assertEqual(self.zilla.downloads, [100])
+        with self.assertRaises(ValueError):
+            Exporter(self.zilla, self.directory, range_size = 3).run()
@@ -0,0 +1,82 @@
+from bugzilla import Bugzilla, BugzillaException
+from bugzilla.federation import Federation
+import threading
+import time
+import unittest
+
+class FederatedBugzilla(Bugzilla):
+    # answers searches with bugs of the given ids. A blocked installation waits until
+    # release is set, a broken one fails.
+    def __init__(self, bug_ids, blocked = False, broken = False):
+        Bugzilla.__init__(self, "http://localhost/")
+        self.bug_ids = bug_ids
+        self.release = threading.Event()
+        if not blocked: self.release.set()
+        self.broken = broken
+        self.calls = 0
+    
+    def search_bugs(self, **kw):
+        self.calls += 1
+        self.release.wait(10)
+        if self.broken: raise BugzillaException(-1, "broken")
+        # the results come unordered
+        return [self._get_bug({"id": bug_id, "summary": "Bug %i" % bug_id}) for bug_id in reversed(self.bug_ids)]
+
+class TestFederation(unittest.TestCase):
+    """
+    Queries fake installations that answer late, never or with an error
+    """
+    
+    def setUp(self):
+        self.clients = {"a": FederatedBugzilla([1, 4, 7]), "b": FederatedBugzilla([2, 3, 9]),
+                        "c": FederatedBugzilla([5], blocked = True), "d": FederatedBugzilla([], broken = True)}
+        self.federation = Federation(self.clients, timeout = 5)
+    
+    def tearDown(self):
+        self.clients["c"].release.set()
+        self.federation.close()
+    
+    def test_merge_ordering(self):
+        self.clients["c"].release.set()
+        results = self.federation.search_bugs(sort_key = lambda bug: bug.id)
+        self.assertEqual([(name, bug.id) for name, bug in results],
+                        [("a", 1), ("b", 2), ("b", 3), ("a", 4), ("c", 5), ("a", 7), ("b", 9)])
+        self.assertEqual(list(results.errors), ["d"])
+        results = self.federation.search_bugs(sort_key = lambda bug: bug.id, reverse = True)
+        self.assertEqual([bug.id for name, bug in results], [9, 7, 5, 4, 3, 2, 1])
+    
+    def test_streaming(self):
+        # the answers of a and b are yielded while c is still blocked
+        results = iter(self.federation.search_bugs())
+        first = [next(results) for i in range(6)]
+        self.assertEqual(sorted(bug.id for name, bug in first), [1, 2, 3, 4, 7, 9])
+        self.clients["c"].release.set()
+        self.assertEqual([(name, bug.id) for name, bug in results], [("c", 5)])
+    
+    def test_timeout(self):
+        self.federation.set_timeout("c", 0.05)
+        results = self.federation.search_bugs(sort_key = lambda bug: bug.id)
+        self.assertEqual([bug.id for name, bug in results], [1, 2, 3, 4, 7, 9])
+        self.assertIsInstance(results.errors["c"], TimeoutError)
+        self.assertIsInstance(results.errors["d"], BugzillaException)
+        
+        # c is left out while its request is still running, instead of taking another thread
+        self.assertTrue(self.federation.is_busy("c"))
+        results = self.federation.search_bugs()
+        self.assertEqual(len(list(results)), 6)
+        self.assertIn("still busy", str(results.errors["c"]))
+        self.assertEqual(self.clients["c"].calls, 1)
+        
+        self.clients["c"].release.set()
+        for i in range(100):
+            if not self.federation.is_busy("c"): break
+            time.sleep(0.01)
+        results = self.federation.search_bugs()
+        self.assertEqual(len(list(results)), 7)
+        self.assertEqual(self.clients["c"].calls, 2)
+    
+    def test_pool_size(self):
+        # one thread for a new request and one for a request that timed out per installation
+        federation = Federation(self.clients, workers = 1)
+        self.assertEqual(federation.executor._max_workers, 8)
+        federation.close()
@@ -0,0 +1,95 @@
+from bugzilla import Bug, Comment
+from bugzilla.fulltext import FullTextIndex
+import tempfile
+import unittest
+
+COMMENTS = [
+    (1, 10, "The application crashes on startup"),
+    (2, 10, "Crash reproduced, the startup crashes every time"),
+    (3, 11, "Startup is slow but nothing crashes"),
+    (4, 12, "Unrelated comment about the documentation")
+]
+
+class TestFullTextIndex(unittest.TestCase):
+    """
+    Builds a small index in memory and on disk and runs queries against it
+    """
+    
+    def fill(self, index):
+        for c_id, bug_id, text in COMMENTS:
+            index.add_comment(Comment({"id": c_id, "bug_id": bug_id, "text": text}))
+        index.add_bug(Bug({"id": 12, "summary": "Write documentation", "whiteboard": "[docs]"}))
+    
+    def check(self, index):
+        self.assertEqual({hit.id for hit in index.search("crashes startup")}, {1, 2, 3})
+        self.assertEqual([hit.id for hit in index.search('"startup crashes"')], [2])
+        self.assertEqual({hit.id for hit in index.search("crash*")}, {1, 2, 3})
+        hits = index.search("documentation")
+        self.assertEqual({(hit.kind, hit.id) for hit in hits}, {("comment", 4), ("bug", 12)})
+        self.assertEqual([hit.id for hit in index.search("documentation", kind = "bug")], [12])
+        self.assertEqual(index.search("nonexistingword"), [])
+    
+    def test_memory(self):
+        index = FullTextIndex()
+        self.fill(index)
+        self.check(index)
+    
+    def test_ranking(self):
+        index = FullTextIndex()
+        self.fill(index)
+        # comment 2 contains the word twice
+        self.assertEqual(index.search("crash*")[0].id, 2)
+    
+    def test_segments(self):
+        with tempfile.TemporaryDirectory() as directory:
+            index = FullTextIndex(directory)
+            self.fill(index)
+            index.flush()
+            # replace the summary in a second segment
+            index.add_bug(Bug({"id": 12, "summary": "Write manual"}))
+            index.flush()
+            index.close()
+            
+            index = FullTextIndex(directory)
+            self.assertEqual([hit.kind for hit in index.search("documentation")], ["comment"])
+            self.assertEqual([hit.id for hit in index.search("manual")], [12])
+            index.merge()
+            self.assertEqual(len(index.segments), 1)
+            self.assertEqual([hit.id for hit in index.search('"write manual"')], [12])
+            self.assertEqual([hit.id for hit in index.search('"startup crashes"')], [2])
+            index.close()
+    
+    def test_replaced_documents(self):
+        # replaced documents don't count for the document frequencies and lengths
+        with tempfile.TemporaryDirectory() as directory:
+            index = FullTextIndex(directory)
+            self.fill(index)
+            index.flush()
+            for i in range(5):
+                index.add_comment(Comment({"id": 4, "bug_id": 12, "text": "The startup crashes again and again %i" % i}))
+            index.flush()
+            fresh = FullTextIndex()
+            self.fill(fresh)
+            fresh.add_comment(Comment({"id": 4, "bug_id": 12, "text": "The startup crashes again and again 4"}))
+            self.assertEqual(len(index), len(fresh))
+            self.assertEqual([(hit.id, round(hit.score, 6)) for hit in index.search("startup crash*")],
+                            [(hit.id, round(hit.score, 6)) for hit in fresh.search("startup crash*")])
+            index.close()
+            
+            index = FullTextIndex(directory)
+            self.assertEqual([(hit.id, round(hit.score, 6)) for hit in index.search("startup crash*")],
+                            [(hit.id, round(hit.score, 6)) for hit in fresh.search("startup crash*")])
+            index.close()
+    
+    def test_segment_terms(self):
+        with tempfile.TemporaryDirectory() as directory:
+            index = FullTextIndex(directory)
+            index.add_comment(Comment({"id": 1, "bug_id": 1, "text": "zebra apple \u00e4pfel applet \u00e9clair"}))
+            index.flush()
+            segment = index.segments[0]
+            self.assertEqual(segment.get_terms("app"), ["apple", "applet"])
+            self.assertEqual(segment.get_terms(), ["apple", "applet", "zebra", "\u00e4pfel", "\u00e9clair"])
+            self.assertEqual(segment.get_postings("\u00e4pfel"), {0: [2]})
+            self.assertEqual(segment.get_postings("nope"), {})
+            self.assertEqual(segment.get_doc(0), ("comment", 1, 1, 5))
+            index.close()
@@ -0,0 +1,68 @@
+from bugzilla import Bugzilla
+from bugzilla.graph import BugGraph
+import unittest
+
+# bug-id -> (is_open, depends_on)
+BUGS = {
+    1: (True, [2, 3]),
+    2: (True, [4]),
+    3: (True, [5]),
+    4: (True, [6]),
+    5: (False, []),
+    6: (True, []),
+    # a cycle 7 -> 8 -> 9 -> 7 and a bug depending on itself
+    7: (True, [8]),
+    8: (True, [9]),
+    9: (True, [7, 10]),
+    10: (True, [10])
+}
+
+class GraphBugzilla(Bugzilla):
+    # answers search_bugs from BUGS and counts the requests
+    def __init__(self):
+        Bugzilla.__init__(self, "http://bugzilla.example.com/")
+        self.searches = []
+    
+    def search_bugs(self, **kw):
+        self.searches.append(list(kw["id"]))
+        return [self._get_bug({"id": bug_id, "is_open": BUGS[bug_id][0], "depends_on": BUGS[bug_id][1],
+                            "see_also": ["http://bugzilla.example.com/show_bug.cgi?id=1",
+                                        "http://other.example.com/show_bug.cgi?id=2"]})
+                for bug_id in kw["id"] if bug_id in BUGS]
+
+class TestBugGraph(unittest.TestCase):
+    """
+    Walks a hand-made dependency graph without a bugzilla-connection
+    """
+    
+    def setUp(self):
+        self.zilla = GraphBugzilla()
+        self.graph = BugGraph(self.zilla, chunk_size = 2)
+    
+    def test_walk(self):
+        self.assertEqual(self.graph.walk(1), {1: 0, 2: 1, 3: 1, 4: 2, 5: 2, 6: 3})
+        # one search per level and chunk, fetched bugs are cached
+        self.assertEqual(self.zilla.searches, [[1], [2, 3], [4, 5], [6]])
+        self.assertEqual(self.graph.closure(1), {2, 3, 4, 5, 6})
+        self.assertEqual(len(self.zilla.searches), 4)
+        self.assertEqual(self.graph.walk(1, max_depth = 1), {1: 0, 2: 1, 3: 1})
+        # see_also only links bugs of the same installation
+        self.assertEqual(self.graph.get_edges(2, ("see_also", )), [1])
+    
+    def test_missing_bugs(self):
+        self.assertEqual(self.graph.walk(99), {99: 0})
+        self.assertIn(99, self.graph)
+        self.assertIsNone(self.graph.get_node(99))
+        self.graph.walk(99)
+        self.assertEqual(len(self.zilla.searches), 1)
+    
+    def test_cycles(self):
+        self.assertEqual(self.graph.find_cycles(1), [])
+        self.assertEqual(sorted(self.graph.find_cycles(7)), [[7, 8, 9], [10]])
+    
+    def test_critical_path(self):
+        # 5 is closed, so the longest open chain goes through 2 and 4
+        self.assertEqual(self.graph.critical_path(1), [1, 2, 4, 6])
+        self.assertEqual(self.graph.open_blockers(1), [2, 3, 4, 6])
+        self.assertEqual(self.graph.critical_path(6), [6])
+        self.assertRaises(ValueError, self.graph.critical_path, 7)
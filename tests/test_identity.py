@@ -0,0 +1,75 @@
+from bugzilla import Bugzilla
+from bugzilla.identity import IdentityMap, FrozenUser
+import pickle
+import threading
+import unittest
+
+def user_detail(name):
+    return {"id": 1, "name": name, "real_name": "Some One", "email": name}
+
+class TestIdentityMap(unittest.TestCase):
+    """
+    Decodes bugs without a bugzilla-connection to check that equal user-details are shared
+    """
+    
+    def setUp(self):
+        self.zilla = Bugzilla("http://localhost/", identity_map = IdentityMap())
+    
+    def get_bug(self, bug_id):
+        return self.zilla._get_bug({
+            "id": bug_id,
+            "status": "NEW",
+            "assigned_to_detail": user_detail("dev@example.com"),
+            "cc_detail": [user_detail("dev@example.com"), user_detail("qa@example.com")]
+        })
+    
+    def test_shared_users(self):
+        first, second = self.get_bug(1), self.get_bug(2)
+        self.assertIs(first.assigned_to_detail, second.assigned_to_detail)
+        self.assertIs(first.assigned_to_detail, first.cc_detail[0])
+        self.assertIsInstance(first.assigned_to_detail, FrozenUser)
+        self.assertEqual(first.assigned_to, "dev@example.com")
+        self.assertEqual(first.cc, ["dev@example.com", "qa@example.com"])
+        self.assertEqual(len(self.zilla.get_identity_map()), 2)
+    
+    def test_interned_strings(self):
+        self.assertIs(self.get_bug(1).status, self.get_bug(2).status)
+    
+    def test_frozen(self):
+        user = self.get_bug(1).assigned_to_detail
+        with self.assertRaises(TypeError):
+            user.name = "other@example.com"
+        copy = user.copy()
+        copy.name = "other@example.com"
+        self.assertEqual(user.name, "dev@example.com")
+        self.assertEqual(pickle.loads(pickle.dumps(user)), user)
+        # only the attributes of the detail are there, no made-up defaults
+        self.assertEqual(set(user), {"id", "name", "real_name", "email"})
+    
+    def test_history_changes(self):
+        data = {"when": "2020-01-01T00:00:00Z", "who": "dev@example.com",
+                "changes": [{"field_name": "status", "added": "ASSIGNED", "removed": "NEW"}]}
+        first = self.zilla._get_history(dict(data, changes = [dict(data["changes"][0])]))
+        second = self.zilla._get_history(dict(data, changes = [dict(data["changes"][0])]))
+        self.assertIs(first.changes[0], second.changes[0])
+    
+    def test_max_size(self):
+        identity_map = IdentityMap(max_size = 2)
+        first = identity_map.get_user(user_detail("a@example.com"))
+        identity_map.get_user(user_detail("b@example.com"))
+        # a is used again, so b is dropped for c
+        self.assertIs(identity_map.get_user(user_detail("a@example.com")), first)
+        identity_map.get_user(user_detail("c@example.com"))
+        self.assertEqual(len(identity_map), 2)
+        self.assertIs(identity_map.get_user(user_detail("a@example.com")), first)
+        self.assertEqual(identity_map.get_hits(), 2)
+    
+    def test_threads(self):
+        identity_map = IdentityMap(max_size = 50)
+        def get_users():
+            for i in range(2000):
+                identity_map.get_user(user_detail("%i@example.com" % (i % 100)))
+        threads = [threading.Thread(target = get_users) for i in range(8)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        self.assertEqual(len(identity_map), 50)
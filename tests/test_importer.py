@@ -0,0 +1,96 @@
+from bugzilla import Bugzilla, Bug
+from bugzilla.export import Exporter
+from bugzilla.importer import Importer
+from test_export import ExportBugzilla
+import base64
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+class ImportBugzilla(Bugzilla):
+    # records the writes and answers them with new ids, starting at 1000
+    def __init__(self):
+        Bugzilla.__init__(self, "http://localhost/")
+        self.lock = threading.Lock()
+        self.requests = []
+        self.next_id = 1000
+    
+    def _read_request(self, method, path, post_data, **kw):
+        with self.lock:
+            self.requests.append((method, path, post_data))
+            self.next_id += 1
+            if path.endswith("/attachment"):
+                return {"ids": [str(self.next_id)]}
+            if method == "PUT":
+                return {"bugs": [{"id": post_data["ids"][0], "changes": {}}]}
+            return {"id": self.next_id}
+    
+    def get_requests(self, method, suffix):
+        return [(path, data) for request_method, path, data in self.requests
+                if request_method == method and path.endswith(suffix)]
+
+class TestImporter(unittest.TestCase):
+    """
+    Round trip of an export of a fake bugzilla into another fake bugzilla
+    """
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.export_directory = os.path.join(self.directory, "export")
+        self.state_directory = os.path.join(self.directory, "state")
+        Exporter(ExportBugzilla(), self.export_directory, range_size = 2).run()
+        self.zilla = ImportBugzilla()
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def run_import(self):
+        importer = Importer(self.zilla, self.state_directory, workers = 2)
+        try:
+            return importer, importer.run([self.export_directory])
+        finally:
+            importer.close()
+    
+    def test_round_trip(self):
+        importer, count = self.run_import()
+        self.assertEqual(count, 5)
+        
+        bugs = {data["summary"]: data for path, data in self.zilla.get_requests("POST", "bug")}
+        self.assertEqual(len(bugs), 5)
+        data = bugs["Bug 2"]
+        self.assertEqual(data["description"], "Description of 2")
+        # the flag type-ids of the exporting installation are not sent
+        self.assertEqual(data["flags"], [{"name": "review", "status": "?", "requestee": "b@example.com"}])
+        
+        comments = self.zilla.get_requests("POST", "/comment")
+        self.assertEqual(sorted(data["comment"] for path, data in comments), ["Confirmed"] * 4)
+        
+        (path, data), = self.zilla.get_requests("POST", "/attachment")
+        self.assertEqual(path, "bug/%i/attachment" % importer.get_bug_id(2))
+        self.assertEqual(base64.b64decode(data["data"]), b"log data")
+        self.assertEqual(data["comment"], "Attached a log")
+        self.assertEqual(data["flags"], [{"name": "approval", "status": "+"}])
+        
+        links = {path: data for path, data in self.zilla.get_requests("PUT", "")}
+        new_ids = {old_id: importer.get_bug_id(old_id) for old_id in range(1, 6)}
+        data = links["bug/%i" % new_ids[3]]
+        self.assertEqual(set(data), {"ids", "blocks", "depends_on"})
+        self.assertEqual(data["blocks"], {"set": [new_ids[4]]})
+        self.assertEqual(data["depends_on"], {"set": [new_ids[2]]})
+    
+    def test_resume(self):
+        self.run_import()
+        count = len(self.zilla.requests)
+        # everything is in the journal, nothing is sent again
+        importer, imported = self.run_import()
+        self.assertEqual(imported, 0)
+        self.assertEqual(len(self.zilla.requests), count)
+    
+    def test_flags_of_new_bugs(self):
+        bug = Bug({"product": "Desktop", "component": "UI", "version": "1.0", "summary": "Flagged"})
+        bug.flags = ExportBugzilla().search_bugs(id = [1])[0].flags
+        self.zilla.add_bug(bug)
+        self.assertEqual(self.zilla.requests[0][2]["flags"],
+                        [{"name": "review", "status": "?", "type_id": 4, "requestee": "b@example.com"}])
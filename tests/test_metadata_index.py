@@ -0,0 +1,146 @@
+from bugzilla import Bugzilla, BugzillaException, Bug
+from bugzilla.metadata import MetadataIndex
+from datetime import datetime
+import os
+import tempfile
+import unittest
+
+FIELDS = [
+    {"name": "bug_status", "type": 2, "values": [
+        {"name": None, "is_active": True, "can_change_to": [{"name": "NEW"}]},
+        {"name": "NEW", "is_active": True, "can_change_to": [{"name": "ASSIGNED"}, {"name": "RESOLVED"}]},
+        {"name": "ASSIGNED", "is_active": True, "can_change_to": [{"name": "RESOLVED"}]},
+        {"name": "RESOLVED", "is_active": True, "can_change_to": [{"name": "NEW"}]}
+    ]},
+    {"name": "priority", "type": 2, "values": [
+        {"name": "P1", "is_active": True}, {"name": "P2", "is_active": True}
+    ]},
+    {"name": "cf_os_version", "type": 2, "is_custom": True, "visibility_field": "product",
+        "visibility_values": ["Desktop"], "values": [{"name": "10", "is_active": True}]},
+    {"name": "cf_rack", "type": 1, "is_custom": True, "is_mandatory": True, "visibility_field": "product",
+        "visibility_values": ["Server"], "values": []}
+]
+
+PRODUCTS = [
+    {"name": "Desktop", "components": [{"name": "UI", "is_active": True}],
+        "versions": [{"name": "1.0", "is_active": True}, {"name": "0.9", "is_active": False}],
+        "milestones": [{"name": "---", "is_active": True}]},
+    {"name": "Server", "components": [{"name": "API", "is_active": True}],
+        "versions": [{"name": "2.0", "is_active": True}], "milestones": []}
+]
+
+class FakeBugzilla(Bugzilla):
+    # answers the metadata-requests of the index from PRODUCTS and FIELDS
+    def __init__(self):
+        Bugzilla.__init__(self, "http://localhost/")
+        self.products = PRODUCTS[:1]
+        self.audit_time = datetime(2020, 1, 1)
+    
+    def get_last_audit_time(self, class_ = None):
+        return self.audit_time
+    
+    def get_fields(self, id_or_name = None, **kw):
+        return [self._get_field(dict(field)) for field in FIELDS]
+    
+    def get_accessible_product_ids(self):
+        return list(range(len(self.products)))
+    
+    def search_products(self, ids = [], names = [], **kw):
+        return [self._get_product(dict(product)) for i, product in enumerate(self.products)
+                if i in ids or product["name"] in names]
+
+class TestMetadataIndex(unittest.TestCase):
+    """
+    Validates payloads against a hand-made index without a bugzilla-connection
+    """
+    
+    def setUp(self):
+        self.zilla = Bugzilla("http://localhost/")
+        self.index = MetadataIndex(self.zilla)
+        self.index.fields = {field["name"]: self.zilla._get_field(dict(field)) for field in FIELDS}
+        self.index.products = {product["name"]: self.zilla._get_product(dict(product)) for product in PRODUCTS}
+        self.zilla.set_metadata_index(self.index)
+    
+    def make_bug(self, **kw):
+        bug = Bug({"product": "Desktop", "component": "UI", "summary": "Broken", "version": "1.0"})
+        bug.update(kw)
+        return bug
+    
+    def test_valid_bug(self):
+        self.assertEqual(self.index.validate_add_json(self.make_bug(priority = "P1").add_json()), [])
+    
+    def test_invalid_values(self):
+        errors = self.index.validate_add_json(self.make_bug(component = "API", priority = "P9").add_json())
+        self.assertEqual(len(errors), 2)
+        # inactive versions are only valid for existing bugs
+        data = self.make_bug(version = "0.9").add_json()
+        self.assertEqual(len(self.index.validate_add_json(data)), 1)
+        self.assertEqual(self.index.validate_update_json(data), [])
+    
+    def test_transitions(self):
+        self.assertEqual(self.index.validate_transition("NEW", "ASSIGNED"), [])
+        self.assertEqual(len(self.index.validate_transition("ASSIGNED", "NEW")), 1)
+        self.assertEqual(len(self.index.validate_add_json({"status": "RESOLVED"})), 1)
+    
+    def test_visibility(self):
+        self.assertEqual(self.index.validate_add_json(self.make_bug(cf_os_version = "10").add_json()), [])
+        data = self.make_bug(product = "Server", component = "API", version = "2.0", cf_os_version = "10").add_json()
+        # cf_os_version is hidden and cf_rack is missing
+        self.assertEqual(len(self.index.validate_add_json(data)), 2)
+    
+    def test_hidden_mandatory_field(self):
+        # cf_rack is only visible and so only mandatory for Server
+        self.assertEqual(self.index.validate_add_json(self.make_bug().add_json()), [])
+        data = self.make_bug(product = "Server", component = "API", version = "2.0").add_json()
+        self.assertEqual(len(self.index.validate_add_json(data)), 1)
+        data["cf_rack"] = "r1"
+        self.assertEqual(self.index.validate_add_json(data), [])
+    
+    def test_refresh_new_products(self):
+        zilla = FakeBugzilla()
+        index = MetadataIndex(zilla)
+        index.build()
+        self.assertEqual(set(index.products), {"Desktop"})
+        self.assertFalse(index.refresh())
+        zilla.products = PRODUCTS
+        zilla.audit_time = datetime(2020, 1, 2)
+        self.assertTrue(index.refresh())
+        self.assertEqual(set(index.products), {"Desktop", "Server"})
+        
+        # an index of selected products keeps its selection
+        index = MetadataIndex(zilla)
+        index.build(["Desktop"])
+        zilla.audit_time = datetime(2020, 1, 3)
+        index.refresh()
+        self.assertEqual(set(index.products), {"Desktop"})
+        # bugs of the other products aren't reported as unknown
+        bug = Bug({"product": "Server", "component": "API", "summary": "Broken", "version": "2.0", "cf_rack": "A1"})
+        self.assertEqual(index.validate_add_json(bug.add_json()), [])
+        self.assertIn("Unknown product 'Mobile'", self.index.validate_add_json(dict(bug.add_json(), product = "Mobile")))
+    
+    def test_failed_refresh(self):
+        zilla = FakeBugzilla()
+        index = MetadataIndex(zilla)
+        index.build()
+        zilla.audit_time = datetime(2020, 1, 2)
+        zilla.search_products = None
+        self.assertRaises(TypeError, index.refresh)
+        # the audit times are kept, so the next refresh tries again
+        del zilla.search_products
+        zilla.products = PRODUCTS
+        self.assertTrue(index.refresh())
+        self.assertEqual(set(index.products), {"Desktop", "Server"})
+    
+    def test_add_bug_is_checked(self):
+        # the index raises before a request is sent to the non-existing server
+        with self.assertRaises(BugzillaException):
+            self.zilla.add_bug(self.make_bug(component = "Nope"))
+    
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "index.json")
+            self.index.save(path)
+            index = MetadataIndex(self.zilla)
+            index.load(path)
+        self.assertEqual(index.get_legal_values("component", "Server"), {"API"})
+        self.assertEqual(index.get_transitions(None), {"NEW"})
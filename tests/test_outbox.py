@@ -0,0 +1,75 @@
+from bugzilla import Bugzilla
+from bugzilla.outbox import Outbox, merge_writes
+import os
+import shutil
+import tempfile
+import unittest
+
+class OutboxBugzilla(Bugzilla):
+    # records the writes it gets
+    def __init__(self):
+        Bugzilla.__init__(self, "http://localhost/")
+        self.requests = []
+    
+    def _read_request(self, method, path, post_data, **kw):
+        self.requests.append((method, path, post_data))
+        if method == "PUT":
+            return {"bugs": [{"id": bug_id, "changes": {}} for bug_id in post_data["ids"]]}
+        return {"id": len(self.requests)}
+
+class TestOutbox(unittest.TestCase):
+    """
+    Merging and sending the writes of the outbox
+    """
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "outbox.sqlite")
+        self.zilla = OutboxBugzilla()
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def test_merge(self):
+        update, comments = merge_writes([
+            ("update", {"fields": {"priority": "P2"}, "add": {"keywords": ["a", "b"]}}),
+            ("update", {"fields": {"priority": "P1"}, "remove": {"keywords": ["b"]}, "set": {"blocks": [1]}}),
+            ("update", {"add": {"blocks": [2]}}),
+            ("comment", {"comment": "first", "is_private": False}),
+            ("comment", {"comment": "second", "work_time": 1.5})
+        ])
+        self.assertEqual(update, {"priority": "P1", "add": {"keywords": ["a"]}, "remove": {"keywords": ["b"]},
+                                "set_": {"blocks": [1, 2]}, "comment": {"body": "first", "is_private": False}})
+        self.assertEqual(comments, [{"comment": "second", "work_time": 1.5}])
+    
+    def test_one_request_per_bug(self):
+        outbox = Outbox(self.zilla, self.path, start = False)
+        first = outbox.update_bug(1, add = {"keywords": ["regression"]})
+        second = outbox.update_bug(1, priority = "P1")
+        comment = outbox.add_comment(1, "Raised the priority")
+        outbox.flush()
+        
+        self.assertEqual(len(self.zilla.requests), 1)
+        method, path, data = self.zilla.requests[0]
+        self.assertEqual((method, path), ("PUT", "bug/1"))
+        self.assertEqual(data["priority"], "P1")
+        self.assertEqual(data["keywords"], {"add": ["regression"]})
+        self.assertEqual(data["comment"]["body"], "Raised the priority")
+        self.assertNotIn("summary", data)
+        self.assertIs(first.result(), second.result())
+        self.assertIs(comment.result(), first.result())
+        self.assertEqual(len(outbox), 0)
+        outbox.close()
+    
+    def test_replay(self):
+        outbox = Outbox(self.zilla, self.path, start = False)
+        outbox.add_comment(2, "first")
+        outbox.add_comment(2, "second")
+        # a crashed process leaves its writes in the database
+        outbox.close(flush = False)
+        
+        outbox = Outbox(self.zilla, self.path, start = False)
+        self.assertEqual(len(outbox), 2)
+        outbox.close()
+        self.assertEqual([(path, data["comment"]) for method, path, data in self.zilla.requests],
+                        [("bug/2/comment", "first"), ("bug/2/comment", "second")])
@@ -0,0 +1,66 @@
+from bugzilla import Bugzilla
+from bugzilla.prefetch import Prefetcher, estimate_size
+import threading
+import time
+import unittest
+
+class SlowBugzilla(Bugzilla):
+    # every request takes delay seconds and returns one comment of text_size characters,
+    # the number of requests started is recorded
+    def __init__(self, delay = 0.0, text_size = 1000):
+        Bugzilla.__init__(self, "http://localhost/")
+        self.delay = delay
+        self.text_size = text_size
+        self.lock = threading.Lock()
+        self.started = []
+    
+    def get_comments_by_bug(self, bug_id, **kw):
+        with self.lock: self.started.append(bug_id)
+        time.sleep(self.delay)
+        if bug_id == 99: raise KeyError(bug_id)
+        return [self._get_comment({"id": bug_id, "bug_id": bug_id, "text": "x" * self.text_size})]
+    
+    def get_bug_history(self, bug_id, **kw):
+        time.sleep(self.delay)
+        return []
+
+class TestPrefetcher(unittest.TestCase):
+    """
+    Prefetches the comments of a fake bugzilla with slow requests
+    """
+    
+    def test_order(self):
+        zilla = SlowBugzilla()
+        results = list(Prefetcher(zilla, range(20), related = ("comments", "history"), window = 4))
+        self.assertEqual([bug for bug, related in results], list(range(20)))
+        self.assertEqual([related["comments"][0].id for bug, related in results], list(range(20)))
+        self.assertEqual(results[0][1]["history"], [])
+        self.assertRaises(ValueError, Prefetcher, zilla, [], related = ("votes", ))
+    
+    def test_max_memory(self):
+        zilla = SlowBugzilla(text_size = 10000)
+        size = estimate_size([zilla._get_comment({"text": "x" * 10000})])
+        # room for two bugs, the window would allow ten
+        prefetcher = Prefetcher(zilla, range(20), window = 10, max_memory = size * 2)
+        for bug, related in prefetcher:
+            # the current bug, and at most two fetched ahead
+            self.assertLessEqual(len(zilla.started), bug + 3)
+            self.assertLessEqual(prefetcher.held, size * 2)
+        self.assertEqual(len(zilla.started), 20)
+        self.assertEqual(prefetcher.held, 0)
+    
+    def test_error(self):
+        zilla = SlowBugzilla(delay = 0.01)
+        with self.assertRaises(KeyError):
+            for bug, related in Prefetcher(zilla, [1, 2, 99] + list(range(100, 200)), window = 4):
+                pass
+        # the bugs after the window are neither fetched nor queued
+        self.assertLess(len(zilla.started), 20)
+    
+    def test_overlap(self):
+        # 20 ms of work and 20 ms of requests per bug overlap, sequentially this takes 0.8 s
+        zilla = SlowBugzilla(delay = 0.02)
+        started = time.perf_counter()
+        for bug, related in Prefetcher(zilla, range(20), window = 4):
+            time.sleep(0.02)
+        self.assertLess(time.perf_counter() - started, 0.6)
@@ -0,0 +1,50 @@
+from bugzilla import Bugzilla
+from bugzilla.routing import EndpointPool, CircuitBreaker
+from urllib.error import URLError
+import unittest
+
+class RoutedBugzilla(Bugzilla):
+    # answers every request with the url it was sent to, the urls in down fail
+    def __init__(self, pool):
+        Bugzilla.__init__(self, "http://primary/", endpoint_pool = pool)
+        self.down = set()
+    
+    def _open(self, method, url, post_data):
+        host = url.split("/")[2]
+        if host in self.down:
+            raise URLError("connection refused")
+        return {"host": host}
+
+class TestRouting(unittest.TestCase):
+    """
+    The routing of requests to the primary and the replicas
+    """
+    
+    def setUp(self):
+        self.pool = EndpointPool(["http://replica1/", "http://replica2/"], failure_threshold = 2, reset_timeout = 60)
+        self.zilla = RoutedBugzilla(self.pool)
+    
+    def test_reads_and_writes(self):
+        self.assertIn(self.zilla._get("bug")["host"], ("replica1", "replica2"))
+        self.assertEqual(self.zilla._post("bug", {})["host"], "primary")
+        self.assertEqual(self.zilla._put("bug/1", {})["host"], "primary")
+    
+    def test_failover(self):
+        self.zilla.down.add("replica1")
+        for i in range(4):
+            self.assertEqual(self.zilla._get("bug", id = i)["host"], "replica2")
+        # without replicas the primary answers, the replicas are left out after two failures
+        self.zilla.down.add("replica2")
+        for i in range(2):
+            self.assertEqual(self.zilla._get("bug", id = 5)["host"], "primary")
+        states = {stats["url"]: stats["state"] for stats in self.pool.get_stats()}
+        self.assertEqual(states["http://replica1/rest/"], CircuitBreaker.OPEN)
+        self.assertEqual(states["http://replica2/rest/"], CircuitBreaker.OPEN)
+        self.zilla.down.add("primary")
+        with self.assertRaises(URLError):
+            self.zilla._get("bug", id = 6)
+    
+    def test_read_your_writes(self):
+        self.pool.read_your_writes = 60
+        self.zilla._put("bug/1", {})
+        self.assertEqual(self.zilla._get("bug/1")["host"], "primary")
@@ -0,0 +1,100 @@
+from bugzilla import Bugzilla, Bug, Attachment, AttachmentFlag, Comment, History, Change, Component, FlagType
+from bugzilla.identity import IdentityMap, FrozenUser, FrozenChange
+from datetime import datetime
+import base64
+import unittest
+
+WHEN = "2020-01-02T03:04:05Z"
+PARSED = datetime(2020, 1, 2, 3, 4, 5)
+
+def user_detail(name):
+    return {"id": 1, "name": name, "real_name": "Some One", "email": name}
+
+def flag(**kw):
+    return dict({"id": 1, "name": "review", "type_id": 4, "status": "?", "setter": "dev@example.com",
+                "creation_date": WHEN, "modification_date": WHEN}, **kw)
+
+class TestDecoders(unittest.TestCase):
+    """
+    Compares the generated decoders with the objects the old chains of _map built
+    """
+    
+    def setUp(self):
+        self.zilla = Bugzilla("http://localhost/")
+        self.shared = Bugzilla("http://localhost/", identity_map = IdentityMap())
+    
+    def bug_data(self, **kw):
+        return dict({"id": 1, "status": "NEW", "creation_time": WHEN, "last_change_time": WHEN,
+                    "is_open": 1, "is_confirmed": 0, "flags": [flag()],
+                    "assigned_to_detail": user_detail("dev@example.com"), "qa_contact_detail": None,
+                    "cc_detail": [user_detail("dev@example.com"), user_detail("qa@example.com")]}, **kw)
+    
+    def expected_bug(self, **kw):
+        data = self.bug_data(**kw)
+        data.update(creation_time = PARSED, last_change_time = PARSED, is_open = True, is_confirmed = False,
+                    flags = [AttachmentFlag(dict(flag(), creation_date = PARSED, modification_date = PARSED))])
+        return Bug(data)
+    
+    def test_bug(self):
+        bug = self.zilla._get_bug(self.bug_data())
+        self.assertEqual(bug, self.expected_bug())
+        self.assertIs(type(bug), Bug)
+        self.assertIs(type(bug.flags[0]), AttachmentFlag)
+        self.assertIs(bug.is_open, True)
+        # without an identity map the user details stay dicts
+        self.assertIs(type(bug.assigned_to_detail), dict)
+        self.assertEqual(bug.cc, ["dev@example.com", "qa@example.com"])
+        self.assertEqual(bug.get_changed_fields(), set())
+        # every bug has its own default lists
+        self.zilla._get_bug({"id": 2}).keywords.append("crash")
+        self.assertEqual(self.zilla._get_bug({"id": 3}).keywords, [])
+    
+    def test_bug_with_identity_map(self):
+        first, second = self.shared._get_bug(self.bug_data()), self.shared._get_bug(self.bug_data(id = 2))
+        self.assertEqual(first, self.expected_bug())
+        self.assertIsInstance(first.assigned_to_detail, FrozenUser)
+        self.assertIs(first.assigned_to_detail, second.cc_detail[0])
+        self.assertIs(first.status, second.status)
+    
+    def test_null_details(self):
+        for zilla in (self.zilla, self.shared):
+            bug = zilla._get_bug(self.bug_data(assigned_to_detail = None, cc_detail = None))
+            self.assertEqual(bug, self.expected_bug(assigned_to_detail = None, cc_detail = None))
+            self.assertIsNone(bug.qa_contact_detail)
+    
+    def test_attachment(self):
+        data = {"id": 3, "bug_id": 1, "file_name": "log.txt", "data": base64.b64encode(b"\x00log").decode("ascii"),
+                "size": 4, "is_patch": 1, "is_private": 0, "creation_time": WHEN, "flags": [flag(status = "+")]}
+        for zilla in (self.zilla, self.shared):
+            attachment = zilla._get_attachment(dict(data, flags = [flag(status = "+")]))
+            expected = Attachment({"id": 3, "bug_id": 1, "file_name": "log.txt", "data": b"\x00log",
+                                "is_patch": True, "is_private": False, "creation_time": PARSED,
+                                "flags": [AttachmentFlag(dict(flag(status = "+"), creation_date = PARSED, modification_date = PARSED))]})
+            self.assertEqual(attachment, expected)
+            self.assertNotIn("size", attachment)
+            self.assertEqual(attachment.get_changed_fields(), set())
+    
+    def test_history(self):
+        data = {"when": WHEN, "who": "dev@example.com", "changes": [{"field_name": "status", "added": "ASSIGNED", "removed": "NEW"}]}
+        expected = History({"when": PARSED, "who": "dev@example.com", "changes": [Change(data["changes"][0])]})
+        history = self.zilla._get_history(dict(data, changes = [dict(data["changes"][0])]))
+        self.assertEqual(history, expected)
+        self.assertIs(type(history.changes[0]), Change)
+        self.assertIsNone(history.get_changed_fields())
+        
+        history = self.shared._get_history(dict(data, changes = [dict(data["changes"][0])]))
+        self.assertEqual(history, expected)
+        self.assertIsInstance(history.changes[0], FrozenChange)
+    
+    def test_nested_objects(self):
+        component = self.zilla._get_component({"id": 2, "name": "UI", "flag_types": {
+            "bug": [{"id": 4, "name": "review"}], "attachment": None}})
+        self.assertEqual(component, Component({"id": 2, "name": "UI", "flag_types": {
+            "bug": [FlagType({"id": 4, "name": "review"})], "attachment": None}}))
+        self.assertIs(type(component.flag_types["bug"][0]), FlagType)
+    
+    def test_datetimes(self):
+        comment = self.zilla._get_comment({"id": 1, "text": "a", "time": WHEN, "creation_time": None})
+        self.assertEqual(comment, Comment({"id": 1, "text": "a", "time": PARSED, "creation_time": None}))
+        # a timestamp in another format is parsed the slow way, or rejected like before
+        self.assertRaises(ValueError, self.zilla._get_comment, {"id": 1, "time": "2020-01-02"})
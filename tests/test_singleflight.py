@@ -0,0 +1,66 @@
+from bugzilla import Bugzilla
+import threading
+import time
+import unittest
+
+class SlowBugzilla(Bugzilla):
+    # answers GET-requests after a short delay and counts all requests
+    def __init__(self, **kw):
+        Bugzilla.__init__(self, "http://localhost/", **kw)
+        self.requests = 0
+    
+    def _read_request(self, method, path, post_data, **kw):
+        self.requests += 1
+        if method != "GET":
+            return {"bugs": []}
+        time.sleep(0.1)
+        return {"bugs": [{"id": 1, "summary": "Crash", "keywords": ["crash"]}], "faults": []}
+
+class TestSingleFlight(unittest.TestCase):
+    """
+    Coalescing of concurrent GET-requests
+    """
+    
+    def get_bugs_concurrently(self, zilla, count, **kw):
+        bugs = [None] * count
+        def run(i):
+            bugs[i] = zilla.get_bug(1, **kw)
+        threads = [threading.Thread(target = run, args = (i,)) for i in range(count)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        return bugs
+    
+    def test_coalescing(self):
+        zilla = SlowBugzilla()
+        bugs = self.get_bugs_concurrently(zilla, 8)
+        self.assertEqual(zilla.requests, 1)
+        self.assertEqual(zilla.get_coalesced_count(), 7)
+        
+        # every caller gets its own objects
+        bugs[0].keywords.append("perf")
+        self.assertEqual(bugs[1].keywords, ["crash"])
+        self.assertEqual(len({id(bug) for bug in bugs}), 8)
+    
+    def test_different_params(self):
+        zilla = SlowBugzilla()
+        threads = [threading.Thread(target = zilla.get_bug, args = (1,), kwargs = {"include_fields": fields})
+                for fields in (["id"], ["id", "summary"], ("id",))]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        self.assertEqual(zilla.requests, 2)
+    
+    def test_write_separates_reads(self):
+        zilla = SlowBugzilla()
+        reader = threading.Thread(target = zilla.get_bug, args = (1,))
+        reader.start()
+        time.sleep(0.02)
+        zilla._put("bug/1", {"ids": [1]})
+        # the write finished while the first read was in flight, this read must not join it
+        zilla.get_bug(1)
+        reader.join()
+        self.assertEqual(zilla.get_coalesced_count(), 0)
+    
+    def test_disabled(self):
+        zilla = SlowBugzilla(single_flight = None)
+        self.get_bugs_concurrently(zilla, 4)
+        self.assertEqual(zilla.requests, 4)
@@ -0,0 +1,91 @@
+from bugzilla import Bugzilla
+from bugzilla.objects import Bug
+from bugzilla.snapshot import Snapshot, write_snapshot
+import os
+import tempfile
+import unittest
+
+BUGS = [
+    {"id": 12, "status": "NEW", "summary": "Crash on start", "creation_time": "2020-01-01T10:00:00Z",
+     "keywords": ["crash", "regression"], "blocks": [20, 31], "cc_detail": [{"name": "a@example.com"}],
+     "assigned_to_detail": {"name": "dev@example.com"}, "flags": [{"name": "review", "status": "+"}],
+     "is_open": True, "cf_rank": "3"},
+    {"id": 10, "status": "RESOLVED", "resolution": "FIXED", "summary": "Crash on start", "dupe_of": 12,
+     "alias": "old-alias", "deadline": "2021-03-01"},
+    {"id": 15}
+]
+
+class TestSnapshot(unittest.TestCase):
+    """
+    Writing and reading the memory-mapped snapshot files
+    """
+    
+    def setUp(self):
+        zilla = Bugzilla("http://localhost/")
+        self.bugs = {data["id"]: zilla._get_bug(dict(data)) for data in BUGS}
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "bugs.snapshot")
+        write_snapshot(self.path, self.bugs.values())
+        self.snapshot = Snapshot(self.path)
+    
+    def tearDown(self):
+        self.snapshot.close()
+        self.directory.cleanup()
+    
+    def test_lookup(self):
+        self.assertEqual(len(self.snapshot), 3)
+        self.assertEqual([view.id for view in self.snapshot], [10, 12, 15])
+        self.assertIsNone(self.snapshot.get(11))
+        self.assertIsNone(self.snapshot.get(100))
+        self.assertNotIn(9, self.snapshot)
+        
+        view = self.snapshot.get(12)
+        self.assertEqual(view.status, "NEW")
+        self.assertEqual(view["keywords"], ["crash", "regression"])
+        self.assertEqual(view.blocks, [20, 31])
+        self.assertEqual(view.assigned_to, "dev@example.com")
+        self.assertEqual(view.cc, ["a@example.com"])
+        self.assertEqual(view.creation_time, self.bugs[12].creation_time)
+        self.assertTrue(view.is_open)
+        self.assertEqual(view.cf_rank, "3")
+        self.assertEqual(view.flags[0].name, "review")
+        self.assertIsNone(view.qa_contact)
+        self.assertRaises(AttributeError, getattr, view, "unknown")
+        
+        view = self.snapshot.get(10)
+        self.assertEqual(view.dupe_of, 12)
+        # values of other types are kept as they are
+        self.assertEqual(view.alias, "old-alias")
+        self.assertEqual(view.summary, self.snapshot.get(12).summary)
+    
+    def test_to_bug(self):
+        for bug_id, bug in self.bugs.items():
+            copy = self.snapshot.get(bug_id).to_bug()
+            self.assertIsInstance(copy, Bug)
+            self.assertEqual(dict(copy), dict(bug))
+            self.assertEqual(copy.get_changed_fields(), set())
+    
+    def test_invalid(self):
+        with open(self.path + ".bad", "wb") as file:
+            file.write(b"something else entirely, no snapshot at all" * 4)
+        self.assertRaises(ValueError, Snapshot, self.path + ".bad")
+    
+    def test_sparse_ids(self):
+        # a direct-address table for these ids would take 8 GB, the ids are searched instead
+        path = os.path.join(self.directory.name, "sparse.snapshot")
+        write_snapshot(path, [Bug({"id": 2000000000, "summary": "Last"}), Bug({"id": 1}), Bug({"id": 5})])
+        self.assertLess(os.path.getsize(path), 4096)
+        with Snapshot(path) as snapshot:
+            self.assertEqual(snapshot.get_ids(), [1, 5, 2000000000])
+            self.assertEqual(snapshot.get(2000000000).summary, "Last")
+            for bug_id in (0, 3, 1999999999, 2000000001, -1):
+                self.assertNotIn(bug_id, snapshot)
+        self.assertRaises(ValueError, write_snapshot, path, [Bug({"id": 1}), Bug({"id": 1})])
+    
+    def test_virtual_attributes(self):
+        view = self.snapshot.get(10)
+        self.assertIsNone(view.qa_contact)
+        details = view.details
+        # the bug the virtual attributes are built from is kept
+        self.assertIsNone(view.assigned_to)
+        self.assertIs(view.details, details)
@@ -0,0 +1,103 @@
+from bugzilla import Bugzilla, BugzillaException
+from bugzilla.split import QuerySplitter
+from bugzilla.util import encode_bugzilla_datetime
+from datetime import datetime, timedelta
+import threading
+import unittest
+
+START = datetime(2020, 1, 1)
+
+class LimitedBugzilla(Bugzilla):
+    # answers searches from a dict bug-id -> creation time and cuts off every result after
+    # max_results bugs. Unordered results come in descending order of ids.
+    def __init__(self, times, max_results = 10, count_only = True):
+        Bugzilla.__init__(self, "http://localhost/")
+        self.times = {bug_id: encode_bugzilla_datetime(time) for bug_id, time in times.items()}
+        self.max_results = max_results
+        self.count_only = count_only
+        self.lock = threading.Lock()
+        self.searches = []
+        self.ranges = []
+    
+    def _read_request(self, method, path, post_data, **kw):
+        ids = sorted(self.times, reverse = True)
+        chart = 1
+        while "f%i" % chart in kw:
+            field, operator, value = kw["f%i" % chart], kw["o%i" % chart], kw["v%i" % chart]
+            key = (lambda bug_id: bug_id) if field == "bug_id" else (lambda bug_id: self.times[bug_id])
+            if operator == "greaterthaneq": ids = [bug_id for bug_id in ids if key(bug_id) >= value]
+            else: ids = [bug_id for bug_id in ids if key(bug_id) < value]
+            chart += 1
+        if "id" in kw: ids = [bug_id for bug_id in ids if bug_id == kw["id"]]
+        if self.count_only and "count_only" in kw: return {"bug_count": len(ids)}
+        
+        with self.lock:
+            self.searches.append(kw)
+            if chart > 1: self.ranges.append((kw["v%i" % (chart - 2)], kw["v%i" % (chart - 1)]))
+        order = kw.get("order", "")
+        if order.startswith("bug_id"): ids.sort(reverse = order.endswith("DESC"))
+        if order.startswith("creation_ts"): ids.sort(key = lambda bug_id: (self.times[bug_id], bug_id))
+        ids = ids[:min(self.max_results, kw.get("limit", self.max_results))]
+        return {"bugs": [{"id": bug_id, "creation_time": self.times[bug_id]} for bug_id in ids]}
+
+def spread(ids, step = timedelta(hours = 1)):
+    return {bug_id: START + step * i for i, bug_id in enumerate(ids)}
+
+class TestQuerySplitter(unittest.TestCase):
+    """
+    Splits searches of a fake bugzilla with a tiny max_search_results
+    """
+    
+    def search(self, zilla, field = "bug_id"):
+        splitter = QuerySplitter(zilla, max_results = zilla.max_results, field = field, workers = 2)
+        bugs = splitter.search(product = "Firefox")
+        self.assertEqual([bug.id for bug in bugs], sorted(zilla.times))
+        return splitter
+    
+    def test_small_search(self):
+        for count_only in (True, False):
+            zilla = LimitedBugzilla(spread(range(1, 10)), count_only = count_only)
+            self.assertEqual(self.search(zilla).requests, 2 if count_only else 1)
+        self.assertRaises(ValueError, QuerySplitter(zilla).search, limit = 5)
+        self.assertRaises(ValueError, QuerySplitter, zilla, field = "summary")
+    
+    def test_recursion(self):
+        # a sparse range of ids and a dense one, the first split is based on the total count
+        zilla = LimitedBugzilla(spread(list(range(1, 1000, 50)) + list(range(1000, 1060))))
+        splitter = self.search(zilla)
+        truncated = [bug_range for bug_range in zilla.ranges if any(
+            lo <= other[0] and other[1] <= hi and (lo, hi) != other for lo, hi in [bug_range] for other in zilla.ranges)]
+        self.assertTrue(truncated)
+        # no bug is outside of the known range
+        self.assertGreaterEqual(min(lo for lo, hi in zilla.ranges), 1)
+        self.assertLessEqual(max(hi for lo, hi in zilla.ranges), 1060)
+        self.assertGreater(splitter.requests, len(zilla.ranges))
+    
+    def test_first_search_is_kept(self):
+        zilla = LimitedBugzilla(spread(range(1, 101)), count_only = False)
+        splitter = self.search(zilla)
+        self.assertEqual(zilla.searches[1]["order"], "bug_id ASC")
+        # the first ten bugs came with the first search and are not searched again
+        self.assertEqual(min(lo for lo, hi in zilla.ranges), 11)
+    
+    def test_creation_time(self):
+        times = spread(range(1, 40))
+        # bug 40 was imported and is older than all others
+        times[40] = START - timedelta(days = 10)
+        for count_only in (True, False):
+            zilla = LimitedBugzilla(times, count_only = count_only)
+            self.search(zilla, "creation_time")
+    
+    def test_same_creation_time(self):
+        # the first search is cut off in the middle of a second
+        times = spread(range(1, 30))
+        for bug_id in range(8, 14): times[bug_id] = times[8]
+        zilla = LimitedBugzilla(times, count_only = False)
+        self.search(zilla, "creation_time")
+        self.assertEqual(zilla.searches[1]["order"], "creation_ts ASC")
+        self.assertEqual(min(lo for lo, hi in zilla.ranges), encode_bugzilla_datetime(times[8]))
+        
+        # more bugs in one second than a search returns
+        for bug_id in range(1, 30): times[bug_id] = START
+        zilla = LimitedBugzilla(times, count_only = False)
+        self.assertRaises(BugzillaException, QuerySplitter(zilla, 10, "creation_time").search)
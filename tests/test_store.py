@@ -0,0 +1,64 @@
+from bugzilla import Bugzilla
+from bugzilla.store import BugStore
+from datetime import datetime
+import unittest
+
+class TestBugStore(unittest.TestCase):
+    """
+    Answers search_bugs-queries from a store filled with decoded bugs
+    """
+    
+    def setUp(self):
+        self.zilla = Bugzilla("http://localhost/")
+        self.store = BugStore([self.make_bug(1, "NEW", ["crash"], "2020-01-01T00:00:00Z"),
+                            self.make_bug(2, "NEW", [], "2020-02-01T00:00:00Z"),
+                            self.make_bug(3, "RESOLVED", ["crash", "perf"], "2020-03-01T00:00:00Z")])
+    
+    def make_bug(self, bug_id, status, keywords, changed, summary = "Slow start"):
+        return self.zilla._get_bug({"id": bug_id, "status": status, "keywords": keywords, "summary": summary,
+                                    "last_change_time": changed, "product": "Desktop",
+                                    "assigned_to_detail": {"name": "dev@example.com"}})
+    
+    def test_search(self):
+        self.assertEqual(self.store.search_ids(status = "NEW"), [1, 2])
+        self.assertEqual(self.store.search_ids(keywords = ["perf", "missing"]), [3])
+        self.assertEqual(self.store.search_ids(status = ["NEW", "RESOLVED"], keywords = "crash"), [1, 3])
+        self.assertEqual(self.store.search_ids(assigned_to = "dev@example.com", summary = "SLOW"), [1, 2, 3])
+        self.assertEqual(self.store.search_ids(product = "Desktop", limit = 1, offset = 1), [2])
+        self.assertRaises(ValueError, self.store.search_ids, unknown = 1)
+    
+    def test_time_ranges(self):
+        self.assertEqual(self.store.search_ids(last_change_time = "2020-02-01T00:00:00Z"), [2, 3])
+        self.assertEqual(self.store.search_ids(last_change_time = (None, datetime(2020, 2, 1))), [1, 2])
+        self.assertEqual(self.store.search_ids(last_change_time = (datetime(2020, 1, 15), datetime(2020, 2, 15)),
+                                            status = "NEW"), [2])
+    
+    def test_replace(self):
+        self.store.add_bug(self.make_bug(1, "RESOLVED", ["perf"], "2020-04-01T00:00:00Z"))
+        self.assertEqual(len(self.store), 3)
+        self.assertEqual(self.store.search_ids(status = "NEW"), [2])
+        self.assertEqual(self.store.search_ids(keywords = "crash"), [3])
+        self.assertEqual(self.store.search_ids(last_change_time = (None, datetime(2020, 2, 1))), [2])
+        self.assertEqual(self.store.search_ids(last_change_time = datetime(2020, 3, 15)), [1])
+        
+        # replacing the same bugs again and again compacts the sorted index
+        for i in range(20):
+            for bug_id in (1, 2, 3):
+                self.store.add_bug(self.make_bug(bug_id, "NEW", [], "2020-05-01T00:00:00Z"))
+        self.assertEqual(self.store.search_ids(last_change_time = datetime(2020, 5, 1)), [1, 2, 3])
+        self.assertLessEqual(len(self.store.sorted_indexes["last_change_time"]), 6)
+    
+    def test_modified_bug(self):
+        bug = self.store.get(2)
+        bug.status = "ASSIGNED"
+        # the indexes only see the change when the bug is added again
+        self.assertEqual(self.store.search_ids(status = "NEW"), [1, 2])
+        self.store.add_bug(bug)
+        self.assertEqual(self.store.search_ids(status = "NEW"), [1])
+        self.assertEqual(self.store.search_ids(status = "ASSIGNED"), [2])
+    
+    def test_remove(self):
+        self.store.remove_bug(3)
+        self.assertNotIn(3, self.store)
+        self.assertEqual(self.store.search_ids(keywords = "crash"), [1])
+        self.assertEqual(self.store.search_ids(last_change_time = datetime(2020, 1, 15)), [2])
@@ -0,0 +1,61 @@
+from bugzilla import Bugzilla, Attachment
+from bugzilla.upload import AttachmentBody, Upload, Uploader
+import base64
+import io
+import json
+import unittest
+
+class FlakyBugzilla(Bugzilla):
+    # fails the first upload with a network-error and keeps the bodies it got
+    def __init__(self):
+        Bugzilla.__init__(self, "http://localhost/")
+        self.bodies = []
+    
+    def _read_request(self, method, path, post_data, **kw):
+        body = b"".join(post_data)
+        self.lengths_match = post_data.get_content_length() == len(body)
+        self.bodies.append(json.loads(body))
+        if len(self.bodies) == 1:
+            raise ConnectionResetError("reset")
+        return {"ids": [len(self.bodies)]}
+
+def make_attachment():
+    return Attachment({"file_name": "build.log", "summary": "Build log", "content_type": "text/plain"})
+
+class TestUpload(unittest.TestCase):
+    """
+    The streamed attachment-bodies and the retries of the uploader
+    """
+    
+    def test_body(self):
+        data = bytes(range(256)) * 41
+        for size in (len(data), len(data) - 1, len(data) - 2, 0):
+            body = AttachmentBody({"ids": [1], "summary": "ä"}, io.BytesIO(data[:size]), chunk_size = 100)
+            encoded = b"".join(body)
+            self.assertEqual(len(encoded), body.get_content_length())
+            self.assertEqual(base64.b64decode(json.loads(encoded)["data"]), data[:size])
+            # a seekable stream is sent again from the start
+            self.assertEqual(b"".join(body), encoded)
+    
+    def test_retry(self):
+        zilla = FlakyBugzilla()
+        progress = []
+        uploader = Uploader(zilla, backoff = 0, progress = lambda *args: progress.append(args))
+        results = list(uploader.run([Upload(make_attachment(), io.BytesIO(b"log"), 5, "see log")]))
+        self.assertEqual(results[0][1], [2])
+        self.assertTrue(zilla.lengths_match)
+        self.assertEqual(zilla.bodies[0], zilla.bodies[1])
+        self.assertEqual(zilla.bodies[1]["comment"], "see log")
+        self.assertEqual(base64.b64decode(zilla.bodies[1]["data"]), b"log")
+        # the failed try isn't counted in the bytes sent
+        self.assertEqual(progress[0][:3], (1, 1, 3))
+        self.assertEqual(uploader.bytes_sent, 3)
+    
+    def test_fields(self):
+        # the data of the attachment object is neither encoded nor sent
+        attachment = make_attachment()
+        attachment.data = b"x" * 1000
+        fields = Upload(attachment, io.BytesIO(b"log"), [5, 6]).get_fields()
+        self.assertNotIn("data", fields)
+        self.assertEqual((fields["ids"], fields["summary"]), ([5, 6], "Build log"))
+        self.assertIn("data", attachment.add_json())
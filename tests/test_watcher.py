@@ -0,0 +1,104 @@
+from bugzilla import Bugzilla
+from bugzilla.util import parse_bugzilla_datetime, encode_bugzilla_datetime
+from bugzilla.watcher import ChangeWatcher
+from datetime import datetime
+import asyncio
+import unittest
+
+class WatchedBugzilla(Bugzilla):
+    # a bugzilla whose bugs, comments and histories are changed by the tests
+    def __init__(self):
+        Bugzilla.__init__(self, "http://localhost/")
+        self.bugs = {}
+        self.comments = {}
+        self.histories = {}
+    
+    def set_bug(self, bug_id, changed):
+        self.bugs[bug_id] = changed
+    
+    def add_comment_at(self, bug_id, c_id, time):
+        self.comments.setdefault(bug_id, []).append({"id": c_id, "bug_id": bug_id, "text": "comment %i" % c_id,
+                                                    "creation_time": encode_bugzilla_datetime(time)})
+        self.set_bug(bug_id, time)
+    
+    def search_bugs(self, **kw):
+        if "id" in kw:
+            ids = kw["id"]
+        else:
+            since = parse_bugzilla_datetime(kw["last_change_time"]) if "last_change_time" in kw else None
+            ids = [bug_id for bug_id, changed in self.bugs.items() if since is None or changed >= since]
+        return [self._get_bug({"id": bug_id, "last_change_time": encode_bugzilla_datetime(self.bugs[bug_id])})
+                for bug_id in sorted(ids)]
+    
+    def get_comments_by_bugs(self, bug_ids, **kw):
+        since = parse_bugzilla_datetime(kw["new_since"])
+        return {bug_id: [self._get_comment(dict(data)) for data in self.comments.get(bug_id, [])
+                        if parse_bugzilla_datetime(data["creation_time"]) >= since] for bug_id in bug_ids}
+    
+    def get_bug_histories(self, bug_ids, **kw):
+        return {bug_id: [] for bug_id in bug_ids}
+
+class TestChangeWatcher(unittest.TestCase):
+    """
+    Polls a fake bugzilla whose timestamps only have a precision of seconds
+    """
+    
+    def setUp(self):
+        self.zilla = WatchedBugzilla()
+        self.watcher = ChangeWatcher(self.zilla, min_interval = 0, max_interval = 0)
+    
+    def comment_ids(self, events):
+        return [[comment.id for comment in event.comments] for event in events]
+    
+    def test_baseline(self):
+        self.zilla.set_bug(1, datetime(2020, 1, 1))
+        self.watcher.watch("all")
+        self.assertEqual(self.watcher.poll(), [])
+        self.assertEqual(self.watcher.get_high_water_mark("all"), datetime(2020, 1, 1))
+        self.assertEqual(self.watcher.poll(), [])
+        self.zilla.set_bug(2, datetime(2020, 1, 2))
+        self.assertEqual([event.bug.id for event in self.watcher.poll()], [2])
+    
+    def test_comments_at_the_mark(self):
+        self.watcher.watch("all", since = datetime(2020, 1, 1))
+        self.zilla.add_comment_at(1, 1, datetime(2020, 1, 2))
+        self.assertEqual(self.comment_ids(self.watcher.poll()), [[1]])
+        # comment 1 was made at the old mark and must not be reported again
+        self.zilla.add_comment_at(1, 2, datetime(2020, 1, 3))
+        self.assertEqual(self.comment_ids(self.watcher.poll()), [[2]])
+        self.assertEqual(self.watcher.poll(), [])
+    
+    def test_same_second(self):
+        self.watcher.watch("all", since = datetime(2020, 1, 1))
+        self.zilla.add_comment_at(1, 1, datetime(2020, 1, 2))
+        self.assertEqual(self.comment_ids(self.watcher.poll()), [[1]])
+        # another change in the same second as the mark
+        self.zilla.add_comment_at(1, 2, datetime(2020, 1, 2))
+        self.zilla.add_comment_at(2, 3, datetime(2020, 1, 2))
+        # bug 1 was already reported at this time, only bug 2 is new
+        self.assertEqual([event.bug.id for event in self.watcher.poll()], [2])
+    
+    def test_callbacks_and_interval(self):
+        events = []
+        self.watcher = ChangeWatcher(self.zilla, min_interval = 1, max_interval = 8)
+        self.watcher.add_callback(events.append)
+        self.watcher.watch("all", since = datetime(2020, 1, 1))
+        self.watcher.poll()
+        self.assertEqual(self.watcher.get_interval(), 1.5)
+        self.zilla.set_bug(1, datetime(2020, 1, 2))
+        self.watcher.poll()
+        self.assertEqual([event.bug.id for event in events], [1])
+        self.assertEqual(self.watcher.get_interval(), 1)
+    
+    def test_async_iteration(self):
+        self.watcher.watch("all", since = datetime(2020, 1, 1))
+        self.zilla.add_comment_at(1, 1, datetime(2020, 1, 2))
+        self.zilla.add_comment_at(2, 2, datetime(2020, 1, 2))
+        
+        async def collect():
+            events = []
+            async for event in self.watcher:
+                events.append(event.bug.id)
+                if len(events) == 2: self.watcher.stop()
+            return events
+        self.assertEqual(asyncio.run(collect()), [1, 2])